@@ -7,6 +7,7 @@
 # obtain one at http://mozilla.org/MPL/2.0/.
 """Per model flat access rule, based on a Model (table)"""
 from anyblok.registry import RegistryManagerException
+from sqlalchemy import bindparam
 from .base import AuthorizationRule
 
 
@@ -46,10 +47,20 @@ class ModelAccessRule(AuthorizationRule):
 
     def check_on_model(self, model, principals, permission):
         Grant = self.grant_model
-        return bool(Grant.query().filter(
-            Grant.model == model,
-            Grant.principal.in_(principals),
-            Grant.permission == permission).limit(1).count())
+        principals = list(principals)
+        if not principals:
+            return False
+
+        # the query is built and compiled once by grant model
+        query = Grant.registry.bakery(
+            lambda session: session.query(Grant).filter(
+                Grant.model == bindparam('model'),
+                Grant.principal.in_(bindparam('principals', expanding=True)),
+                Grant.permission == bindparam('permission')).limit(1),
+            Grant)
+        return bool(query(Grant.registry.session).params(
+            model=model, principals=principals,
+            permission=permission).count())
 
     def check(self, record, principals, permission):
         return self.check_on_model(record.__registry_name__,
@@ -13,6 +13,32 @@ class InstrumentedList:
     """ class of the return of the query.all() or the relationship list
     """
 
+    def prefetch(self, *fields):
+        """ Load the relationships of the fields for all the entries, by one
+        IN query by relationship level instead of one query by entry and
+        relationship::
+
+            orders = Order.query().all()
+            orders.prefetch('partner', 'lines.product')
+            [(order.partner.name, order.lines.product.name)
+             for order in orders]  # no more query
+
+        The fields can also be given as the fields specification of
+        ``to_dict``, see ``get_prefetch_paths``
+
+        :param fields: names or dotted paths of the relationships
+        :rtype: the instrumented list
+        :exception: SqlBaseException
+        """
+        entries = {}
+        for entry in self:
+            entries.setdefault(entry.__class__, []).append(entry)
+
+        for Model, model_entries in entries.items():
+            Model.prefetch(model_entries, *fields)
+
+        return self
+
     def __getattr__(self, name):
         if name in ('__emulates__', ):
             return None
@@ -7,7 +7,12 @@
 # obtain one at http://mozilla.org/MPL/2.0/.
 from anyblok import Declarations
 from anyblok.common import anyblok_column_prefix
+from anyblok.profiling import Explain
+from functools import wraps
+from sqlalchemy import tuple_
 from sqlalchemy.orm import query
+from ..exceptions import QueryException
+from .sqlbase import freeze_fields, PRIMARY_KEYS_CHUNK_SIZE
 
 
 @Declarations.register(Declarations.Core)
@@ -20,6 +25,178 @@ class Query(query.Query):
         """
         return self.registry.InstrumentedList(super(Query, self).all())
 
+    def get_model(self):
+        """ Return the model of the query
+
+        :rtype: the model
+        :exception: QueryException, if the query is not on only one model
+        """
+        if len(self.column_descriptions) != 1 or not hasattr(
+            self.column_descriptions[0]['type'], '__registry_name__'
+        ):
+            raise QueryException("The query must be on only one model")
+
+        return self.column_descriptions[0]['type']
+
+    def pluck(self, *fields):
+        """ Return the values of the fields for each entry of the query, only
+        the columns of the fields are selected::
+
+            Model.query().pluck('name')  # ['name 1', 'name 2', ...]
+            Model.query().pluck('id', 'name')  # [(1, 'name 1'), ...]
+
+        The values are formatted by the ``getter_format_value`` of the
+        fields, as the attributes of the instances
+
+        :param fields: names of the columns
+        :rtype: list of value if only one field is given, else list of tuple
+        :exception: QueryException
+        """
+        if not fields:
+            raise QueryException("No field to pluck")
+
+        Model = self.get_model()
+        columns, plan = Model.get_dict_rows_plan(*fields)
+        formats = []
+        for entry in plan:
+            if entry[0] != 'column':
+                raise QueryException(
+                    "Only the columns can be plucked, %r is not a column "
+                    "of %r" % (entry[1], Model.__registry_name__))
+
+            formats.append(entry[3])
+
+        rows = super(Query, self).with_entities(*columns).all()
+        if len(fields) == 1:
+            getter_format_value = formats[0]
+            if getter_format_value is None:
+                return [x[0] for x in rows]
+
+            return [getter_format_value(x[0]) for x in rows]
+
+        return [tuple(value if getter_format_value is None
+                      else getter_format_value(value)
+                      for getter_format_value, value in zip(formats, row))
+                for row in rows]
+
+    def lazy_all(self):
+        """ Return a lazy instrumented list of the result of the query, the
+        query is executed only when the entries are needed. Reading a column
+        attribute selects only this column, see ``pluck``::
+
+            Model.query().lazy_all().name  # SELECT name FROM ...
+
+        :rtype: LazyInstrumentedList
+        """
+        return get_lazy_instrumented_list(self.registry)(self)
+
+    def explain(self, analyze=False):
+        """ Return the plan of the query, to inspect it from
+        ``anyblok_interpreter``::
+
+            print(Model.query().filter(Model.name == 'test').explain())
+
+        :param analyze: if True, the query is executed to get the real costs
+            (``EXPLAIN (ANALYZE, BUFFERS)`` on postgresql)
+        :rtype: str, one line by row of the plan
+        """
+        rows = self.session.execute(
+            Explain(self.statement, analyze=analyze)).fetchall()
+        return '\n'.join(row[0] if len(row) == 1
+                         else ' | '.join(str(x) for x in row)
+                         for row in rows)
+
+    def iter_chunks(self, size=1000, keyset=False, expunge=True):
+        """ Iterate on the result of the query by instrumented list of
+        ``size`` entries, without loading all the result in memory::
+
+            for chunk in Model.query().iter_chunks(1000):
+                chunk.do_something()
+
+        * by default, the rows are read with a server side cursor
+          (``stream_results`` and ``yield_per``)
+        * with ``keyset=True``, the query is ordered by the primary keys of
+          its model, and each chunk is read by another query which starts
+          after the primary keys of the last entry of the previous chunk.
+          The query must not be ordered nor limited
+
+        :param size: number of entries by chunk
+        :param keyset: if True, read the chunks by keyset continuation
+        :param expunge: if True, the entries of a chunk are removed from the
+            session once the chunk is processed, after a flush
+        :rtype: iterator of InstrumentedList
+        :exception: QueryException
+        """
+        if keyset:
+            if self._order_by or self._limit is not None or (
+                self._offset is not None
+            ):
+                raise QueryException(
+                    "The chunks by keyset are ordered by the primary keys, "
+                    "the query must not have order_by, limit nor offset")
+
+            chunks = self.iter_chunks_by_keyset(size)
+        else:
+            chunks = self.iter_chunks_by_cursor(size)
+
+        return self.expunge_chunks(chunks, expunge)
+
+    def expunge_chunks(self, chunks, expunge):
+        for chunk in chunks:
+            try:
+                yield chunk
+            finally:
+                if expunge:
+                    self.expunge_chunk(chunk)
+
+    def iter_chunks_by_cursor(self, size):
+        query = self.execution_options(stream_results=True).yield_per(size)
+        chunk = self.registry.InstrumentedList()
+        for entry in super(Query, query).__iter__():
+            chunk.append(entry)
+            if len(chunk) == size:
+                yield chunk
+                chunk = self.registry.InstrumentedList()
+
+        if chunk:
+            yield chunk
+
+    def iter_chunks_by_keyset(self, size):
+        Model = self.get_model()
+        pks = Model.get_mapper_primary_keys()
+        columns = [getattr(Model, x) for x in pks]
+        query = self.order_by(*columns)
+        last = None
+        while True:
+            chunk_query = query
+            if last is not None and len(columns) == 1:
+                chunk_query = query.filter(columns[0] > last[0])
+            elif last is not None:
+                chunk_query = query.filter(tuple_(*columns) > tuple_(*last))
+
+            chunk = chunk_query.limit(size).all()
+            if not chunk:
+                break
+
+            last = [getattr(chunk[-1], x) for x in pks]
+            yield chunk
+            if len(chunk) < size:
+                break
+
+    def expunge_chunk(self, chunk):
+        """ Remove the instances of the chunk from the session, the session
+        is flushed before to keep the modifications
+        """
+        session = self.registry.session
+        self.registry.flush()
+        for entry in chunk:
+            entries = entry if isinstance(entry, tuple) else (entry,)
+            for instance in entries:
+                if hasattr(instance, '_sa_instance_state') and (
+                    instance in session
+                ):
+                    session.expunge(instance)
+
     def with_perm(self, principals, permission):
         """Add authorization pre- and post-filtering to query.
 
@@ -60,13 +237,212 @@ class Query(query.Query):
         else:
             return val.to_dict()
 
-    def dictall(self):
-        vals = self.all()
+    def dictall(self, *fields, hydrate=True):
+        """ Return the result of the query as a list of dict
+
+        ::
+
+            Model.query().dictall()
+            Model.query().dictall('name', ('partner', ('name',)))
+            Model.query().dictall('name', hydrate=False)
+
+        :param fields: the fields specification of ``to_dict``
+        :param hydrate: if False, the instances are not created, the values
+            are read in the rows of the query, see ``get_dict_rows``, else
+            the relationships to serialize are loaded with the instances,
+            see ``get_eager_load_options``
+        :rtype: list of dict
+        """
+        field2get = self.get_field_nams_in_column_description()
+        if not hydrate and not field2get:
+            return [x for x, _ in self.get_dict_rows(fields)]
+
+        fields = freeze_fields(fields)
+        query = self
+        if not field2get and len(self.column_descriptions) == 1:
+            # the relationships to serialize are loaded with the instances
+            # and not by one query by instance and relationship
+            query = self.options(
+                *self.get_model().get_eager_load_options(*fields))
+
+        vals = query.all()
         if not vals:
             return []
 
-        field2get = self.get_field_nams_in_column_description()
         if field2get:
             return [{x: getattr(y, z) for x, z in field2get} for y in vals]
-        else:
-            return vals.to_dict()
+
+        # the serializer is compiled once by model, the polymorphic
+        # queries can return the instances of many models
+        serializers = {}
+        res = []
+        for val in vals:
+            Model = val.__class__
+            if Model not in serializers:
+                serializers[Model] = Model.get_to_dict_serializer(*fields)
+
+            res.append(serializers[Model](val))
+
+        return res
+
+    def get_dict_rows(self, fields, keys=()):
+        """ Return the dict of the fields for each row of the query, without
+        creating the instances of the model
+
+        Only the mapped columns needed are selected, the relationships are
+        read by one query by relationship and by chunk of
+        ``PRIMARY_KEYS_CHUNK_SIZE`` values, see ``get_dict_rows_plan``
+
+        :param fields: the fields specification of ``to_dict``
+        :param keys: other columns to select, their values are returned
+            with the dict
+        :rtype: list of tuple (dict, tuple of the values of the keys)
+        :exception: QueryException
+        """
+        Model = self.get_model()
+        columns, plan = Model.get_dict_rows_plan(*freeze_fields(fields))
+        nb_columns = len(columns)
+        rows = super(Query, self).with_entities(
+            *(list(columns) + list(keys))).all()
+        vals = [{} for row in rows]
+        for entry in plan:
+            if entry[0] == 'column':
+                _, field, index, getter_format_value = entry
+                for val, row in zip(vals, rows):
+                    value = row[index]
+                    if getter_format_value is not None:
+                        value = getter_format_value(value)
+
+                    val[field] = value
+            else:
+                self.get_dict_rows_relationship(vals, rows, entry)
+
+        return [(val, tuple(row[nb_columns:])) for val, row in zip(vals, rows)]
+
+    def get_dict_rows_relationship(self, vals, rows, entry):
+        """ Add in the dicts the values of the relationship, the values are
+        read by batch on the remote model
+
+        :param vals: the dicts of the rows
+        :param rows: the rows with the local columns of the relationship
+        :param entry: the plan of the relationship
+        """
+        _, field, indexes, Remote, remote_columns, related_fields, uselist = (
+            entry)
+        keys = [tuple(row[x] for x in indexes) for row in rows]
+        values = list({x for x in keys if None not in x})
+        related = {}
+        for i in range(0, len(values), PRIMARY_KEYS_CHUNK_SIZE):
+            query = Remote.query().filter(Remote.get_where_clause_from_values(
+                remote_columns, values[i:i + PRIMARY_KEYS_CHUNK_SIZE]))
+            for val, key in query.get_dict_rows(related_fields,
+                                                keys=remote_columns):
+                if uselist:
+                    related.setdefault(key, []).append(val)
+                else:
+                    related[key] = val
+
+        for val, key in zip(vals, keys):
+            val[field] = related.get(key, [] if uselist else None)
+
+
+LAZY_LIST_METHODS = (
+    '__add__', '__contains__', '__delitem__', '__eq__', '__ge__',
+    '__getitem__', '__gt__', '__iadd__', '__imul__', '__iter__', '__le__',
+    '__len__', '__lt__', '__mul__', '__ne__', '__repr__', '__reversed__',
+    '__rmul__', '__setitem__', 'append', 'clear', 'copy', 'count', 'extend',
+    'index', 'insert', 'pop', 'remove', 'reverse', 'sort')
+
+
+def wrap_lazy_list_method(name):
+    """ Return the method of list which loads the entries of the lazy
+    instrumented lists before to be called
+    """
+    method = getattr(list, name)
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._lazy_load()
+        for arg in args:
+            if isinstance(arg, LazyInstrumentedList):
+                arg._lazy_load()
+
+        return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def lazy_list_methods(cls):
+    """ Decorator of the lazy instrumented list, the methods of list load
+    the entries before to be called
+    """
+    for name in LAZY_LIST_METHODS:
+        setattr(cls, name, wrap_lazy_list_method(name))
+
+    return cls
+
+
+@lazy_list_methods
+class LazyInstrumentedList:
+    """ Result of ``Query.lazy_all``, mixed with the instrumented list of
+    the registry, see ``get_lazy_instrumented_list``. The entries are loaded
+    only once, when they are needed
+
+    Before the entries are loaded, reading a column attribute selects only
+    this column instead of loading the instances, once by column
+    """
+
+    def __init__(self, query):
+        super(LazyInstrumentedList, self).__init__()
+        self._lazy_query = query
+        self._lazy_loaded = False
+        self._lazy_columns = None
+        self._lazy_values = {}
+
+    # the names are prefixed to not hide the attributes of the entries
+
+    def _lazy_load(self):
+        """ Load the entries of the query, only the first time """
+        if not self._lazy_loaded:
+            self._lazy_loaded = True
+            list.extend(self, self._lazy_query.all())
+
+    def _lazy_column_fields(self):
+        if self._lazy_columns is None:
+            try:
+                Model = self._lazy_query.get_model()
+                self._lazy_columns = Model.get_column_fields()
+            except QueryException:
+                self._lazy_columns = frozenset()
+
+        return self._lazy_columns
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name.startswith('_lazy_'):
+            raise AttributeError(name)
+
+        if not self._lazy_loaded and name in self._lazy_column_fields():
+            if name not in self._lazy_values:
+                self._lazy_values[name] = self._lazy_query.pluck(name)
+
+            return self._lazy_values[name]
+
+        self._lazy_load()
+        return super(LazyInstrumentedList, self).__getattr__(name)
+
+
+def get_lazy_instrumented_list(registry):
+    """ Return the class of the lazy instrumented list of the registry, the
+    class is built once by instrumented list of the registry
+
+    :param registry: the registry of the query
+    :rtype: subclass of LazyInstrumentedList and of registry.InstrumentedList
+    """
+    InstrumentedList = registry.InstrumentedList
+    cls = getattr(registry, 'LazyInstrumentedList', None)
+    if cls is None or InstrumentedList not in cls.__bases__:
+        cls = type('LazyInstrumentedList',
+                   (LazyInstrumentedList, InstrumentedList), {})
+        registry.LazyInstrumentedList = cls
+
+    return cls
@@ -7,6 +7,7 @@
 # obtain one at http://mozilla.org/MPL/2.0/.
 from sqlalchemy.orm import Session as SA_Session
 from anyblok import Declarations
+from anyblok.profiling import reset_session_statistics
 
 
 @Declarations.register(Declarations.Core)
@@ -17,3 +18,10 @@ class Session(SA_Session):
     def __init__(self, *args, **kwargs):
         kwargs['query_cls'] = self.registry_query
         super(Session, self).__init__(*args, **kwargs)
+
+    def close(self):
+        """ Overwrite to drop the statistics of the session """
+        # ``close_all`` closes the sessions of the previous loads of the
+        # registry too, their class does not inherit this ``Session``
+        super().close()
+        reset_session_statistics(self)
@@ -5,18 +5,26 @@
 # This Source Code Form is subject to the terms of the Mozilla Public License,
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
-from anyblok.declarations import Declarations, classmethod_cache
-from anyblok.field import FieldException
-from anyblok.column import Column
-from anyblok.mapper import FakeColumn, FakeRelationShip
-from anyblok.relationship import RelationShip, Many2Many
+from anyblok.declarations import (Declarations, classmethod_cache,
+                                  baked_query)
+from anyblok.field import Field, FieldException
 from anyblok.common import anyblok_column_prefix
 from ..exceptions import SqlBaseException
-from sqlalchemy.orm import aliased, ColumnProperty
-from sqlalchemy.sql.expression import true
-from sqlalchemy import or_, and_, inspect
+from sqlalchemy.orm import (aliased, ColumnProperty, RelationshipProperty,
+                            Query, Load)
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import (or_, and_, inspect, tuple_, any_, bindparam,
+                        types)
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy_utils.models import NO_VALUE, NOT_LOADED_REPR
 from sqlalchemy.orm.session import object_state
+from operator import attrgetter
+from io import StringIO
+
+
+"""Maximum number of primary keys in one query of from_multi_primary_keys"""
+PRIMARY_KEYS_CHUNK_SIZE = 1000
 
 
 class uniquedict(dict):
@@ -30,6 +38,83 @@ class uniquedict(dict):
                 self[key].append(attr)
 
 
+def freeze_fields(fields):
+    """ Return the fields specification of ``to_dict`` with tuples instead
+    of lists, to be hashable
+    """
+    if isinstance(fields, (tuple, list)):
+        return tuple(freeze_fields(x) for x in fields)
+
+    return fields
+
+
+def wrap_related_serializer(related_fields):
+    """ Return the function which serializes a related instance with the
+    compiled serializer of its model, see ``get_to_dict_serializer``. The
+    serializer is got once by model, the models which overwrite ``to_dict``
+    are serialized by their ``to_dict``
+    """
+    serializers = {}
+
+    def serialize(instance):
+        Model = instance.__class__
+        serializer = serializers.get(Model)
+        if serializer is None:
+            if Model.to_dict is SqlMixin.to_dict:
+                serializer = Model.get_to_dict_serializer(*related_fields)
+            else:
+                def serializer(instance):
+                    return instance.to_dict(*related_fields)
+
+            serializers[Model] = serializer
+
+        return serializer(instance)
+
+    return serialize
+
+
+def coerce_column_value(column, value):
+    """ Return the value converted to the python type of the column, a
+    ``str`` given for an integer primary key would neither be bound in an
+    ``ARRAY`` of integer nor match the identity of the instance
+    """
+    if value is None:
+        return value
+
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+
+    if isinstance(value, python_type):
+        return value
+
+    try:
+        return python_type(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def copy_format_value(value):
+    """ Return the value, processed by the type of the column, in the text
+    format of the ``COPY`` of postgresql
+    """
+    # the binaries are wrapped by the DBAPI
+    value = getattr(value, 'adapted', value)
+    if value is None:
+        return '\\N'
+    elif isinstance(value, (bytes, memoryview)):
+        value = '\\x' + bytes(value).hex()
+    elif isinstance(value, (list, tuple, dict)):
+        raise SqlBaseException(
+            "The value %r can not be inserted by COPY" % (value,))
+    else:
+        value = str(value)
+
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace(
+        '\n', '\\n').replace('\r', '\\r')
+
+
 class SqlMixin:
 
     def __repr__(self):
@@ -110,6 +195,16 @@ class SqlMixin:
 
         return cls.registry.query(cls)
 
+    @classmethod
+    def has_default_query(cls):
+        """ Return True if the ``query`` method is not overwritten by the
+        model. The baked queries and the identity map do not use ``query``,
+        they would bypass the criteria added by an overwrite
+
+        :rtype: bool
+        """
+        return cls.query.__func__ is SqlMixin.query.__func__
+
     is_sql = True
 
     @classmethod
@@ -143,41 +238,213 @@ class SqlMixin:
 
         return [getattr(cls, k) == v for k, v in pks.items()]
 
+    @classmethod
+    def get_mapper_primary_keys(cls):
+        """ return the name of the primary keys in the order of the mapper
+
+        :rtype: list of the primary keys name
+        """
+        mapper = cls.__mapper__
+        res = []
+        for column in mapper.primary_key:
+            pk = mapper.get_property_by_column(column).key
+            if pk.startswith(anyblok_column_prefix):
+                pk = pk[len(anyblok_column_prefix):]
+
+            res.append(pk)
+
+        return res
+
+    @classmethod
+    def get_identity_from_primary_keys(cls, **pks):
+        """ return the identity, the tuple of the primary keys values in the
+        order of the mapper, used by the session identity map
+
+        :param \*\*pks: dict {primary_key: value, ...}
+        :rtype: tuple
+        :exception: SqlBaseException
+        """
+        identity = []
+        columns = cls.__mapper__.primary_key
+        for pk, column in zip(cls.get_mapper_primary_keys(), columns):
+            if pk not in pks:
+                raise SqlBaseException("No primary key %s filled for %r" % (
+                    pk, cls.__registry_name__))
+
+            identity.append(coerce_column_value(column, pks[pk]))
+
+        return tuple(identity)
+
+    @baked_query
+    def baked_query_all(cls, query):
+        """ Baked query of the instances of the model, used to get the
+        instances by their primary keys without building the query again
+        """
+        return query
+
     @classmethod
     def from_primary_keys(cls, **pks):
         """ return the instance of the model from the primary keys
 
+        The instance is taken in the session if it is already loaded, else
+        only one query is done. If the model overwrites ``query``, the
+        instance is always got by ``query``
+
         :param \*\*pks: dict {primary_key: value, ...}
         :rtype: instance of the model
         """
-        where_clause = cls.get_where_clause_from_primary_keys(**pks)
-        query = cls.query().filter(*where_clause)
-        if query.count():
-            return query.first()
+        identity = cls.get_identity_from_primary_keys(**pks)
+        if len(pks) > len(identity) or not cls.has_default_query():
+            # other criteria than the primary keys, no identity lookup
+            where_clause = cls.get_where_clause_from_primary_keys(**pks)
+            return cls.query().filter(*where_clause).first()
+
+        return cls.baked_query_all().get(identity)
+
+    @classmethod
+    def get_many(cls, *pks):
+        """ return the instances of the model from the primary keys, in the
+        same order than the primary keys::
+
+            Model.get_many({'id': 1}, {'id': 2})
+            # or, if the model has only one primary key
+            Model.get_many(1, 2)
+
+        The instances already loaded in the session are taken from the
+        session, the others are loaded by chunk, with one query by chunk.
+        ``None`` is returned for the primary keys not found
+
+        :param \*pks: list of dict {primary_key: value, ...} or of value
+        :rtype: list of instances of the model
+        """
+        mapper_pks = cls.get_mapper_primary_keys()
+        identities = []
+        for _pks in pks:
+            if isinstance(_pks, dict):
+                identities.append(cls.get_identity_from_primary_keys(**_pks))
+            elif len(mapper_pks) == 1:
+                identities.append((coerce_column_value(
+                    cls.__mapper__.primary_key[0], _pks),))
+            else:
+                raise SqlBaseException(
+                    "%r has more than one primary key, get_many waits "
+                    "dicts" % cls.__registry_name__)
 
-        return None
+        found = cls.get_instances_from_identities(identities)
+        return [found.get(identity) for identity in identities]
 
     @classmethod
-    def from_multi_primary_keys(cls, *pks):
+    def from_multi_primary_keys(cls, *pks, chunk_size=None):
         """ return the instances of the model from the primary keys
 
+        The instances already loaded in the session are not queried again,
+        the others are loaded by chunk of ``chunk_size`` primary keys, with
+        one query by chunk
+
         :param \*pks: list of dict [{primary_key: value, ...}]
-        :rtype: instances of the model
+        :param chunk_size: number of primary keys by query, by default
+            ``PRIMARY_KEYS_CHUNK_SIZE``
+        :rtype: instances of the model, in the order of the primary keys
         """
-        where_clause = []
-        for _pks in pks:
-            where_clause.append(cls.get_where_clause_from_primary_keys(**_pks))
+        identities = [cls.get_identity_from_primary_keys(**_pks)
+                      for _pks in pks]
+        found = cls.get_instances_from_identities(
+            identities, chunk_size=chunk_size)
+        res = cls.registry.InstrumentedList()
+        for identity in identities:
+            instance = found.pop(identity, None)
+            if instance is not None:
+                res.append(instance)
 
-        if not where_clause:
-            return []
+        return res
+
+    @classmethod
+    def get_instances_from_identities(cls, identities, chunk_size=None):
+        """ return the instances of the identities, from the identity map
+        of the session, if the model does not overwrite ``query``, or from
+        the database
+
+        :param identities: list of tuple of the primary keys values in the
+            order of the mapper
+        :param chunk_size: number of primary keys by query, by default
+            ``PRIMARY_KEYS_CHUNK_SIZE``
+        :rtype: dict {identity: instance}
+        """
+        session = cls.registry.session
+        mapper = cls.__mapper__
+        use_identity_map = cls.has_default_query()
+        found = {}
+        missing = []
+        for identity in identities:
+            if identity in found:
+                continue
+
+            instance = None
+            if use_identity_map:
+                instance = session.identity_map.get(
+                    mapper.identity_key_from_primary_key(identity))
 
-        where_clause = or_(*[and_(*x) for x in where_clause])
+            if instance is not None and instance not in session.deleted:
+                found[identity] = instance
+            else:
+                found[identity] = None
+                missing.append(identity)
+
+        chunk_size = chunk_size or PRIMARY_KEYS_CHUNK_SIZE
+        for i in range(0, len(missing), chunk_size):
+            query = cls.query().filter(cls.get_where_clause_from_identities(
+                missing[i:i + chunk_size]))
+            for instance in query:
+                identity = tuple(mapper.primary_key_from_instance(instance))
+                found[identity] = instance
+
+        return {x: y for x, y in found.items() if y is not None}
 
-        query = cls.query().filter(where_clause)
-        if query.count():
-            return query.all()
+    @classmethod
+    def get_where_clause_from_identities(cls, identities):
+        """ return the where clause to find the objects of the identities
 
-        return []
+        * one primary key: ``pk = ANY(:array)`` on postgresql for the
+          integer and string columns, else ``pk IN (...)``
+        * many primary keys: ``(pk1, pk2) IN ((...), ...)``, or a list of
+          ``OR`` if the dialect does not support the tuple
+
+        :param identities: list of tuple of the primary keys values in the
+            order of the mapper
+        :rtype: where clause
+        """
+        columns = [getattr(cls, x) for x in cls.get_mapper_primary_keys()]
+        return cls.get_where_clause_from_values(columns, identities)
+
+    @classmethod
+    def get_where_clause_from_values(cls, columns, values):
+        """ return the where clause to find the rows whose the columns have
+        one of the tuples of values, see ``get_where_clause_from_identities``
+
+        :param columns: list of the columns
+        :param values: list of tuple of the values in the order of the columns
+        :rtype: where clause
+        """
+        dialect = cls.registry.engine.dialect.name
+        if len(columns) == 1:
+            column = columns[0]
+            values = [coerce_column_value(column, x[0]) for x in values]
+            sqltype = column.type
+            if dialect == 'postgresql' and isinstance(
+                sqltype, (types.Integer, types.String)
+            ):
+                return column == any_(bindparam(
+                    None, values, type_=ARRAY(sqltype)))
+
+            return column.in_(values)
+
+        if dialect in ('sqlite', 'mssql'):
+            return or_(*[
+                and_(*[column == value
+                       for column, value in zip(columns, identity)])
+                for identity in values])
+
+        return tuple_(*columns).in_(values)
 
     def to_primary_keys(self):
         """ return the primary keys and values for this instance
@@ -187,30 +454,38 @@ class SqlMixin:
         pks = self.get_primary_keys()
         return {x: getattr(self, x) for x in pks}
 
+    @classmethod
+    def get_fields_metadata(cls):
+        """ Return the definition of the fields of the model and of the
+        models it depends on. The definitions come from the catalog built
+        during the assembly, no query is done
+
+        :rtype: dict {field name: (model of the field, values)}
+        """
+        metadata = cls.registry.loaded_namespaces_metadata
+        res = {}
+        for registry_name in cls.__depends__:
+            res.update(metadata.get(registry_name, {}))
+
+        res.update(metadata.get(cls.__registry_name__, {}))
+        return res
+
     @classmethod_cache()
     def get_primary_keys(cls):
         """ return the name of the primary keys of the model
 
         :type: list of the primary keys name
         """
-        C = cls.registry.System.Column
-        query = C.query()
-        query = query.filter(C.model.in_(cls.get_all_registry_names()))
-        query = query.filter(C.primary_key == true())
-        return query.all().name
+        fields = cls.get_fields_metadata()
+        return [name for name, (_, values) in fields.items()
+                if values.get('primary_key')]
 
     @classmethod_cache()
     def _fields_description(cls):
         """ Return the information of the Field, Column, RelationShip """
-        Field = cls.registry.System.Field
-        res = {}
-        for registry_name in cls.__depends__:
-            query = Field.query().filter(Field.model == registry_name)
-            res.update({x.name: x._description() for x in query.all()})
-
-        query = Field.query().filter(Field.model == cls.__registry_name__)
-        res.update({x.name: x._description() for x in query.all()})
-        return res
+        fields = cls.get_fields_metadata()
+        return {name: model.get_description(values)
+                for name, (model, values) in fields.items()}
 
     @classmethod
     def fields_description(cls, fields=None):
@@ -237,7 +512,8 @@ class SqlMixin:
 
         return hybrid_property_columns
 
-    def _format_field(self, field):
+    @classmethod
+    def _format_field(cls, field):
         related_fields = None
         if isinstance(field, (tuple, list)):
             if len(field) == 1:
@@ -327,44 +603,382 @@ class SqlMixin:
                  ]}
              }
         """
-        result = {}
-        cls = self.__class__
-        fields = fields if fields else cls.fields_description().keys()
+        serializer = self.__class__.get_to_dict_serializer(
+            *freeze_fields(fields))
+        return serializer(self)
+
+    @classmethod_cache()
+    def get_to_dict_serializer(cls, *fields):
+        """ Compile the fields specification of ``to_dict`` and return the
+        function which serializes one instance of the model
+
+        The attribute, the property and the related fields of each field are
+        found only once by specification, not for each serialized instance.
+        The related instances are serialized by the compiled serializer of
+        their model
 
+        :param fields: the fields specification of ``to_dict``, without list
+        :rtype: function(instance) -> dict
+        """
+        plan = []
+        fields = fields if fields else cls.fields_description().keys()
         for field in fields:
             # if field is ("relation_name", ("list", "of", "relation",
             # "fields")), deal with it.
-            field, related_fields = self._format_field(field)
-            # Get the actual data
-            field_value, field_property = getattr(self, field), None
+            field, related_fields = cls._format_field(field)
+            field_property = None
             try:
                 field_property = getattr(getattr(cls, field), 'property', None)
             except FieldException:
                 pass
 
-            # Deal with this data
-            if field_property is None:
-                # it is the case of field function (hyprid property)
-                result[field] = field_value
-            elif field_value is None or type(field_property) == ColumnProperty:
-                # If value is None, then do not go any further whatever
-                # the column property tells you.
-                result[field] = field_value
+            if field_property is None or type(field_property) is ColumnProperty:
+                # it is the case of field function (hyprid property) or
+                # column, the value is used as it
+                plan.append((field, attrgetter(field), None, None))
+                continue
+
+            # it is should be RelationshipProperty
+            if related_fields is None:
+                # If there is no field list to the relation,
+                # use only primary keys
+                related_fields = field_property.mapper.entity
+                related_fields = related_fields.get_primary_keys()
+
+            # One2One, One2Many, Many2One or Many2Many ?
+            plan.append((field, attrgetter(field),
+                         wrap_related_serializer(
+                             freeze_fields(related_fields)),
+                         field_property.uselist))
+
+        def serializer(instance):
+            result = {}
+            for field, getter, serialize, uselist in plan:
+                field_value = getter(instance)
+                if uselist is None or field_value is None:
+                    # If value is None, then do not go any further whatever
+                    # the column property tells you.
+                    result[field] = field_value
+                elif uselist:
+                    result[field] = [serialize(r) for r in field_value]
+                else:
+                    result[field] = serialize(field_value)
+
+            return result
+
+        return serializer
+
+    @classmethod_cache()
+    def get_eager_load_paths(cls, *fields):
+        """ Return the paths of the relationships serialized by the fields
+        specification of ``to_dict``
+
+        :param fields: the fields specification of ``to_dict``, without list
+        :rtype: tuple of paths, a path is a tuple of (attribute, uselist)
+        """
+        paths = []
+        fields = fields if fields else cls.fields_description().keys()
+        for field in fields:
+            field, related_fields = cls._format_field(field)
+            try:
+                attribute = getattr(cls, field)
+            except (FieldException, AttributeError):
+                # the field can be defined only on a polymorphic model
+                continue
+
+            field_property = getattr(attribute, 'property', None)
+            if field_property is None or type(field_property) is ColumnProperty:
+                continue
+
+            Remote = field_property.mapper.entity
+            if related_fields is None:
+                related_fields = Remote.get_primary_keys()
+
+            path = ((attribute, field_property.uselist),)
+            sub_paths = Remote.get_eager_load_paths(
+                *freeze_fields(related_fields))
+            if sub_paths:
+                paths.extend(path + sub_path for sub_path in sub_paths)
             else:
-                # it is should be RelationshipProperty
-                if related_fields is None:
-                    # If there is no field list to the relation,
-                    # use only primary keys
-                    related_fields = field_property.mapper.entity
-                    related_fields = related_fields.get_primary_keys()
-                # One2One, One2Many, Many2One or Many2Many ?
-                if field_property.uselist:
-                    result[field] = [r.to_dict(*related_fields)
-                                     for r in field_value]
+                paths.append(path)
+
+        return tuple(paths)
+
+    @classmethod_cache()
+    def get_eager_load_options(cls, *fields):
+        """ Return the loader options which load, with the instances of a
+        query, the relationships serialized by the fields specification of
+        ``to_dict``
+
+        * One2Many and Many2Many: ``selectinload``, one IN query by level
+        * Many2One and One2One: ``joinedload``, in the query of the parent
+
+        :param fields: the fields specification of ``to_dict``, without list
+        :rtype: tuple of loader options
+        """
+        options = []
+        for path in cls.get_eager_load_paths(*fields):
+            option = Load(cls)
+            for attribute, uselist in path:
+                if uselist:
+                    option = option.selectinload(attribute)
+                else:
+                    option = option.joinedload(attribute)
+
+            options.append(option)
+
+        return tuple(options)
+
+    @classmethod_cache()
+    def get_prefetch_paths(cls, *fields):
+        """ Return the paths of the relationships to prefetch
+
+        :param fields: fields specification of ``to_dict`` (``'lines'``,
+            ``('lines', ('product',))``) or dotted paths of relationships
+            (``'lines.product'``), if no field is given, all the
+            relationships of the model are prefetched. As with ``to_dict``,
+            the names without dot which are not relationships (the columns)
+            are ignored, but every name of a dotted path must be a
+            relationship
+        :rtype: tuple of paths, a path is a tuple of RelationshipProperty
+        :exception: SqlBaseException
+        """
+        if not fields:
+            fields = (None,)
+
+        paths = []
+        for field in fields:
+            if not isinstance(field, str) or '.' not in field:
+                eager_load_paths = cls.get_eager_load_paths(
+                    *((field,) if field is not None else ()))
+                paths.extend(tuple(attribute.property for attribute, _ in x)
+                             for x in eager_load_paths)
+                continue
+
+            path = []
+            Model = cls
+            for name in field.split('.'):
+                field_property = getattr(getattr(Model, name, None),
+                                         'property', None)
+                if not isinstance(field_property, RelationshipProperty):
+                    raise SqlBaseException(
+                        "%r in %r is not a relationship of %r" % (
+                            name, field, Model.__registry_name__))
+
+                path.append(field_property)
+                Model = field_property.mapper.entity
+
+            paths.append(tuple(path))
+
+        return tuple(paths)
+
+    @classmethod
+    def prefetch(cls, instances, *fields):
+        """ Load the relationships of the fields for all the instances, by
+        one IN query by relationship level instead of one query by instance
+        and relationship::
+
+            Model.prefetch(instances, 'partner', 'lines.product')
+
+        The relationships already loaded are not read again
+
+        :param instances: list of instances of the model
+        :param fields: see ``get_prefetch_paths``
+        :exception: SqlBaseException
+        """
+        tree = {}
+        for path in cls.get_prefetch_paths(*freeze_fields(fields)):
+            node = tree
+            for field_property in path:
+                node = node.setdefault(field_property, {})
+
+        cls.prefetch_tree(instances, tree)
+
+    @classmethod
+    def prefetch_tree(cls, instances, tree):
+        """ Load the relationships of the tree, then the relationships of
+        the sub trees on the related instances
+
+        :param instances: list of instances of the model
+        :param tree: dict {RelationshipProperty: sub tree}
+        """
+        for field_property, sub_tree in tree.items():
+            related = cls.prefetch_relationship(instances, field_property)
+            if sub_tree and related:
+                field_property.mapper.entity.prefetch_tree(related, sub_tree)
+
+    @classmethod
+    def prefetch_relationship(cls, instances, field_property):
+        """ Load one relationship for the persistent instances which have
+        not loaded it yet, by one IN query
+
+        :param instances: list of instances of the model
+        :param field_property: the RelationshipProperty to load
+        :rtype: list of the related instances of all the instances
+        """
+        key = field_property.key
+        states = [object_state(x) for x in instances]
+        todo = [x.obj() for x in states
+                if x.key is not None and key in x.unloaded]
+        if todo:
+            if field_property.secondary is not None:
+                pairs = field_property.synchronize_pairs
+            else:
+                pairs = field_property.local_remote_pairs
+
+            getters = [
+                attrgetter(field_property.parent.get_property_by_column(
+                    local_column).key)
+                for local_column, _ in pairs]
+            keys = [tuple(getter(x) for getter in getters) for x in todo]
+            related = cls.get_prefetch_related(
+                field_property, [x for _, x in pairs],
+                list({x for x in keys if None not in x}))
+            for instance, value in zip(todo, keys):
+                value = related.get(value, [])
+                if not field_property.uselist:
+                    value = value[0] if value else None
+
+                set_committed_value(instance, key, value)
+
+        res = []
+        for instance in instances:
+            value = getattr(instance, key)
+            if field_property.uselist:
+                res.extend(value)
+            elif value is not None:
+                res.append(value)
+
+        return res
+
+    @classmethod
+    def get_prefetch_related(cls, field_property, remote_columns, values):
+        """ Return the related instances of a relationship by the values of
+        the local columns
+
+        :param field_property: the RelationshipProperty to load
+        :param remote_columns: the columns of the remote or of the secondary
+            table, joined with the local columns
+        :param values: list of tuple of the values of the local columns
+        :rtype: dict {values: [related instance, ...]}
+        """
+        Remote = field_property.mapper.entity
+        query = Remote.query()
+        if field_property.secondary is not None:
+            query = query.add_columns(*remote_columns).join(
+                field_property.secondary, field_property.secondaryjoin)
+        else:
+            getters = [
+                attrgetter(field_property.mapper.get_property_by_column(
+                    remote_column).key)
+                for remote_column in remote_columns]
+
+        if field_property.order_by:
+            query = query.order_by(*field_property.order_by)
+
+        related = {}
+        for i in range(0, len(values), PRIMARY_KEYS_CHUNK_SIZE):
+            chunk = query.filter(Remote.get_where_clause_from_values(
+                remote_columns, values[i:i + PRIMARY_KEYS_CHUNK_SIZE]))
+            for row in chunk:
+                if field_property.secondary is not None:
+                    instance, value = row[0], tuple(row[1:])
                 else:
-                    result[field] = field_value.to_dict(*related_fields)
+                    instance = row
+                    value = tuple(getter(row) for getter in getters)
+
+                related.setdefault(value, []).append(instance)
 
-        return result
+        return related
+
+    @classmethod_cache()
+    def get_dict_rows_plan(cls, *fields):
+        """ Compile the fields specification of ``Query.dictall`` without
+        hydration, the values are read in the rows of the query
+
+        * column: the mapped column is selected and the value is formatted
+          by the ``getter_format_value`` method of the field
+        * Many2One, One2One and One2Many: the local columns of the
+          relationship are selected, the related values are found by
+          another query on the remote model
+
+        :param fields: the fields specification of ``to_dict``, without list
+        :rtype: (list of the columns to select, list of the fields plan)
+        :exception: SqlBaseException
+        """
+        columns = []
+        plan = []
+        fields = fields if fields else cls.fields_description().keys()
+        descriptors = cls.__mapper__.all_orm_descriptors
+        for field in fields:
+            field, related_fields = cls._format_field(field)
+            field_property = None
+            try:
+                field_property = getattr(getattr(cls, field), 'property', None)
+            except FieldException:
+                pass
+
+            if field_property is None:
+                raise SqlBaseException(
+                    "%r is not mapped on %r, it can not be read without "
+                    "instance" % (field, cls.__registry_name__))
+            elif type(field_property) is ColumnProperty:
+                anyblok_field = getattr(descriptors.get(field),
+                                        'anyblok_field', None)
+                getter_format_value = None
+                if anyblok_field is not None and (
+                    type(anyblok_field).getter_format_value is not
+                    Field.getter_format_value
+                ):
+                    getter_format_value = anyblok_field.getter_format_value
+
+                plan.append(('column', field, len(columns),
+                             getter_format_value))
+                columns.append(getattr(cls, field))
+                continue
+            elif field_property.secondary is not None:
+                raise SqlBaseException(
+                    "The Many2Many %r of %r can not be read without "
+                    "instance" % (field, cls.__registry_name__))
+
+            if related_fields is None:
+                related_fields = field_property.mapper.entity
+                related_fields = related_fields.get_primary_keys()
+
+            indexes = []
+            remote_columns = []
+            for local_column, remote_column in (
+                field_property.local_remote_pairs
+            ):
+                indexes.append(len(columns))
+                columns.append(local_column)
+                remote_columns.append(remote_column)
+
+            plan.append(('relationship', field, tuple(indexes),
+                         field_property.mapper.entity, remote_columns,
+                         freeze_fields(related_fields),
+                         field_property.uselist))
+
+        return columns, plan
+
+    @classmethod_cache()
+    def get_column_fields(cls):
+        """ Return the names of the fields mapped on a column, whose values
+        can be read without instance, see ``Query.pluck``
+
+        :rtype: frozenset of the names of the fields
+        """
+        res = set()
+        for field in cls.fields_description():
+            try:
+                field_property = getattr(getattr(cls, field), 'property', None)
+            except FieldException:
+                continue
+
+            if type(field_property) is ColumnProperty:
+                res.add(field)
+
+        return frozenset(res)
 
     @classmethod_cache()
     def getFieldType(cls, name):
@@ -379,55 +993,41 @@ class SqlMixin:
         :param name: name of the column
         :rtype: String, the name of the Type of column used
         """
-        Field = cls.registry.System.Field
-        query = Field.query()
-        query = query.filter(Field.name == name)
-        query = query.filter(Field.model.in_(cls.get_all_registry_names()))
-        query = query.limit(1)
-        return query.one().ftype
+        fields = cls.get_fields_metadata()
+        if name not in fields:
+            raise SqlBaseException(
+                "%r has not got any field %r" % (cls.__registry_name__, name))
 
-    @classmethod_cache()
+        return fields[name][1]['ftype']
+
+    @classmethod
+    def get_relationship_index(cls):
+        """ Return the index of the relationships of the model, built during
+        the assembly, see ``Model.load_relationship_index``
+
+        :rtype: dict
+        """
+        return cls.registry.loaded_namespaces_relationships[
+            cls.__registry_name__]
+
+    @classmethod
     def find_remote_attribute_to_expire(cls, *fields):
+        """ Find the attributes of the remote models to expire when the
+        fields are modified
+
+        :param \*fields: lists of the attribute name
+        :rtype: dict {attribute name: [remote attribute name, ...]}
+        """
         res = uniquedict()
-        _fields = []
-        _fields.extend(fields)
-        model = get_model_information(cls.registry, cls.__registry_name__)
-        while _fields:
-            field = _fields.pop()
+        expire = cls.get_relationship_index()['expire']
+        for field in fields:
             field = field if isinstance(field, str) else field.name
-            _field = model[field]
-
-            if isinstance(_field, (Column, FakeColumn)):
-                _fields.extend(x for x, y in model.items()
-                               if (isinstance(y, RelationShip) and
-                                   not isinstance(y, Many2Many))
-                               for mapper in y.column_names
-                               if mapper.attribute_name == field)
-                if isinstance(_field, Column) and _field.foreign_key:
-                    rmodel = cls.registry.loaded_namespaces_first_step[
-                        _field.foreign_key.model_name]
-                    for rc in [x for x, y in rmodel.items()
-                               if isinstance(y, RelationShip)
-                               for mapper in y.remote_columns
-                               if mapper.attribute_name == field]:
-                        rfield = rmodel[rc]
-                        if isinstance(rfield, FakeRelationShip):
-                            res.add_in_res(rfield.mapper.attribute_name, [rc])
-                        elif (isinstance(rfield, RelationShip) and
-                              'backref' in rfield.kwargs):
-                            res.add_in_res(
-                                rfield.kwargs['backref'][0], [rc])
-
-            elif (isinstance(_field, RelationShip) and
-                  not isinstance(_field, Many2Many) and
-                  'backref' in _field.kwargs):
-                res.add_in_res(field, [_field.kwargs['backref'][0]])
-            elif isinstance(_field, FakeRelationShip):
-                res.add_in_res(field, [_field.mapper.attribute_name])
+            for attribute, remote_attribute in expire.get(field, ()):
+                res.add_in_res(attribute, [remote_attribute])
 
         return res
 
-    @classmethod_cache()
+    @classmethod
     def find_relationship(cls, *fields):
         """ Find column and relation ship link with the column or relationship
         passed in fields.
@@ -436,55 +1036,33 @@ class SqlMixin:
         :rtype: list of the attribute name of the attribute and relation ship
         """
         res = []
-        _fields = []
-        _fields.extend(fields)
-        model = get_model_information(cls.registry, cls.__registry_name__)
-        while _fields:
-            field = _fields.pop()
+        linked = cls.get_relationship_index()['linked']
+        for field in fields:
             if not isinstance(field, str):
                 field = field.name
 
-            if field in res:
-                continue
-
-            _field = model[field]
-            res.append(field)
-            if isinstance(_field, (Column, FakeColumn)):
-                _fields.extend(x
-                               for x, y in model.items()
-                               if (isinstance(y, RelationShip) and
-                                   not isinstance(y, Many2Many))
-                               for mapper in y.column_names
-                               if mapper.attribute_name == field)
-            elif (isinstance(_field, RelationShip) and
-                  not isinstance(_field, Many2Many)):
-                for mapper in _field.column_names:
-                    _fields.append(mapper.attribute_name)
+            for name in linked.get(field, ()):
+                if name not in res:
+                    res.append(name)
 
         return res
 
 
-def get_model_information(registry, registry_name):
-    model = registry.loaded_namespaces_first_step[registry_name]
-    for depend in model['__depends__']:
-        if depend != registry_name:
-            for x, y in get_model_information(registry, depend).items():
-                if x not in model:
-                    model[x] = y
-
-    return model
-
-
 @Declarations.register(Declarations.Core)
 class SqlBase(SqlMixin):
     """ this class is inherited by all the SQL model
     """
 
     def get_modified_fields(self):
-        """return the fields which have changed and their previous values"""
+        """return the fields which have changed and their previous values
+
+        Only the attributes modified since the last flush, kept in the
+        ``committed_state`` of the instance state, are read
+        """
         state = object_state(self)
         modified_fields = {}
-        for attr in state.manager.attributes:
+        for key in tuple(state.committed_state):
+            attr = state.manager[key]
             if not hasattr(attr.impl, 'get_history'):
                 continue
 
@@ -570,15 +1148,232 @@ class SqlBase(SqlMixin):
                 **self.to_primary_keys())).delete()
             self.expunge()
         else:
-            model = self.registry.loaded_namespaces_first_step[
-                self.__registry_name__]
-            fields = model.keys()
-            mappers = self.__class__.find_remote_attribute_to_expire(*fields)
+            cls = self.__class__
+            fields = cls.get_relationship_index()['fields']
+            mappers = cls.find_remote_attribute_to_expire(*fields)
             self.expire_relationship_mapped(mappers)
             self.registry.session.delete(self)
 
         if flush:
-            self.registry.flush()
+            self.registry.flush_or_defer()
+
+    @classmethod
+    def get_identities_to_process(cls, query_or_records):
+        """ Return the identities of the entries of a query or of a list of
+        instances, the session is flushed before
+
+        :param query_or_records: query on the model or list of instances
+        :rtype: list of tuple of the primary keys values in the order of
+            the mapper
+        :exception: SqlBaseException
+        """
+        mapper = cls.__mapper__
+        if len(mapper.tables) > 1:
+            raise SqlBaseException(
+                "%r is stored in many tables, the bulk methods can not be "
+                "used" % cls.__registry_name__)
+
+        cls.registry.flush()
+        if isinstance(query_or_records, Query):
+            columns = [getattr(cls, x) for x in cls.get_mapper_primary_keys()]
+            return [tuple(x) for x in query_or_records.with_entities(
+                *columns)]
+
+        identities = []
+        for record in query_or_records:
+            if not isinstance(record, cls):
+                raise SqlBaseException(
+                    "%r is not an instance of %r" % (
+                        record, cls.__registry_name__))
+
+            identities.append(tuple(mapper.primary_key_from_instance(record)))
+
+        return identities
+
+    @classmethod
+    def get_loaded_instances(cls, identities):
+        """ Return the instances of the identities which are in the identity
+        map of the session, without query
+
+        :param identities: list of tuple of the primary keys values in the
+            order of the mapper
+        :rtype: list of instances
+        """
+        identity_map = cls.registry.session.identity_map
+        mapper = cls.__mapper__
+        res = []
+        for identity in identities:
+            instance = identity_map.get(
+                mapper.identity_key_from_primary_key(identity))
+            if instance is not None:
+                res.append(instance)
+
+        return res
+
+    @classmethod
+    def expire_remote_attributes(cls, *fields):
+        """ Expire, on the instances of the session, the remote attributes
+        linked with the fields, see ``find_remote_attribute_to_expire``
+
+        Unlike ``expire_relationship_mapped``, the relationships are not
+        loaded, all the instances of the remote models are expired at once
+
+        :param \*fields: lists of the attribute name
+        """
+        remotes = []
+        for attribute, remote_attributes in (
+            cls.find_remote_attribute_to_expire(*fields).items()
+        ):
+            remote_model = getattr(cls, attribute).property.mapper.entity
+            remotes.append((remote_model, remote_attributes))
+
+        if not remotes:
+            return
+
+        for instance in list(cls.registry.session.identity_map.values()):
+            for remote_model, remote_attributes in remotes:
+                if isinstance(instance, remote_model):
+                    cls.registry.expire(instance, remote_attributes)
+
+    @classmethod
+    def delete_many(cls, query_or_records, chunk_size=None):
+        """ Delete the entries of a query or the instances by chunk, with
+        one ``DELETE`` query by chunk::
+
+            Model.delete_many(Model.query().filter(...))
+            Model.delete_many(instances)
+
+        The deleted instances are expunged from the session and the remote
+        attributes are expired once, after the last chunk.
+
+        ..warning::
+
+            as ``delete(byquery=True)``, the rows are deleted by SQL, the
+            cascades and the events of the ORM are not called
+
+        :param query_or_records: query on the model or list of instances
+        :param chunk_size: number of primary keys by query, by default
+            ``PRIMARY_KEYS_CHUNK_SIZE``
+        :rtype: number of deleted rows
+        :exception: SqlBaseException
+        """
+        identities = cls.get_identities_to_process(query_or_records)
+        chunk_size = chunk_size or PRIMARY_KEYS_CHUNK_SIZE
+        session = cls.registry.session
+        count = 0
+        for i in range(0, len(identities), chunk_size):
+            chunk = identities[i:i + chunk_size]
+            count += cls.query().filter(
+                cls.get_where_clause_from_identities(chunk)).delete(
+                    synchronize_session=False)
+            for instance in cls.get_loaded_instances(chunk):
+                session.expunge(instance)
+
+        if identities:
+            cls.expire_remote_attributes(
+                *cls.get_relationship_index()['fields'])
+
+        return count
+
+    @classmethod_cache()
+    def get_bulk_columns(cls):
+        """ Return the columns of the table of the model, by field name, with
+        the ``setter_format_value`` method of the field, used by the bulk
+        methods
+
+        :rtype: dict {field name: (column, setter_format_value or None)}
+        """
+        descriptors = cls.__mapper__.all_orm_descriptors
+        res = {}
+        for column_property in cls.__mapper__.column_attrs:
+            name = column_property.key
+            if name.startswith(anyblok_column_prefix):
+                name = name[len(anyblok_column_prefix):]
+
+            anyblok_field = getattr(descriptors.get(name), 'anyblok_field',
+                                    None)
+            setter_format_value = None
+            if anyblok_field is not None and (
+                type(anyblok_field).setter_format_value is not
+                Field.setter_format_value
+            ):
+                setter_format_value = anyblok_field.setter_format_value
+
+            res[name] = (column_property.columns[0], setter_format_value)
+
+        return res
+
+    @classmethod
+    def get_bulk_values(cls, values, method):
+        """ Return the values formatted by the ``setter_format_value`` method
+        of the fields, as the instance setters do
+
+        :param values: dict {column name: value}
+        :param method: name of the bulk method, for the error message
+        :rtype: dict {column of the table: formatted value}
+        :exception: SqlBaseException
+        """
+        columns = cls.get_bulk_columns()
+        res = {}
+        for name, value in values.items():
+            if name not in columns:
+                raise SqlBaseException(
+                    "%r is not a column of %r, it can not be used by "
+                    "%s" % (name, cls.__registry_name__, method))
+
+            column, setter_format_value = columns[name]
+            if setter_format_value is not None:
+                value = setter_format_value(value)
+
+            res[column] = value
+
+        return res
+
+    @classmethod
+    def update_many(cls, query_or_records, values, chunk_size=None):
+        """ Update the entries of a query or the instances by chunk, with
+        one ``UPDATE`` query by chunk::
+
+            Model.update_many(Model.query().filter(...), {'name': 'foo'})
+            Model.update_many(instances, {'name': 'foo'})
+
+        The values are formatted as the instance setters do. The updated
+        fields, and the relationships linked with them, are expired on the
+        instances of the session, the remote attributes are expired once,
+        after the last chunk.
+
+        ..warning::
+
+            the rows are updated by SQL, the events of the ORM are not
+            called
+
+        :param query_or_records: query on the model or list of instances
+        :param values: dict {column name: value}
+        :param chunk_size: number of primary keys by query, by default
+            ``PRIMARY_KEYS_CHUNK_SIZE``
+        :rtype: number of updated rows
+        :exception: SqlBaseException
+        """
+        formatted_values = cls.get_bulk_values(values, 'update_many')
+        if not formatted_values:
+            return 0
+
+        identities = cls.get_identities_to_process(query_or_records)
+        chunk_size = chunk_size or PRIMARY_KEYS_CHUNK_SIZE
+        fields = cls.find_relationship(*values.keys())
+        count = 0
+        for i in range(0, len(identities), chunk_size):
+            chunk = identities[i:i + chunk_size]
+            count += cls.query().filter(
+                cls.get_where_clause_from_identities(chunk)).update(
+                    formatted_values, synchronize_session=False)
+            for instance in cls.get_loaded_instances(chunk):
+                cls.registry.expire(instance, fields)
+
+        if identities:
+            cls.expire_remote_attributes(*values.keys())
+
+        return count
 
     @classmethod
     def insert(cls, **kwargs):
@@ -592,10 +1387,11 @@ class SqlBase(SqlMixin):
             MyModel.registry.session.add(mymodel)
             MyModel.registry.flush()
 
+        Inside ``registry.batch()`` the flush is deferred
         """
         instance = cls(**kwargs)
         cls.registry.add(instance)
-        cls.registry.flush()
+        cls.registry.flush_or_defer()
         return instance
 
     @classmethod
@@ -618,6 +1414,483 @@ class SqlBase(SqlMixin):
             instances.append(instance)
 
         if instances:
-            cls.registry.flush()
+            cls.registry.flush_or_defer()
 
         return instances
+
+    @classmethod
+    def bulk_insert(cls, rows, return_pks=False, method='auto',
+                    chunk_size=None):
+        """ Insert the rows in the table of the model without instance::
+
+            MyModel.bulk_insert([{...}, ...])
+
+        The values are formatted as the instance setters do, the default
+        values of the columns are evaluated for each row. The rows are
+        inserted by chunk of ``chunk_size`` rows, with the ``method``:
+
+        * ``executemany``: one statement executed with all the rows
+        * ``values``: one ``INSERT`` with many ``VALUES``
+        * ``copy``: ``COPY FROM STDIN``, only for postgresql and without
+          ``return_pks``
+        * ``auto``: ``values`` if the dialect supports it, else
+          ``executemany``
+
+        ..warning::
+
+            no instance is created, the events of the ORM are not called
+
+        :param rows: list of dict {column name: value}
+        :param return_pks: if True, return the primary keys of the rows
+        :param method: ``auto``, ``executemany``, ``values`` or ``copy``
+        :param chunk_size: number of rows by statement, by default
+            ``PRIMARY_KEYS_CHUNK_SIZE``
+        :rtype: number of inserted rows, or, with ``return_pks``, the list
+            of dict {primary key: value, ...} in the order of the rows
+        :exception: SqlBaseException
+        """
+        method = cls.get_bulk_insert_method(method, return_pks)
+        groups = cls.get_bulk_insert_groups(rows)
+        cls.registry.flush()
+        chunk_size = chunk_size or PRIMARY_KEYS_CHUNK_SIZE
+        pks = {}
+        for entries in groups.values():
+            for i in range(0, len(entries), chunk_size):
+                chunk = entries[i:i + chunk_size]
+                res = getattr(cls, 'bulk_insert_by_' + method)(
+                    [x[1] for x in chunk], return_pks)
+                if return_pks:
+                    pks.update(zip((x[0] for x in chunk),
+                                   cls.get_bulk_insert_primary_keys(res)))
+
+        if return_pks:
+            return [pks[x] for x in range(len(pks))]
+
+        return sum(len(x) for x in groups.values())
+
+    @classmethod
+    def get_bulk_insert_method(cls, method, return_pks):
+        """ Return the method used by ``bulk_insert``
+
+        :param method: ``auto``, ``executemany``, ``values`` or ``copy``
+        :param return_pks: if True, the primary keys must be returned
+        :rtype: ``executemany``, ``values`` or ``copy``
+        :exception: SqlBaseException
+        """
+        if len(cls.__mapper__.tables) > 1:
+            raise SqlBaseException(
+                "%r is stored in many tables, the bulk methods can not be "
+                "used" % cls.__registry_name__)
+
+        dialect = cls.registry.engine.dialect
+        if method == 'auto':
+            if dialect.supports_multivalues_insert:
+                return 'values'
+
+            return 'executemany'
+        elif method not in ('executemany', 'values', 'copy'):
+            raise SqlBaseException("Unknown bulk_insert method %r" % method)
+        elif method == 'copy' and dialect.name != 'postgresql':
+            raise SqlBaseException("COPY is only available on postgresql")
+        elif method == 'copy' and return_pks:
+            raise SqlBaseException("COPY can not return the primary keys")
+
+        return method
+
+    @classmethod
+    def get_bulk_insert_groups(cls, rows, method='bulk_insert'):
+        """ Format the rows of ``bulk_insert`` and group them by columns, all
+        the rows of one statement must have the same columns
+
+        :param rows: list of dict {column name: value}
+        :param method: name of the bulk method, for the error message
+        :rtype: dict {columns: [(index of the row, {column: value}), ...]}
+        :exception: SqlBaseException
+        """
+        mapper = cls.__mapper__
+        groups = {}
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                raise SqlBaseException("%s method wait list of dict" % method)
+
+            values = cls.get_bulk_values(row, method)
+            if (mapper.polymorphic_on is not None and
+                    mapper.polymorphic_identity is not None):
+                values.setdefault(mapper.polymorphic_on,
+                                  mapper.polymorphic_identity)
+
+            groups.setdefault(frozenset(values), []).append((index, values))
+
+        return groups
+
+    @classmethod
+    def get_bulk_insert_primary_keys(cls, identities):
+        """ Return the primary keys of the inserted rows
+
+        :param identities: list of dict {column of the table: value}
+        :rtype: list of dict {primary key: value, ...}
+        """
+        columns = cls.get_bulk_columns()
+        pks = [(x, columns[x][0]) for x in cls.get_mapper_primary_keys()]
+        return [{x: identity[y] for x, y in pks} for identity in identities]
+
+    @classmethod
+    def bulk_insert_by_executemany(cls, rows, return_pks):
+        """ Insert the rows with one statement executed with all the rows,
+        or, to return the primary keys, one statement by row
+
+        :param rows: list of dict {column of the table: value}
+        :param return_pks: if True, return the primary keys of the rows
+        :rtype: list of dict {primary key column: value, ...} or None
+        """
+        statement = cls.__table__.insert()
+        params = [{x.key: y for x, y in row.items()} for row in rows]
+        if not return_pks:
+            cls.registry.execute(statement, params)
+            return None
+
+        pk_columns = list(cls.__table__.primary_key.columns)
+        identities = []
+        for param in params:
+            res = cls.registry.execute(statement, param)
+            identities.append(dict(zip(pk_columns,
+                                       res.inserted_primary_key)))
+
+        return identities
+
+    @classmethod
+    def bulk_insert_by_values(cls, rows, return_pks):
+        """ Insert the rows with one ``INSERT`` with many ``VALUES``, the
+        primary keys are returned by ``RETURNING`` if the dialect supports
+        it
+
+        :param rows: list of dict {column of the table: value}
+        :param return_pks: if True, return the primary keys of the rows
+        :rtype: list of dict {primary key column: value, ...} or None
+        """
+        dialect = cls.registry.engine.dialect
+        if return_pks and not dialect.implicit_returning:
+            return cls.bulk_insert_by_executemany(rows, return_pks)
+
+        params = [{x.key: y for x, y in row.items()} for row in rows]
+        statement = cls.__table__.insert().values(params)
+        if not return_pks:
+            cls.registry.execute(statement)
+            return None
+
+        pk_columns = list(cls.__table__.primary_key.columns)
+        res = cls.registry.execute(statement.returning(*pk_columns))
+        return [dict(zip(pk_columns, x)) for x in res]
+
+    @classmethod
+    def get_bulk_insert_defaults(cls, columns):
+        """ Return the default values, evaluated by python, of the columns
+        of the table which are not given by the rows of the ``COPY``, the
+        other columns get the default value of the server
+
+        :param columns: columns given by the rows
+        :rtype: dict {column of the table: default}
+        :exception: SqlBaseException
+        """
+        res = {}
+        for column in cls.__table__.columns:
+            default = column.default
+            if column in columns or default is None:
+                continue
+            elif not (default.is_scalar or default.is_callable):
+                raise SqlBaseException(
+                    "The default value of %r can not be inserted by "
+                    "COPY" % column.name)
+
+            res[column] = default
+
+        return res
+
+    @classmethod
+    def bulk_insert_by_copy(cls, rows, return_pks):
+        """ Insert the rows with ``COPY FROM STDIN``, only for postgresql
+
+        :param rows: list of dict {column of the table: value}
+        :param return_pks: not supported, always False
+        """
+        dialect = cls.registry.engine.dialect
+        defaults = cls.get_bulk_insert_defaults(rows[0])
+        columns = list(rows[0]) + list(defaults)
+        processors = [x.type.bind_processor(dialect) for x in columns]
+        data = StringIO()
+        for row in rows:
+            values = []
+            for column, processor in zip(columns, processors):
+                if column in row:
+                    value = row[column]
+                elif defaults[column].is_scalar:
+                    value = defaults[column].arg
+                else:
+                    value = defaults[column].arg(None)
+
+                if processor is not None:
+                    value = processor(value)
+
+                values.append(copy_format_value(value))
+
+            data.write('\t'.join(values) + '\n')
+
+        data.seek(0)
+        preparer = dialect.identifier_preparer
+        cursor = cls.registry.session.connection().connection.cursor()
+        try:
+            cursor.copy_expert('COPY %s (%s) FROM STDIN' % (
+                preparer.format_table(cls.__table__),
+                ', '.join(preparer.quote(x.name) for x in columns)), data)
+        finally:
+            cursor.close()
+
+    @classmethod
+    def upsert_many(cls, rows, conflict_fields=None, update_fields=None,
+                    return_pks=False, chunk_size=None):
+        """ Insert the rows, or update the existing entries which have the
+        same values for the conflict fields, by chunk::
+
+            MyModel.upsert_many([{...}, ...], conflict_fields=['code'])
+
+        * postgresql: ``INSERT ... ON CONFLICT DO UPDATE``
+        * mysql: ``INSERT ... ON DUPLICATE KEY UPDATE``
+        * other dialects: one query to find the existing entries, then
+          ``UPDATE`` them and insert the others
+
+        The values are formatted as the instance setters do. The updated
+        fields, and the relationships linked with them, are expired on the
+        instances of the session. If the same conflict values are given by
+        many rows, the last row is kept.
+
+        ..warning::
+
+            no instance is created, the events of the ORM are not called
+
+        :param rows: list of dict {column name: value}
+        :param conflict_fields: names of the columns of an unique constraint,
+            by default the primary keys
+        :param update_fields: names of the columns to update for the
+            existing entries, by default the columns of the row which are
+            not conflict fields, if empty the existing entries are not
+            updated
+        :param return_pks: if True, return the primary keys of the affected
+            entries: the inserted and the updated entries, so the existing
+            entries are not returned nor counted if ``update_fields`` is
+            empty, on all the dialects
+        :param chunk_size: number of rows by statement, by default
+            ``PRIMARY_KEYS_CHUNK_SIZE``
+        :rtype: number of affected entries, or, with ``return_pks``, the list
+            of dict {primary key: value, ...} of the affected entries
+        :exception: SqlBaseException
+        """
+        if len(cls.__mapper__.tables) > 1:
+            raise SqlBaseException(
+                "%r is stored in many tables, the bulk methods can not be "
+                "used" % cls.__registry_name__)
+
+        bulk_columns = cls.get_bulk_columns()
+        conflict_fields = list(conflict_fields or cls.get_mapper_primary_keys())
+        for name in conflict_fields:
+            if name not in bulk_columns:
+                raise SqlBaseException(
+                    "%r is not a column of %r, it can not be used by "
+                    "upsert_many" % (name, cls.__registry_name__))
+
+        conflict_columns = [bulk_columns[x][0] for x in conflict_fields]
+        groups = cls.get_bulk_insert_groups(rows, 'upsert_many')
+        cls.registry.flush()
+        dialect = cls.registry.engine.dialect.name
+        upsert = {
+            'postgresql': cls.upsert_many_by_on_conflict,
+            'mysql': cls.upsert_many_by_on_duplicate_key,
+        }.get(dialect, cls.upsert_many_by_queries)
+        chunk_size = chunk_size or PRIMARY_KEYS_CHUNK_SIZE
+        pks = []
+        updated_fields = set()
+        for columns, entries in groups.items():
+            names = cls.get_upsert_update_fields(
+                columns, conflict_fields, update_fields)
+            updated_fields.update(names)
+            update_columns = [bulk_columns[x][0] for x in names]
+            values = cls.get_upsert_rows(conflict_columns,
+                                         [x[1] for x in entries])
+            fields = cls.find_relationship(*names)
+            for i in range(0, len(values), chunk_size):
+                identities = upsert(values[i:i + chunk_size],
+                                    conflict_columns, update_columns)
+                pks.extend(identities)
+                for instance in cls.get_loaded_instances([
+                    tuple(x[y] for y in cls.__mapper__.primary_key)
+                    for x in identities
+                ]):
+                    cls.registry.expire(instance, fields)
+
+        if pks and updated_fields:
+            cls.expire_remote_attributes(*updated_fields)
+
+        if return_pks:
+            return cls.get_bulk_insert_primary_keys(pks)
+
+        return len(pks)
+
+    @classmethod
+    def get_upsert_update_fields(cls, columns, conflict_fields,
+                                 update_fields):
+        """ Return the names of the columns to update by ``upsert_many``
+
+        :param columns: columns of the table given by the rows
+        :param conflict_fields: names of the conflict columns
+        :param update_fields: names of the columns to update, or None
+        :rtype: list of column name
+        :exception: SqlBaseException
+        """
+        bulk_columns = cls.get_bulk_columns()
+        for name in conflict_fields:
+            if bulk_columns[name][0] not in columns:
+                raise SqlBaseException(
+                    "The conflict field %r must be given by all the rows of "
+                    "upsert_many" % name)
+
+        if update_fields is None:
+            return [x for x, y in bulk_columns.items()
+                    if y[0] in columns and x not in conflict_fields]
+
+        for name in update_fields:
+            if name not in bulk_columns or bulk_columns[name][0] not in columns:
+                raise SqlBaseException(
+                    "The field %r to update must be given by all the rows of "
+                    "upsert_many" % name)
+
+        return list(update_fields)
+
+    @classmethod
+    def get_upsert_rows(cls, conflict_columns, rows):
+        """ Return the rows without the duplicated conflict values, the last
+        row is kept
+
+        :param conflict_columns: columns of the conflict fields
+        :param rows: list of dict {column of the table: value}
+        :rtype: list of dict {column of the table: value}
+        """
+        res = {}
+        for row in rows:
+            key = tuple(row[x] for x in conflict_columns)
+            res.pop(key, None)
+            res[key] = row
+
+        return list(res.values())
+
+    @classmethod
+    def upsert_many_by_on_conflict(cls, rows, conflict_columns,
+                                   update_columns):
+        """ Upsert the rows with ``INSERT ... ON CONFLICT``, for postgresql
+
+        :param rows: list of dict {column of the table: value}
+        :param conflict_columns: columns of the conflict fields
+        :param update_columns: columns to update
+        :rtype: list of dict {primary key column: value, ...}
+        """
+        table = cls.__table__
+        statement = pg_insert(table).values(
+            [{x.key: y for x, y in row.items()} for row in rows])
+        if update_columns:
+            statement = statement.on_conflict_do_update(
+                index_elements=conflict_columns,
+                set_={x.name: statement.excluded[x.key]
+                      for x in update_columns})
+        else:
+            statement = statement.on_conflict_do_nothing(
+                index_elements=conflict_columns)
+
+        pk_columns = list(table.primary_key.columns)
+        res = cls.registry.execute(statement.returning(*pk_columns))
+        return [dict(zip(pk_columns, x)) for x in res]
+
+    @classmethod
+    def upsert_many_by_on_duplicate_key(cls, rows, conflict_columns,
+                                        update_columns):
+        """ Upsert the rows with ``INSERT ... ON DUPLICATE KEY UPDATE``, for
+        mysql, the primary keys are read after by one query. Without column
+        to update, the rows are inserted with ``INSERT IGNORE`` and the
+        entries which existed before are found by one query, to return only
+        the inserted entries
+
+        :param rows: list of dict {column of the table: value}
+        :param conflict_columns: columns of the conflict fields
+        :param update_columns: columns to update
+        :rtype: list of dict {primary key column: value, ...}
+        """
+        table = cls.__table__
+        pk_columns = list(table.primary_key.columns)
+        query = cls.registry.query(*pk_columns).filter(
+            cls.get_where_clause_from_values(
+                conflict_columns,
+                [tuple(row[x] for x in conflict_columns) for row in rows]))
+        existing = set()
+        statement = mysql_insert(table).values(
+            [{x.key: y for x, y in row.items()} for row in rows])
+        if update_columns:
+            statement = statement.on_duplicate_key_update(
+                **{x.name: statement.inserted[x.key] for x in update_columns})
+        else:
+            existing = set(tuple(x) for x in query)
+            statement = statement.prefix_with('IGNORE')
+
+        cls.registry.execute(statement)
+        return [dict(zip(pk_columns, x)) for x in query
+                if tuple(x) not in existing]
+
+    @classmethod
+    def upsert_many_by_queries(cls, rows, conflict_columns, update_columns):
+        """ Upsert the rows, the existing entries are found by one query,
+        they are updated by one ``UPDATE`` by set of values and the other
+        rows are inserted
+
+        :param rows: list of dict {column of the table: value}
+        :param conflict_columns: columns of the conflict fields
+        :param update_columns: columns to update
+        :rtype: list of dict {primary key column: value, ...}
+        """
+        table = cls.__table__
+        pk_columns = list(table.primary_key.columns)
+        query = cls.registry.query(*(pk_columns + conflict_columns)).filter(
+            cls.get_where_clause_from_values(
+                conflict_columns,
+                [tuple(row[x] for x in conflict_columns) for row in rows]))
+        existing = {tuple(x[len(pk_columns):]): dict(zip(pk_columns, x))
+                    for x in query}
+        identities = []
+        new_rows = []
+        updates = {}
+        for row in rows:
+            identity = existing.get(tuple(row[x] for x in conflict_columns))
+            if identity is None:
+                new_rows.append(row)
+                continue
+
+            if not update_columns:
+                continue
+
+            identities.append(identity)
+            # one UPDATE by set of values
+            key = tuple(row[x] for x in update_columns)
+            try:
+                hash(key)
+            except TypeError:
+                # unhashable value (Json, ...), the entry is updated alone
+                key = len(updates)
+
+            updates.setdefault(key, (row, []))[1].append(
+                tuple(identity[x] for x in pk_columns))
+
+        for row, pks in updates.values():
+            cls.registry.execute(
+                table.update().where(
+                    cls.get_where_clause_from_values(pk_columns, pks)).values(
+                    {x.key: row[x] for x in update_columns}))
+
+        if new_rows:
+            identities.extend(cls.bulk_insert_by_executemany(new_rows, True))
+
+        return identities
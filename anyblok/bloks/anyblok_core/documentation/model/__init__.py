@@ -32,7 +32,7 @@ class Model(Declarations.Mixin.DocElement):
         for model in models:
             if model[-2:] == '.*':
                 query = Model.query().filter(Model.name.like(model[:-1] + '%'))
-                res.extend(query.all().name)
+                res.extend(query.pluck('name'))
             else:
                 res.append(model)
 
@@ -28,7 +28,14 @@ class Attribute:
                     'has_perm', 'has_model_perm',
                     'get_where_clause_from_primary_keys', 'get_primary_keys',
                     'get_model', 'from_primary_keys',
-                    'from_multi_primary_keys', 'fire', 'fields_description',
+                    'from_multi_primary_keys', 'get_many',
+                    'get_mapper_primary_keys',
+                    'get_identity_from_primary_keys', 'fire',
+                    'fields_description', 'get_fields_metadata',
+                    'get_to_dict_serializer', 'get_dict_rows_plan',
+                    'get_where_clause_from_values',
+                    'delete_many', 'update_many', 'bulk_insert',
+                    'upsert_many',
                     '_fields_description', 'delete', 'aliased', '__init__',
                     'loaded_columns', 'loaded_fields', 'registry',
                     '_sa_class_manager', '_decl_class_registry'):
@@ -6,10 +6,12 @@
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
 from anyblok.blok import BlokManager
-from anyblok.declarations import Declarations, listen, classmethod_cache
+from anyblok.declarations import (Declarations, listen, classmethod_cache,
+                                  baked_query)
 from anyblok.column import String, Integer, Selection
 from anyblok.field import Function
 from anyblok.version import parse_version
+from sqlalchemy import bindparam
 from logging import getLogger
 from os.path import join, isfile
 
@@ -99,8 +101,8 @@ class Blok:
 
         res = {state: [] for state in states}
         bloks = cls.query().filter(cls.state.in_(states)).order_by(cls.order)
-        for blok in bloks.all():
-            res[blok.state].append(blok.name)
+        for state, name in bloks.pluck('state', 'name'):
+            res[state].append(name)
 
         if len(states) == 1:
             return res[states[0]]
@@ -141,7 +143,7 @@ class Blok:
                 b.upgrade()
 
         uninstalled_bloks = cls.query().filter(
-            cls.state == 'uninstalled').all().name
+            cls.state == 'uninstalled').pluck('name')
 
         conditional_bloks_to_install = []
         for blok in uninstalled_bloks:
@@ -252,10 +254,14 @@ class Blok:
         if bloks:
             bloks.load()
 
+    @baked_query
+    def query_installed_by_name(cls, query):
+        return query.filter(cls.name == bindparam('name'),
+                            cls.state == 'installed')
+
     @classmethod_cache()
     def is_installed(cls, blok_name):
-        return cls.query().filter_by(name=blok_name,
-                                     state='installed').count() != 0
+        return cls.query_installed_by_name(name=blok_name).count() != 0
 
     @listen('Model.System.Blok', 'Update installed blok')
     def listen_update_installed_blok(cls):
@@ -5,10 +5,16 @@
 # This Source Code Form is subject to the terms of the Mozilla Public License,
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
-from anyblok.declarations import Declarations
+from anyblok.declarations import Declarations, baked_query
 from anyblok.column import String, Integer
+from anyblok.config import Configuration
+from anyblok.environment import EnvironmentManager
+from sqlalchemy import func, select, bindparam
+from logging import getLogger
 from ..exceptions import CacheException
 
+logger = getLogger(__name__)
+
 
 register = Declarations.register
 System = Declarations.Model.System
@@ -18,22 +24,46 @@ System = Declarations.Model.System
 class Cache:
 
     last_cache_id = None
+    last_count_id = 0
+    last_count_rows = 0
     lrus = {}
 
     id = Integer(primary_key=True)
     registry_name = String(nullable=False)
     method = String(nullable=False)
 
+    @baked_query
+    def query_last_id(cls, query):
+        return query.with_entities(cls.id).order_by(cls.id.desc())
+
     @classmethod
     def get_last_id(cls):
         """ Return the last primary key ``id`` value
         """
-        res = cls.query('id').order_by(cls.id.desc()).limit(1).first()
+        res = cls.query_last_id().first()
         if res:
             return res[0]
 
         return 0
 
+    @baked_query
+    def query_last_invalidation_id(cls, query):
+        return query.with_entities(func.max(cls.id)).filter(
+            cls.registry_name == bindparam('registry_name'),
+            cls.method == bindparam('method'))
+
+    @classmethod
+    def get_last_invalidation_id(cls, registry_name, method):
+        """ Return the ``id`` of the last invalidation of the method, 0 if
+        the method was never invalidated
+
+        :param registry_name: namespace of the model
+        :param method: name of the method on the model
+        :rtype: int
+        """
+        return cls.query_last_invalidation_id(
+            registry_name=registry_name, method=method).scalar() or 0
+
     @classmethod
     def initialize_model(cls):
         """ Initialize the last_cache_id known
@@ -43,13 +73,15 @@ class Cache:
 
     @classmethod
     def invalidate_all(cls):
-        res = []
+        """ Invalidate all the cached methods
+
+        The local caches are cleared at once, the publication for the other
+        processes is done after the commit, see :meth:`invalidate`
+        """
         for registry_name, methods in cls.registry.caches.items():
             for method in methods.keys():
-                res.append(dict(registry_name=registry_name, method=method))
-
-        if res:
-            cls.multi_insert(*res)
+                cls.clear_local_cache(registry_name, method)
+                cls.add_pending_invalidation(registry_name, method)
 
         cls.clear_invalidate_cache()
 
@@ -57,31 +89,138 @@ class Cache:
     def invalidate(cls, registry_name, method):
         """ Call the invalidation for a specific method cached on a model
 
+        The cache of the current process is cleared at once. The row which
+        informs the other processes is only inserted after the commit of the
+        current transaction, and dropped if the transaction is rolled back.
+        Multiple invalidations of the same method inside one transaction
+        give only one row
+
         :param registry_name: namespace of the model
         :param method: name of the method on the model
         :exception: CacheException
         """
         caches = cls.registry.caches
 
-        def insert(registry_name=None, method=None):
-            if registry_name in caches:
-                if method in caches[registry_name]:
-                    cls.insert(registry_name=registry_name, method=method)
-                else:
-                    raise CacheException(
-                        "Unknown cached method %r" % method)
-            else:
-                raise CacheException(
-                    "Unknown cached model %r" % registry_name)
-
-        if isinstance(registry_name, str):
-            insert(registry_name=registry_name, method=method)
-        elif hasattr(registry_name, '__registry_name__'):
-            insert(registry_name=registry_name.__registry_name__,
-                   method=method)
+        if hasattr(registry_name, '__registry_name__'):
+            registry_name = registry_name.__registry_name__
+        elif not isinstance(registry_name, str):
+            return
+
+        if registry_name not in caches:
+            raise CacheException(
+                "Unknown cached model %r" % registry_name)
 
+        if method not in caches[registry_name]:
+            raise CacheException(
+                "Unknown cached method %r" % method)
+
+        cls.clear_local_cache(registry_name, method)
+        cls.add_pending_invalidation(registry_name, method)
         cls.clear_invalidate_cache()
 
+    @classmethod
+    def clear_local_cache(cls, registry_name, method):
+        """ Clear the cache of the method only for the current process
+
+        :param registry_name: namespace of the model
+        :param method: name of the method on the model
+        """
+        for cache in cls.registry.caches[registry_name][method]:
+            cache.cache_clear()
+
+    @classmethod
+    def get_pending_invalidations(cls):
+        """ Return the invalidations waiting for the commit
+
+        :rtype: list of tuple (registry_name, method)
+        """
+        return EnvironmentManager.get('_cache_invalidation', [])
+
+    @classmethod
+    def add_pending_invalidation(cls, registry_name, method):
+        """ Save the invalidation until the end of the transaction
+
+        :param registry_name: namespace of the model
+        :param method: name of the method on the model
+        """
+        pending = cls.get_pending_invalidations()
+        if (registry_name, method) not in pending:
+            pending.append((registry_name, method))
+            EnvironmentManager.set('_cache_invalidation', pending)
+
+        cls.postcommit_hook('publish_invalidations')
+        cls.postcommit_hook('discard_invalidations', call_only_if='raised')
+
+    @classmethod
+    def discard_invalidations(cls):
+        """ Forget the invalidations waiting for the commit """
+        EnvironmentManager.set('_cache_invalidation', [])
+
+    @classmethod
+    def publish_invalidations(cls):
+        """ Insert the invalidations waiting for the commit, and commit them
+        to be seen by the other processes
+
+        This method is called by the postcommit hook
+        """
+        pending = cls.get_pending_invalidations()
+        cls.discard_invalidations()
+        if pending:
+            caches = cls.multi_insert(
+                *[dict(registry_name=registry_name, method=method)
+                  for registry_name, method in pending])
+            # inside registry.batch() the rows are not flushed yet
+            cls.registry.flush()
+            # the local caches are already cleared, only the invalidations
+            # of the other processes are applied
+            cls.clear_invalidate_cache(ignored_ids=caches.id)
+            threshold = Configuration.get('cache_compaction_threshold')
+            if threshold and cls.need_compaction(threshold, max(caches.id)):
+                cls.last_count_rows -= cls.compact()
+
+            cls.registry.session_commit()
+
+    @classmethod
+    def need_compaction(cls, threshold, last_id):
+        """ Return True if the table has more rows than the threshold
+
+        The rows inserted since the last count have a greater ``id``, so
+        their number can not exceed the difference of the ``id``. The rows
+        are only counted when this bound exceeds the threshold
+
+        :param threshold: maximum number of rows before the compaction
+        :param last_id: greatest ``id`` of the table
+        :rtype: Boolean
+        """
+        if cls.last_count_rows + last_id - cls.last_count_id <= threshold:
+            return False
+
+        cls.last_count_rows = cls.query().count()
+        cls.last_count_id = last_id
+        return cls.last_count_rows > threshold
+
+    @classmethod
+    def compact(cls):
+        """ Remove the old invalidations, only the last row of each cached
+        method is kept
+
+        The last invalidation of each method is kept, so the greatest ``id``
+        of the table does not change, and a process which knows an older
+        ``last_cache_id`` still finds all the methods to invalidate
+
+        :rtype: number of removed rows
+        """
+        # the derived table is required by MySQL which can not select in
+        # the table of the DELETE (error 1093)
+        last_ids = cls.registry.query(func.max(cls.id).label('id')).group_by(
+            cls.registry_name, cls.method).subquery('last_ids')
+        nb = cls.query().filter(
+            cls.id.notin_(select([last_ids.c.id]))).delete(
+            synchronize_session=False)
+        logger.info("Compaction of the cache invalidations: %d rows "
+                    "removed", nb)
+        return nb
+
     @classmethod
     def detect_invalidation(cls):
         """ Return True if a new invalidation is found in the table
@@ -91,22 +230,29 @@ class Cache:
         return cls.last_cache_id < cls.get_last_id()
 
     @classmethod
-    def get_invalidation(cls):
+    def get_invalidation(cls, ignored_ids=()):
         """ Return the pointer of the method to invalidate
+
+        :param ignored_ids: ``id`` of the invalidations already applied
+            by the current process
         """
         res = []
         if cls.detect_invalidation():
             caches = cls.registry.caches
             for i in cls.query().filter(cls.id > cls.last_cache_id).all():
-                res.extend(caches[i.registry_name][i.method])
+                if i.id not in ignored_ids:
+                    res.extend(caches[i.registry_name][i.method])
 
             cls.last_cache_id = cls.get_last_id()
 
         return res
 
     @classmethod
-    def clear_invalidate_cache(cls):
+    def clear_invalidate_cache(cls, ignored_ids=()):
         """ Invalidate the cache that needs to be invalidated
+
+        :param ignored_ids: ``id`` of the invalidations already applied
+            by the current process
         """
-        for cache in cls.get_invalidation():
+        for cache in cls.get_invalidation(ignored_ids=ignored_ids):
             cache.cache_clear()
@@ -28,9 +28,17 @@ class Column(System.Field):
     remote_model = String()
 
     def _description(self):
-        res = super(Column, self)._description()
-        res.update(nullable=self.nullable, primary_key=self.primary_key,
-                   model=self.remote_model)
+        return self.get_description(
+            {x: getattr(self, x)
+             for x in ('name', 'model', 'label', 'ftype', 'nullable',
+                       'primary_key', 'remote_model')})
+
+    @classmethod
+    def get_description(cls, values):
+        res = super(Column, cls).get_description(values)
+        res.update(nullable=values['nullable'],
+                   primary_key=values['primary_key'],
+                   model=values['remote_model'])
         return res
 
     @classmethod
@@ -44,14 +52,15 @@ class Column(System.Field):
         return cname
 
     @classmethod
-    def add_field(cls, cname, column, model, table, ftype):
-        """ Insert a column definition
+    def get_field_values(cls, cname, column, model, table, ftype):
+        """ Return the values of a column definition
 
         :param cname: name of the column
         :param column: instance of the column
         :param model: namespace of the model
         :param table: name of the table of the model
         :param ftype: type of the AnyBlok Field
+        :rtype: dict
         """
         Model = cls.registry.get(model)
         if hasattr(Model, anyblok_column_prefix + cname):
@@ -66,7 +75,7 @@ class Column(System.Field):
                              if c.primary_key and ftype == 'Integer'
                              else False)
 
-        vals = dict(autoincrement=autoincrement,
+        return dict(autoincrement=autoincrement,
                     code=table + '.' + cname,
                     model=model, name=cname,
                     foreign_key=c.info.get('foreign_key'),
@@ -76,7 +85,18 @@ class Column(System.Field):
                     ftype=ftype,
                     remote_model=c.info.get('remote_model'),
                     unique=c.unique)
-        cls.insert(**vals)
+
+    @classmethod
+    def add_field(cls, cname, column, model, table, ftype):
+        """ Insert a column definition
+
+        :param cname: name of the column
+        :param column: instance of the column
+        :param model: namespace of the model
+        :param table: name of the table of the model
+        :param ftype: type of the AnyBlok Field
+        """
+        cls.insert(**cls.get_field_values(cname, column, model, table, ftype))
 
     @classmethod
     def alter_field(cls, column, meta_column, ftype):
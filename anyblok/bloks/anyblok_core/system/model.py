@@ -43,13 +43,6 @@ class Model:
 
     @listen('Model.System.Model', 'Update Model')
     def listener_update_model(cls, model):
-        cls.registry.System.Cache.invalidate(model, '_fields_description')
-        cls.registry.System.Cache.invalidate(model, 'getFieldType')
-        cls.registry.System.Cache.invalidate(model, 'get_primary_keys')
-        cls.registry.System.Cache.invalidate(
-            model, 'find_remote_attribute_to_expire')
-        cls.registry.System.Cache.invalidate(
-            model, 'find_relationship')
         cls.registry.System.Cache.invalidate(
             model, 'get_hybrid_property_columns')
 
@@ -74,6 +67,66 @@ class Model:
 
         return field, Field
 
+    @classmethod
+    def get_model_metadata(cls, model):
+        """ Return the definition of the fields of the model, as they are
+        saved in the tables of the fields by ``update_list``
+
+        :param model: namespace of the model
+        :rtype: dict {field name: (model of the field, values)}
+        """
+        fsp = cls.registry.loaded_namespaces_first_step
+        m = cls.registry.get(model)
+        table = ''
+        if hasattr(m, '__tablename__'):
+            table = m.__tablename__
+
+        res = {}
+        for cname in m.loaded_columns:
+            if cname not in m.loaded_fields and not hasattr(
+                getattr(m, cname), 'property'
+            ):
+                # not mapped by SQLAlchemy, no entry in the tables of fields
+                logger.debug('No metadata for the field %s.%s', model, cname)
+                continue
+
+            field, Field = cls.get_field(m, cname)
+            cname = Field.get_cname(field, cname)
+            ftype = fsp[model][cname].__class__.__name__
+            res[cname] = (
+                Field, Field.get_field_values(cname, field, model, table,
+                                              ftype))
+
+        return res
+
+    @classmethod
+    def load_metadata(cls):
+        """ Build the in memory catalog of the fields of the assembled
+        models, ``registry.loaded_namespaces_metadata``
+
+        The definitions are the same as the entries of the tables of the
+        fields, but they are known without any query
+        """
+        metadata = {model: cls.get_model_metadata(model)
+                    for model in cls.registry.loaded_namespaces.keys()}
+
+        RelationShip = cls.registry.System.RelationShip
+        for fields in list(metadata.values()):
+            for Field, values in list(fields.values()):
+                if Field is not RelationShip:
+                    continue
+
+                remote_values = RelationShip.get_remote_field_values(values)
+                if remote_values is None:
+                    continue
+
+                remote_fields = metadata.setdefault(remote_values['model'], {})
+                if remote_values['name'] not in remote_fields:
+                    remote_fields[remote_values['name']] = (
+                        RelationShip, remote_values)
+
+        cls.registry.loaded_namespaces_metadata = metadata
+
     @classmethod
     def update_fields(cls, model, table):
         fsp = cls.registry.loaded_namespaces_first_step
@@ -5,8 +5,11 @@
 # This Source Code Form is subject to the terms of the Mozilla Public License,
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
+from copy import deepcopy
 from anyblok import Declarations
+from anyblok.declarations import baked_query, classmethod_cache
 from anyblok.column import String, Json, Boolean
+from sqlalchemy import bindparam
 from ..exceptions import ParameterException
 
 
@@ -26,12 +29,76 @@ class Parameter:
 
     A simple access API is provided with the :meth:`get`, :meth:`set`,
     :meth:`is_exist` and further methods.
+
+    The values read are kept in the process, see :meth:`get_cache`, they
+    are invalidated by :meth:`insert`, :meth:`update` and :meth:`delete`
+    (so by :meth:`set` and :meth:`pop` too) for all the processes with
+    ``System.Cache``.
     """
 
     key = String(primary_key=True)
     value = Json(nullable=False)
     multi = Boolean(default=False)
 
+    @classmethod_cache()
+    def get_cache(cls):
+        """ Return the parameters already read by the process
+
+        The dict is the same until the invalidation of this method by
+        ``System.Cache``, done when a parameter is inserted, updated or
+        deleted
+
+        :rtype: dict {key: (multi, value) or None if the key does not exist}
+        """
+        return {}
+
+    @classmethod
+    def invalidate_cache(cls):
+        cls.registry.System.Cache.invalidate(cls, 'get_cache')
+
+    @classmethod
+    def is_cacheable(cls):
+        """ Return False while the invalidation of the cache waits for the
+        commit, the values read in this transaction can be rolled back
+
+        :rtype: bool
+        """
+        return (cls.__registry_name__, 'get_cache') not in (
+            cls.registry.System.Cache.get_pending_invalidations())
+
+    @classmethod
+    def insert(cls, **kwargs):
+        """Overwrite to invalidate the cache of the parameters"""
+        res = super(Parameter, cls).insert(**kwargs)
+        cls.invalidate_cache()
+        return res
+
+    @classmethod
+    def multi_insert(cls, *args):
+        """Overwrite to invalidate the cache of the parameters"""
+        res = super(Parameter, cls).multi_insert(*args)
+        cls.invalidate_cache()
+        return res
+
+    def update(self, **values):
+        """Overwrite to invalidate the cache of the parameters"""
+        res = super(Parameter, self).update(**values)
+        self.invalidate_cache()
+        return res
+
+    def delete(self, *args, **kwargs):
+        """Overwrite to invalidate the cache of the parameters"""
+        res = super(Parameter, self).delete(*args, **kwargs)
+        self.invalidate_cache()
+        return res
+
+    @staticmethod
+    def format_value(multi, value):
+        if multi:
+            return deepcopy(value)
+
+        return deepcopy(value['value'])
+
     @classmethod
     def set(cls, key, value):
         """ Insert or update parameter value for a key.
@@ -47,12 +114,46 @@ class Parameter:
         else:
             multi = True
 
-        if cls.is_exist(key):
-            param = cls.from_primary_keys(key=key)
+        param = cls.from_primary_keys(key=key)
+        if param is not None:
             param.update(value=value, multi=multi)
         else:
             cls.insert(key=key, value=value, multi=multi)
 
+    @baked_query
+    def query_by_keys(cls, query):
+        return query.filter(
+            cls.key.in_(bindparam('keys', expanding=True))).with_entities(
+            cls.key, cls.multi, cls.value)
+
+    @classmethod
+    def get_many(cls, keys):
+        """ Return the values of the keys, the keys which are not in the
+        cache of the process are read by one query
+
+        :param keys: list of the keys whose value to retrieve
+        :return: the values of the existing keys
+        :rtype: dict {key: value}
+        """
+        cache = cls.get_cache()
+        values = {}
+        missing = list({x for x in keys if x not in cache})
+        if missing:
+            values = {x: None for x in missing}
+            for key, multi, value in cls.query_by_keys(keys=missing).all():
+                values[key] = (multi, value)
+
+            if cls.is_cacheable():
+                cache.update(values)
+
+        res = {}
+        for key in keys:
+            entry = values[key] if key in values else cache[key]
+            if entry is not None:
+                res[key] = cls.format_value(*entry)
+
+        return res
+
     @classmethod
     def is_exist(cls, key):
         """ Check if one parameter exist for the key
@@ -60,8 +161,7 @@ class Parameter:
         :param key: key to check
         :rtype: bool
         """
-        query = cls.query().filter(cls.key == key)
-        return True if query.count() else False
+        return key in cls.get_many([key])
 
     @classmethod
     def get(cls, key):
@@ -72,15 +172,12 @@ class Parameter:
         :rtype: anything JSON encodable
         :raises ParameterException: if the key doesn't exist.
         """
-        if not cls.is_exist(key):
+        res = cls.get_many([key])
+        if key not in res:
             raise ParameterException(
                 "unexisting key %r" % key)
 
-        param = cls.from_primary_keys(key=key)
-        if param.multi:
-            return param.value
-
-        return param.value['value']
+        return res[key]
 
     @classmethod
     def pop(cls, key):
@@ -91,15 +188,11 @@ class Parameter:
         :rtype: any JSON encodable type
         :raises ParameterException: if the key wasn't present
         """
-        if not cls.is_exist(key):
+        param = cls.from_primary_keys(key=key)
+        if param is None:
             raise ParameterException(
                 "unexisting key %r" % key)
 
-        param = cls.from_primary_keys(key=key)
-        if param.multi:
-            res = param.value
-        else:
-            res = param.value['value']
-
+        res = cls.format_value(param.multi, param.value)
         param.delete()
         return res
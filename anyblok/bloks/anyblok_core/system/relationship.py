@@ -27,24 +27,32 @@ class RelationShip(System.Field):
     nullable = Boolean()
 
     def _description(self):
-        res = super(RelationShip, self)._description()
-        remote_name = self.remote_name or ''
+        return self.get_description(
+            {x: getattr(self, x)
+             for x in ('name', 'model', 'label', 'ftype', 'nullable',
+                       'remote_model', 'remote_name')})
+
+    @classmethod
+    def get_description(cls, values):
+        res = super(RelationShip, cls).get_description(values)
+        remote_name = values['remote_name'] or ''
         res.update(
-            nullable=self.nullable,
-            model=self.remote_model,
+            nullable=values['nullable'],
+            model=values['remote_model'],
             remote_name=remote_name
         )
         return res
 
     @classmethod
-    def add_field(cls, rname, relation, model, table, ftype):
-        """ Insert a relationship definition
+    def get_field_values(cls, rname, relation, model, table, ftype):
+        """ Return the values of a relationship definition
 
         :param rname: name of the relationship
         :param relation: instance of the relationship
         :param model: namespace of the model
         :param table: name of the table of the model
         :param ftype: type of the AnyBlok Field
+        :rtype: dict
         """
         local_column = relation.info.get('local_column')
         remote_column = relation.info.get('remote_column')
@@ -53,31 +61,58 @@ class RelationShip(System.Field):
         label = relation.info.get('label')
         nullable = relation.info.get('nullable', True)
 
-        vals = dict(code=table + '.' + rname,
+        return dict(code=table + '.' + rname,
                     model=model, name=rname, local_column=local_column,
                     remote_model=remote_model, remote_name=remote_name,
                     remote_column=remote_column, label=label,
                     nullable=nullable, ftype=ftype)
-        cls.insert(**vals)
 
-        if remote_name:
-            remote_type = "Many2One"
-            if ftype == "Many2One":
-                remote_type = "One2Many"
-            elif ftype == 'Many2Many':
-                remote_type = "Many2Many"
-            elif ftype == "One2One":
-                remote_type = "One2One"
-
-            m = cls.registry.get(remote_model)
-            vals = dict(code=m.__tablename__ + '.' + remote_name,
-                        model=remote_model, name=remote_name,
-                        local_column=remote_column, remote_model=model,
-                        remote_name=rname,
-                        remote_column=local_column,
-                        label=remote_name.capitalize().replace('_', ' '),
-                        nullable=True, ftype=remote_type, remote=True)
-            cls.insert(**vals)
+    @classmethod
+    def get_remote_field_values(cls, values):
+        """ Return the values of the relationship definition on the remote
+        model, None if the relationship has not got any remote name
+
+        :param values: values of the relationship, see ``get_field_values``
+        :rtype: dict or None
+        """
+        if not values['remote_name']:
+            return None
+
+        ftype = values['ftype']
+        remote_type = "Many2One"
+        if ftype == "Many2One":
+            remote_type = "One2Many"
+        elif ftype == 'Many2Many':
+            remote_type = "Many2Many"
+        elif ftype == "One2One":
+            remote_type = "One2One"
+
+        remote_name = values['remote_name']
+        m = cls.registry.get(values['remote_model'])
+        return dict(code=m.__tablename__ + '.' + remote_name,
+                    model=values['remote_model'], name=remote_name,
+                    local_column=values['remote_column'],
+                    remote_model=values['model'],
+                    remote_name=values['name'],
+                    remote_column=values['local_column'],
+                    label=remote_name.capitalize().replace('_', ' '),
+                    nullable=True, ftype=remote_type, remote=True)
+
+    @classmethod
+    def add_field(cls, rname, relation, model, table, ftype):
+        """ Insert a relationship definition
+
+        :param rname: name of the relationship
+        :param relation: instance of the relationship
+        :param model: namespace of the model
+        :param table: name of the table of the model
+        :param ftype: type of the AnyBlok Field
+        """
+        vals = cls.get_field_values(rname, relation, model, table, ftype)
+        cls.insert(**vals)
+        remote_vals = cls.get_remote_field_values(vals)
+        if remote_vals:
+            cls.insert(**remote_vals)
 
     @classmethod
     def alter_field(cls, field, label, ftype):
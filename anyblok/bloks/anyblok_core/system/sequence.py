@@ -5,8 +5,10 @@
 # This Source Code Form is subject to the terms of the Mozilla Public License,
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
+from collections import deque
 from anyblok import Declarations
-from sqlalchemy import Sequence as SQLASequence
+from anyblok.declarations import classmethod_cache
+from sqlalchemy import Sequence as SQLASequence, select, func
 from anyblok.column import Integer, String
 
 
@@ -44,6 +46,14 @@ class Sequence:
         'SO-000001'
         >>> seq.nextval()
         'SO-000002'
+
+    To get many values at once, in one statement on postgresql::
+
+        >>> seq.nextval_many(3)
+        ['SO-000003', 'SO-000004', 'SO-000005']
+
+    .. seealso:: The :attr:`block_size` field to reserve the values by block
+                 in the process.
     """
 
     _cls_seq_name = 'system_sequence_seq_name'
@@ -70,11 +80,21 @@ class Sequence:
        * code: :attr:`code` field
        * id: :attr:`id` field
     """
+    block_size = Integer()
+    """Number of values reserved at once by the process (hi/lo allocation).
+
+    If greater than 1, :meth:`nextval` takes the values from a block
+    reserved in the process, the database is requested only when the block
+    is empty. The values are unique, but they are not given in order
+    between the processes, and the values of the block not used before the
+    end of the process are lost. :attr:`number` is the last reserved value.
+    """
 
     @classmethod
     def initialize_model(cls):
         """ Create the sequence to determine name """
         super(Sequence, cls).initialize_model()
+        cls._blocks = {}
         seq = SQLASequence(cls._cls_seq_name)
         seq.create(cls.registry.bind)
 
@@ -117,33 +137,170 @@ class Sequence:
     @classmethod
     def insert(cls, **kwargs):
         """Overwrite to call :meth:`create_sequence` on the fly."""
-        return super(Sequence, cls).insert(**cls.create_sequence(kwargs))
+        res = super(Sequence, cls).insert(**cls.create_sequence(kwargs))
+        cls.invalidate_cache()
+        return res
 
     @classmethod
     def multi_insert(cls, *args):
         """Overwrite to call :meth:`create_sequence` on the fly."""
         res = [cls.create_sequence(x) for x in args]
-        return super(Sequence, cls).multi_insert(*res)
+        res = super(Sequence, cls).multi_insert(*res)
+        cls.invalidate_cache()
+        return res
+
+    def update(self, **values):
+        """Overwrite to invalidate the cache of :meth:`get_values_by` when
+        another field than :attr:`number` is modified"""
+        res = super(Sequence, self).update(**values)
+        if set(values) - {'number'}:
+            self.invalidate_cache()
+
+        return res
+
+    def delete(self, *args, **kwargs):
+        """Overwrite to invalidate the cache of :meth:`get_values_by`"""
+        res = super(Sequence, self).delete(*args, **kwargs)
+        self.invalidate_cache()
+        return res
+
+    @classmethod
+    def invalidate_cache(cls):
+        cls.registry.System.Cache.invalidate(cls, 'get_values_by')
+
+    @classmethod
+    def is_cacheable(cls):
+        """ Return False while the invalidation of the cache waits for the
+        commit, the Sequences read in this transaction can be rolled back
+
+        :rtype: bool
+        """
+        return (cls.__registry_name__, 'get_values_by') not in (
+            cls.registry.System.Cache.get_pending_invalidations())
+
+    @classmethod
+    def get_sequence_values(cls, seq_name, count):
+        """Return the next values of the database sequence, in one statement
+        on postgresql.
+
+        :param seq_name: name of the sequence in the database
+        :param count: number of values
+        :rtype: list of int
+        """
+        if count <= 0:
+            return []
+
+        if cls.registry.engine.dialect.name == 'postgresql':
+            query = select([func.nextval(seq_name)]).select_from(
+                func.generate_series(1, count))
+            return sorted(x[0] for x in cls.registry.execute(query))
+
+        return [cls.registry.execute(SQLASequence(seq_name))
+                for _ in range(count)]
+
+    @classmethod
+    def update_number(cls, seq_id, number):
+        """Save the last value given by the Sequence, without loading it"""
+        cls.query().filter(cls.id == seq_id).update({'number': number})
+
+    @classmethod
+    def get_next_number(cls, seq_id, seq_name, block_size):
+        """Return the next value of the database sequence and save it in
+        :attr:`number`.
+
+        If ``block_size`` is greater than 1, the value is taken from the
+        block reserved by the process, a new block of ``block_size`` values
+        is reserved when it is empty.
+
+        :param seq_id: id of the Sequence
+        :param seq_name: name of the sequence in the database
+        :param block_size: :attr:`block_size` of the Sequence
+        :rtype: int
+        """
+        if not block_size or block_size <= 1:
+            value = cls.registry.execute(SQLASequence(seq_name))
+            cls.update_number(seq_id, value)
+            return value
+
+        try:
+            return cls._blocks[seq_name].popleft()
+        except (KeyError, IndexError):
+            pass
+
+        values = cls.get_sequence_values(seq_name, block_size)
+        cls.update_number(seq_id, values[-1])
+        cls._blocks[seq_name] = deque(values[1:])
+        return values[0]
+
+    def format_value(self, value):
+        return self.formater.format(code=self.code, seq=value, id=self.id)
 
     def nextval(self):
         """Format and return the next value of the sequence.
 
         :rtype: str
         """
-        nextval = self.registry.execute(SQLASequence(self.seq_name))
-        self.update(number=nextval)
-        return self.formater.format(code=self.code, seq=nextval, id=self.id)
+        return self.format_value(
+            self.get_next_number(self.id, self.seq_name, self.block_size))
+
+    def nextval_many(self, count):
+        """Format and return the next values of the sequence, they are
+        fetched by one statement on postgresql and :attr:`number` is
+        updated once.
+
+        The values are always taken from the database sequence, not from the
+        block reserved by the process.
+
+        :param count: number of values
+        :rtype: list of str
+        """
+        values = self.get_sequence_values(self.seq_name, count)
+        if values:
+            self.update(number=values[-1])
+
+        return [self.format_value(x) for x in values]
+
+    @classmethod
+    def query_values_by(cls, **crit):
+        """Return the values used by :meth:`nextval` of the first Sequence
+        matching the criteria
+
+        :rtype: tuple (id, code, seq_name, formater, block_size) or None
+        """
+        filters = [getattr(cls, k) == v for k, v in crit.items()]
+        values = cls.query().filter(*filters).with_entities(
+            cls.id, cls.code, cls.seq_name, cls.formater,
+            cls.block_size).first()
+        return tuple(values) if values is not None else None
+
+    @classmethod_cache()
+    def get_values_by(cls, **crit):
+        """Return :meth:`query_values_by`, the result is kept in the process
+        until a Sequence is inserted, modified or deleted
+
+        :rtype: tuple (id, code, seq_name, formater, block_size) or None
+        """
+        return cls.query_values_by(**crit)
 
     @classmethod
     def nextvalBy(cls, **crit):
         """Return next value of the first Sequence matching given criteria.
 
+        The Sequence found is kept in the process by :meth:`get_values_by`,
+        the Sequence is not loaded.
+
         :param crit: criteria to match, e.g., ``code=SO``
         :return: :meth:`next_val` result for the first matching Sequence,
                  or ``None`` if there's no match.
         """
-        filters = [getattr(cls, k) == v for k, v in crit.items()]
-        seq = cls.query().filter(*filters).first()
-        if seq is None:
+        if cls.is_cacheable():
+            values = cls.get_values_by(**crit)
+        else:
+            values = cls.query_values_by(**crit)
+
+        if values is None:
             return None
-        return seq.nextval()
+
+        seq_id, code, seq_name, formater, block_size = values
+        value = cls.get_next_number(seq_id, seq_name, block_size)
+        return formater.format(code=code, seq=value, id=seq_id)
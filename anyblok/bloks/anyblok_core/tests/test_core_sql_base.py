@@ -101,7 +101,7 @@ class TestCoreSqlBase(BlokTestCase):
                          'type': 'String'}}
         self.assertEqual(Model.fields_description(fields=['table']), res)
 
-    def test_fields_description_cache(self):
+    def test_fields_description_from_assembled_model(self):
         Model = self.registry.System.Model
         Column = self.registry.System.Column
         self.maxDiff = None
@@ -117,7 +117,7 @@ class TestCoreSqlBase(BlokTestCase):
         column.label = 'Test'
         self.assertEqual(Model.fields_description(fields=['table']), res)
         Model.fire('Update Model', 'Model.System.Model')
-        self.assertNotEqual(Model.fields_description(fields=['table']), res)
+        self.assertEqual(Model.fields_description(fields=['table']), res)
 
     def test_to_dict(self):
         M = self.registry.System.Model
@@ -64,3 +64,80 @@ class TestSystemParameter(BlokTestCase):
         Parameter.set('test.parameter', False)
         self.assertEqual(query.count(), 1)
         self.assertEqual(Parameter.get('test.parameter'), False)
+
+    def test_get_many(self):
+        Parameter = self.registry.System.Parameter
+        Parameter.set('test.parameter1', True)
+        Parameter.set('test.parameter2', {'test': True})
+        self.assertEqual(
+            Parameter.get_many(['test.parameter1', 'test.parameter2',
+                                'test.parameter3']),
+            {'test.parameter1': True, 'test.parameter2': {'test': True}})
+
+    def test_get_many_one_query(self):
+        Parameter = self.registry.System.Parameter
+        Parameter.set('test.parameter1', True)
+        Parameter.set('test.parameter2', False)
+        with self.count_queries() as statements:
+            Parameter.get_many(['test.parameter1', 'test.parameter2'])
+
+        self.assertEqual(len(statements), 1)
+
+    def test_get_from_cache(self):
+        Parameter = self.registry.System.Parameter
+        Parameter.set('test.parameter', {'test': True})
+        # as after the commit of the invalidation
+        self.registry.System.Cache.discard_invalidations()
+        self.assertEqual(Parameter.get('test.parameter'), {'test': True})
+        with self.count_queries() as statements:
+            value = Parameter.get('test.parameter')
+            self.assertEqual(value, {'test': True})
+            self.assertTrue(Parameter.is_exist('test.parameter'))
+            self.assertFalse(Parameter.is_exist('test.parameter2'))
+            self.assertFalse(Parameter.is_exist('test.parameter2'))
+
+        self.assertEqual(len(statements), 1)
+        # the cached value is not modified by the caller
+        value['test'] = False
+        self.assertEqual(Parameter.get('test.parameter'), {'test': True})
+
+    def test_set_invalidate_cache(self):
+        Parameter = self.registry.System.Parameter
+        Parameter.set('test.parameter', True)
+        self.registry.System.Cache.discard_invalidations()
+        self.assertEqual(Parameter.get('test.parameter'), True)
+        Parameter.set('test.parameter', False)
+        self.assertEqual(Parameter.get('test.parameter'), False)
+
+    def test_pop(self):
+        Parameter = self.registry.System.Parameter
+        Parameter.set('test.parameter', True)
+        self.registry.System.Cache.discard_invalidations()
+        self.assertEqual(Parameter.get('test.parameter'), True)
+        self.assertEqual(Parameter.pop('test.parameter'), True)
+        self.assertFalse(Parameter.is_exist('test.parameter'))
+        with self.assertRaises(ParameterException):
+            Parameter.pop('test.parameter')
+
+    def test_insert_invalidate_cache(self):
+        Parameter = self.registry.System.Parameter
+        self.assertFalse(Parameter.is_exist('test.parameter'))
+        Parameter.insert(key='test.parameter', value={'value': True})
+        self.assertEqual(Parameter.get('test.parameter'), True)
+
+    def test_update_invalidate_cache(self):
+        Parameter = self.registry.System.Parameter
+        Parameter.set('test.parameter', True)
+        self.registry.System.Cache.discard_invalidations()
+        self.assertEqual(Parameter.get('test.parameter'), True)
+        param = Parameter.from_primary_keys(key='test.parameter')
+        param.update(value={'value': False})
+        self.assertEqual(Parameter.get('test.parameter'), False)
+
+    def test_delete_invalidate_cache(self):
+        Parameter = self.registry.System.Parameter
+        Parameter.set('test.parameter', True)
+        self.registry.System.Cache.discard_invalidations()
+        self.assertEqual(Parameter.get('test.parameter'), True)
+        Parameter.from_primary_keys(key='test.parameter').delete()
+        self.assertFalse(Parameter.is_exist('test.parameter'))
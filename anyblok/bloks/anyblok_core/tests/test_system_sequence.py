@@ -59,3 +59,96 @@ class TestSystemSequence(BlokTestCase):
         self.assertEqual(Sequence.nextvalBy(code=seq.code), str(number + 1))
         self.assertEqual(Sequence.nextvalBy(code=seq.code), str(number + 2))
         self.assertEqual(Sequence.nextvalBy(code=seq.code), str(number + 3))
+
+    def test_nextval_by_attribute_cached(self):
+        Sequence = self.registry.System.Sequence
+        seq = Sequence.insert(code='test.sequence', formater='{code}-{seq}')
+        number = seq.number
+        # as after the commit of the invalidation
+        self.registry.System.Cache.discard_invalidations()
+        self.assertEqual(Sequence.nextvalBy(code=seq.code),
+                         'test.sequence-%d' % (number + 1))
+        self.registry.flush()
+        self.registry.session.expunge_all()
+        with self.count_queries() as queries:
+            self.assertEqual(Sequence.nextvalBy(code='test.sequence'),
+                             'test.sequence-%d' % (number + 2))
+
+        # the value of the sequence and the update of the number
+        self.assertEqual(len(queries), 2)
+        self.assertFalse([x for x in queries if 'FROM system_sequence' in x])
+        seq = Sequence.query().filter_by(code='test.sequence').one()
+        self.assertEqual(seq.number, number + 2)
+
+    def test_nextval_by_attribute_cached_after_change(self):
+        Sequence = self.registry.System.Sequence
+        seq = Sequence.insert(code='test.sequence')
+        self.registry.System.Cache.discard_invalidations()
+        number = seq.number
+        self.assertEqual(Sequence.nextvalBy(code=seq.code), str(number + 1))
+        seq.update(formater='new_{seq}')
+        self.assertEqual(Sequence.nextvalBy(code=seq.code),
+                         'new_%d' % (number + 2))
+        seq.delete()
+        self.assertIsNone(Sequence.nextvalBy(code='test.sequence'))
+
+    def test_nextval_by_attribute_after_change(self):
+        Sequence = self.registry.System.Sequence
+        seq = Sequence.insert(code='test.sequence')
+        number = seq.number
+        self.assertEqual(Sequence.nextvalBy(code=seq.code), str(number + 1))
+        seq.update(code='other.sequence')
+        self.assertIsNone(Sequence.nextvalBy(code='test.sequence'))
+        seq2 = Sequence.insert(code='test.sequence', formater='new_{seq}')
+        number2 = seq2.number
+        self.assertEqual(Sequence.nextvalBy(code='test.sequence'),
+                         'new_%d' % (number2 + 1))
+        self.assertEqual(Sequence.nextvalBy(code='other.sequence'),
+                         str(number + 2))
+
+    def test_nextval_by_unexisting_attribute(self):
+        Sequence = self.registry.System.Sequence
+        self.assertIsNone(Sequence.nextvalBy(code='unexisting.sequence'))
+
+    def test_nextval_many(self):
+        Sequence = self.registry.System.Sequence
+        seq = Sequence.insert(code='test.sequence', formater='prefix_{seq}')
+        number = seq.number
+        self.assertEqual(seq.nextval(), 'prefix_%d' % (number + 1))
+        with self.count_queries() as queries:
+            values = seq.nextval_many(3)
+
+        self.assertEqual(values, ['prefix_%d' % (number + x)
+                                  for x in range(2, 5)])
+        if self.registry.engine.dialect.name == 'postgresql':
+            self.assertEqual(
+                len([x for x in queries if 'nextval' in x]), 1)
+
+        self.assertEqual(seq.number, number + 4)
+        self.assertEqual(seq.nextval(), 'prefix_%d' % (number + 5))
+        self.assertEqual(seq.nextval_many(0), [])
+
+    def test_nextval_by_block(self):
+        Sequence = self.registry.System.Sequence
+        seq = Sequence.insert(code='test.sequence', block_size=3)
+        number = seq.number
+        self.assertEqual(seq.nextval(), str(number + 1))
+        self.assertEqual(seq.number, number + 3)
+        with self.count_queries() as queries:
+            self.assertEqual(seq.nextval(), str(number + 2))
+            self.assertEqual(seq.nextval(), str(number + 3))
+
+        self.assertEqual(queries, [])
+        self.assertEqual(seq.nextval(), str(number + 4))
+        self.assertEqual(seq.number, number + 6)
+
+    def test_nextval_by_block_shared_by_instances(self):
+        Sequence = self.registry.System.Sequence
+        seq = Sequence.insert(code='test.sequence', block_size=10)
+        number = seq.number
+        self.assertEqual(seq.nextval(), str(number + 1))
+        self.assertEqual(Sequence.nextvalBy(code='test.sequence'),
+                         str(number + 2))
+        self.assertEqual(seq.nextval_many(2),
+                         [str(number + 11), str(number + 12)])
+        self.assertEqual(seq.nextval(), str(number + 3))
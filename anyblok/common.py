@@ -116,11 +116,16 @@ def apply_cache(attr, method, registry, namespace, base, properties):
         elif attr not in registry.caches[namespace]:
             registry.caches[namespace][attr] = []
 
-        @lru_cache(maxsize=method.size)
-        def wrapper(*args, **kwargs):
-            return method(*args, **kwargs)
+        if getattr(method, 'backend', 'lru') == 'shared':
+            from .shared_cache import SharedCache
+            wrapper = SharedCache(method, registry, namespace, attr)
+        else:
+            @lru_cache(maxsize=method.size)
+            def wrapper(*args, **kwargs):
+                return method(*args, **kwargs)
+
+            wrapper.indentify = (namespace, attr)
 
-        wrapper.indentify = (namespace, attr)
         registry.caches[namespace][attr].append(wrapper)
         if method.is_cache_classmethod:
             return {attr: classmethod(wrapper)}
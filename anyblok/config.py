@@ -715,6 +715,17 @@ def add_configuration_file(parser):
                         default=os.environ.get('ANYBLOK_DEFAULT_TIMEZONE'),
                         help="default timezone use by naive datetime "
                              "(by default use the timezone of the serveur")
+    parser.add_argument('--cache-compaction-threshold', type=int,
+                        default=100000,
+                        help="Compact the system_cache table when it has "
+                             "more rows than this number (0 to disable)")
+    parser.add_argument('--cache-shared-path',
+                        default=os.environ.get('ANYBLOK_CACHE_SHARED_PATH'),
+                        help="Path of the sqlite file used by the cached "
+                             "methods with the shared backend")
+    parser.add_argument('--batch-flush-size', type=int, default=1000,
+                        help="Number of pending objects which forces the "
+                             "flush of the session in registry.batch()")
 
 
 @Configuration.add('database', label="Database",
@@ -749,6 +760,32 @@ def add_database(group):
     group.add_argument('--db-echo-pool', action="store_true", default=False)
     group.add_argument('--db-max-overflow', type=int, default=10)
     group.add_argument('--db-pool-size', type=int, default=5)
+    group.add_argument('--session-stats', action="store_true",
+                       default=False,
+                       help="Count the statements executed by the sessions, "
+                            "see registry.session_stats()")
+    group.add_argument('--session-stats-threshold', type=int, default=20,
+                       help="Log a warning when the same statement is "
+                            "executed more than this number of times in one "
+                            "transaction (0 to disable)")
+    group.add_argument('--slow-query-threshold', type=float, default=0,
+                       help="Log the statements which take more than this "
+                            "duration in second (0 to disable)")
+    group.add_argument('--slow-query-explain-threshold', type=float,
+                       default=0,
+                       help="Log the plan of the slow SELECT statements "
+                            "which take more than this duration in second, "
+                            "only on postgresql (0 to disable)")
+    group.add_argument('--slow-query-explain-analyze', action="store_true",
+                       default=False,
+                       help="Execute the slow SELECT statements again to "
+                            "log their plan with the real costs (EXPLAIN "
+                            "ANALYZE), except the statements with side "
+                            "effects (FOR UPDATE, nextval, ...)")
+    group.add_argument('--slow-query-redact-parameters', action="store_true",
+                       default=False,
+                       help="Do not log the values of the parameters of the "
+                            "slow statements")
     group.add_argument('--default-encrypt-key',
                        default=os.environ.get('ANYBLOK_ENCRYPT_KEY'),
                        help=("Default ey definition to encrypt column with "
@@ -5,6 +5,8 @@
 # This Source Code Form is subject to the terms of the Mozilla Public License,
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
+from functools import wraps
+from sqlalchemy.ext.baked import Result
 from .mapper import MapperAdapter
 from .common import add_autodocs
 
@@ -152,21 +154,81 @@ def cache(size=128):
     return wrapper
 
 
-def classmethod_cache(size=128):
+def classmethod_cache(size=128, backend='lru'):
+    """Cache the result of a classmethod
+
+    :param size: size of the ``lru_cache``
+    :param backend: ``lru`` (default) the cache is in the process,
+        ``shared`` the pickled result is shared by all the processes of
+        the host, see :mod:`anyblok.shared_cache`
+    :exception: DeclarationsException
+    """
+    if backend not in ('lru', 'shared'):
+        raise DeclarationsException("Unknown cache backend %r" % backend)
+
     autodoc = """
-    **Cached classmethod** with size=%(size)s
-    """ % dict(size=size)
+    **Cached classmethod** with size=%(size)s and backend=%(backend)s
+    """ % dict(size=size, backend=backend)
 
     def wrapper(method):
         add_autodocs(method, autodoc)
         method.is_cache_method = True
         method.is_cache_classmethod = True
         method.size = size
+        method.backend = backend
         return method
 
     return wrapper
 
 
+class BakedQueryResult(Result):
+    """ Result of a baked query, as ``Query.all``, ``all`` returns an
+    instrumented list
+    """
+
+    def all(self):
+        """ Return an instrumented list of the result of the query
+        """
+        return self.session.registry.InstrumentedList(
+            super(BakedQueryResult, self).all())
+
+
+def baked_query(method):
+    """Bake the query built by a classmethod of a model: the query is built
+    and compiled only once by model, the next calls only bind the
+    parameters::
+
+        @baked_query
+        def query_by_name(cls, query):
+            return query.filter(cls.name == bindparam('name'))
+
+        Model.query_by_name(name='test').all()
+
+    The method receives the query of the model and returns the query to
+    execute, the values are given by ``bindparam``. The decorated method is
+    a classmethod which takes the values of the parameters and returns a
+    ``BakedQueryResult`` (``all``, ``first``, ``one``, ``one_or_none``,
+    ``count``, ``scalar`` and ``get``), ``all`` returns an instrumented
+    list as ``Query.all``
+
+    :param method: method which builds the query
+    """
+    autodoc = """
+    **Baked query**, the query is built and compiled once by model
+    """
+    add_autodocs(method, autodoc)
+
+    @wraps(method)
+    def wrapper(cls, **params):
+        # the model and the method are in the key of the baked query,
+        # because the code of the lambda is the same for all of them
+        query = cls.registry.bakery(
+            lambda session: method(cls, session.query(cls)), cls, method)
+        return BakedQueryResult(query, cls.registry.session).params(**params)
+
+    return classmethod(wrapper)
+
+
 def hybrid_method(method=None):
     autodoc = """
     **Hybrid method**
@@ -5,7 +5,13 @@
 # This Source Code Form is subject to the terms of the Mozilla Public License,
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
+from sqlalchemy import event
 from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm.attributes import (instance_state, PASSIVE_NO_FETCH,
+                                       PASSIVE_NO_RESULT)
+from sqlalchemy.orm.interfaces import MANYTOONE
+from operator import attrgetter
+from weakref import WeakSet
 from anyblok.common import anyblok_column_prefix
 from anyblok.mapper import ModelRepr
 
@@ -14,6 +20,21 @@ class FieldException(Exception):
     """ Simple Exception for Field """
 
 
+def index_loaded_collection(state, collection, collection_adapter):
+    """ Event ``init_collection``, add the instance in the index of the
+    loaded collections of its session, if the index exists, see
+    ``Field.get_loaded_collections``
+    """
+    session = state.session
+    if session is None:
+        return
+
+    index = session.info.get('anyblok_loaded_collections', {}).get(
+        (state.mapper.base_mapper, collection_adapter.attr.key))
+    if index is not None:
+        index.add(state)
+
+
 class Field:
     """ Field class
 
@@ -106,20 +127,149 @@ class Field:
 
         return expr_column
 
+    def get_attribute_key(self, obj, name):
+        """ Return the key of the attribute in the state of the instance
+
+        :param obj: instance of a model
+        :param name: name of the field
+        """
+        if name in obj.hybrid_property_columns:
+            return anyblok_column_prefix + name
+
+        return name
+
+    def get_related_objects(self, model_self, fieldname):
+        """ Return the related objects of the relationship, without query,
+        if they are already loaded or found in the identity map. If the
+        foreign key is loaded but the related object is not in the identity
+        map, no related object is in the session
+
+        :param model_self: instance of the model
+        :param fieldname: name of the relationship
+        :rtype: list of instance, or None if the related objects can not be
+            found without query (the foreign key is not loaded)
+        """
+        state = instance_state(model_self)
+        attribute = state.manager[self.get_attribute_key(
+            model_self, fieldname)]
+        value = attribute.impl.get(
+            state, state.dict, passive=PASSIVE_NO_FETCH)
+        if value is PASSIVE_NO_RESULT:
+            prop = attribute.property
+            if prop.direction is MANYTOONE and all(
+                prop.parent.get_property_by_column(column).key in state.dict
+                for column in prop.local_columns
+            ):
+                return []
+
+            return None
+
+        if value is None:
+            return []
+        elif isinstance(value, list):
+            return value
+
+        return [value]
+
+    def get_loaded_collections(self, session, attribute):
+        """ Return the index of the instances of the session whose remote
+        collection may be loaded
+
+        The index is built by one scan of the identity map, the first time
+        it is needed in the session, then it is filled by the
+        ``init_collection`` event of the collection
+
+        :param session: the session of the instances
+        :param attribute: the attribute of the collection
+        :rtype: WeakSet of the states of the instances
+        """
+        mapper = attribute.property.parent.base_mapper
+        indexes = session.info.setdefault('anyblok_loaded_collections', {})
+        index = indexes.get((mapper, attribute.key))
+        if index is None:
+            if not event.contains(attribute, 'init_collection',
+                                  index_loaded_collection):
+                event.listen(attribute, 'init_collection',
+                             index_loaded_collection, raw=True,
+                             propagate=True)
+
+            index = indexes[(mapper, attribute.key)] = WeakSet(
+                state for state in session.identity_map.all_states()
+                if state.mapper.base_mapper is mapper and (
+                    attribute.key in state.dict))
+
+        return index
+
+    def expire_remote_attribute(self, model_self, fieldname, remote_name):
+        """ Expire the remote attribute when the related objects can not be
+        found without query
+
+        * remote collection: the collections loaded in the session are
+          expired, they are found by ``get_loaded_collections``, without
+          scanning the identity map at each assignment
+        * remote scalar: the relationship is loaded to find the related
+          object
+
+        :param model_self: instance of the model
+        :param fieldname: name of the relationship
+        :param remote_name: name of the remote attribute
+        """
+        attribute = getattr(model_self.__class__, self.get_attribute_key(
+            model_self, fieldname))
+        Remote = attribute.property.mapper.class_
+        remote_attribute = getattr(Remote, remote_name)
+        if not remote_attribute.property.uselist:
+            obj = getattr(model_self, attribute.key)
+            if obj is not None:
+                self.expire_loaded_attribute(obj, remote_name)
+
+            return
+
+        index = self.get_loaded_collections(
+            model_self.registry.session, remote_attribute)
+        for state in list(index):
+            obj = state.obj()
+            if obj is not None:
+                self.expire_loaded_attribute(obj, remote_name)
+
+            if obj is None or remote_attribute.key not in state.dict:
+                # the collection is indexed again when it is loaded
+                index.discard(state)
+
+    def expire_loaded_attribute(self, obj, name):
+        """ Expire the attribute of the instance only if it is loaded,
+        expire a not loaded attribute has no effect
+
+        :param obj: instance of a model
+        :param name: name of the field
+        """
+        state = instance_state(obj)
+        key = self.get_attribute_key(obj, name)
+        if key in state.dict and state.persistent:
+            if obj in obj.registry.session:
+                obj.registry.session.expire(obj, [key])
+
     def expire_related_attribute(self, model_self, action_todos):
-        for action_todo in action_todos:
+        """ Expire the attributes linked with the field. The attributes of
+        the instance are expired first, then the related objects are read
+        without query, to not reload each relationship at each assignment
+
+        :param model_self: instance of the model
+        :param action_todos: set of (attribute,) or (relationship,
+            remote attribute)
+        """
+        for action_todo in sorted(action_todos, key=len):
             if len(action_todo) == 1:
-                obj = model_self
-                attrs = [action_todo[0]]
-            else:
-                obj = getattr(model_self, action_todo[0])
-                attrs = [action_todo[1]]
-                if obj is None:
-                    continue
+                self.expire_loaded_attribute(model_self, action_todo[0])
+                continue
+
+            objs = self.get_related_objects(model_self, action_todo[0])
+            if objs is None:
+                self.expire_remote_attribute(model_self, *action_todo)
+                continue
 
-            if obj in model_self.registry.session:
-                if obj._sa_instance_state.persistent:
-                    model_self.registry.expire(obj, attrs)
+            for obj in objs:
+                self.expire_loaded_attribute(obj, action_todo[1])
 
     def setter_format_value(self, value):
         return value
@@ -141,6 +291,51 @@ class Field:
 
         return setter_column
 
+    def has_fast_accessors(self):
+        """ Return True if the accessors of the hybrid property are the
+        default ones, which can be replaced by the fast accessors once all
+        the models are assembled
+        """
+        cls = self.__class__
+        return (cls.get_property is Field.get_property and
+                cls.wrap_getter_column is Field.wrap_getter_column and
+                cls.wrap_setter_column is Field.wrap_setter_column)
+
+    def wrap_fast_getter_column(self, fieldname):
+        """Return the getter for the field, the mapped attribute is read
+        directly if ``getter_format_value`` is not overloaded
+
+        :param fieldname: name of the field
+        """
+        attr_name = anyblok_column_prefix + fieldname
+        if self.__class__.getter_format_value is Field.getter_format_value:
+            return attrgetter(attr_name)
+
+        getter_format_value = self.getter_format_value
+
+        def getter_column(model_self):
+            return getter_format_value(getattr(model_self, attr_name))
+
+        return getter_column
+
+    def wrap_fast_setter_column(self, fieldname):
+        """Return the setter for the field, without the expiration of the
+        related attributes, only for the fields without any
+
+        :param fieldname: name of the field
+        """
+        attr_name = anyblok_column_prefix + fieldname
+        if self.__class__.setter_format_value is Field.setter_format_value:
+            def setter_column(model_self, value):
+                setattr(model_self, attr_name, value)
+        else:
+            setter_format_value = self.setter_format_value
+
+            def setter_column(model_self, value):
+                setattr(model_self, attr_name, setter_format_value(value))
+
+        return setter_column
+
     def get_sqlalchemy_mapping(self, registry, namespace, fieldname,
                                properties):
         """ Return the instance of the real field
@@ -10,13 +10,14 @@
 from anyblok.registry import RegistryManager
 from anyblok import Declarations
 from anyblok.field import Field, FieldException
-from anyblok.relationship import RelationShip
+from anyblok.relationship import RelationShip, Many2Many
 from anyblok.column import Column
 from sqlalchemy import inspection
 from anyblok.common import TypeList
 from copy import deepcopy
 from sqlalchemy.ext.declarative import declared_attr
-from anyblok.mapper import ModelAttribute
+from sqlalchemy.ext.hybrid import hybrid_property
+from anyblok.mapper import ModelAttribute, FakeColumn, FakeRelationShip
 from anyblok.common import anyblok_column_prefix
 from texttable import Texttable
 from .plugins import get_model_plugins
@@ -246,6 +247,7 @@ class Model:
         if field.use_hybrid_property:
             properties[name] = field.get_property(
                 registry, namespace, name, properties)
+            properties[name].anyblok_field = field
             properties['hybrid_property_columns'].append(name)
 
         registry.call_plugins('declare_field', name, field, namespace,
@@ -496,6 +498,182 @@ class Model:
 
         return bases, properties
 
+    @classmethod
+    def get_namespace_fields(cls, registry, namespace):
+        """ Return the fields known by the first step of the namespace and of
+        the namespaces it depends on, the first step is not modified
+
+        :param registry: the current registry
+        :param namespace: the namespace of the model
+        :rtype: dict {field name: field}
+        """
+        first_step = registry.loaded_namespaces_first_step[namespace]
+        fields = {x: y for x, y in first_step.items()
+                  if isinstance(y, (Field, FakeColumn, FakeRelationShip))}
+        for depend in first_step['__depends__']:
+            if depend != namespace:
+                for x, y in cls.get_namespace_fields(registry,
+                                                     depend).items():
+                    if x not in fields:
+                        fields[x] = y
+
+        return fields
+
+    @classmethod
+    def get_backrefs_to_expire(cls, registry, namespace, column):
+        """ Return the backrefs of the relationships of the namespace which
+        use the column as remote column
+
+        :param registry: the current registry
+        :param namespace: the remote namespace, of the foreign key
+        :param column: the name of the column
+        :rtype: list of (attribute to expire, remote attribute)
+        """
+        res = []
+        first_step = registry.loaded_namespaces_first_step[namespace]
+        for name, field in first_step.items():
+            if not isinstance(field, RelationShip):
+                continue
+
+            if 'backref' not in field.kwargs:
+                continue
+
+            for mapper in getattr(field, 'remote_columns', None) or ():
+                if getattr(mapper, 'attribute_name', mapper) == column:
+                    res.append((field.kwargs['backref'][0], name))
+
+        return res
+
+    @classmethod
+    def get_linked_fields(cls, fields, columns, relationships, name):
+        """ Return the fields linked with the field ``name``: the columns of
+        the relationships and the relationships of the columns, recursively
+
+        :param fields: the fields of the namespace
+        :param columns: dict {relationship name: [column name, ...]}
+        :param relationships: dict {column name: [relationship name, ...]}
+        :param name: name of the field
+        :rtype: list of field name
+        """
+        res = []
+        todo = [name]
+        while todo:
+            fname = todo.pop()
+            if fname in res:
+                continue
+
+            res.append(fname)
+            if isinstance(fields[fname], (Column, FakeColumn)):
+                todo.extend(relationships.get(fname, ()))
+            elif fname in columns:
+                todo.extend(x for x in columns[fname] if x in fields)
+
+        return res
+
+    @classmethod
+    def get_attributes_to_expire(cls, registry, fields, columns,
+                                 relationships, name):
+        """ Return the remote attributes to expire when the field ``name``
+        is modified
+
+        :param registry: the current registry
+        :param fields: the fields of the namespace
+        :param columns: dict {relationship name: [column name, ...]}
+        :param relationships: dict {column name: [relationship name, ...]}
+        :param name: name of the field
+        :rtype: list of (attribute to expire, remote attribute)
+        """
+        field = fields[name]
+        if isinstance(field, (Column, FakeColumn)):
+            res = []
+            for rname in relationships.get(name, ()):
+                res.extend(cls.get_attributes_to_expire(
+                    registry, fields, columns, relationships, rname))
+
+            if isinstance(field, Column) and field.foreign_key:
+                res.extend(cls.get_backrefs_to_expire(
+                    registry, field.foreign_key.model_name, name))
+
+            return res
+        elif name in columns and 'backref' in field.kwargs:
+            return [(name, field.kwargs['backref'][0])]
+        elif isinstance(field, FakeRelationShip):
+            return [(name, field.mapper.attribute_name)]
+
+        return []
+
+    @classmethod
+    def load_relationship_index(cls, registry, namespace):
+        """ Index, for each field of the namespace, the fields linked with
+        it and the remote attributes to expire when it is modified
+
+        The index is used by ``find_relationship`` and
+        ``find_remote_attribute_to_expire``
+
+        :param registry: the current registry
+        :param namespace: the namespace of the model
+        """
+        fields = cls.get_namespace_fields(registry, namespace)
+        columns = {}
+        relationships = {}
+        for name, field in fields.items():
+            if (isinstance(field, RelationShip) and
+                    not isinstance(field, Many2Many)):
+                columns[name] = [
+                    x.attribute_name
+                    for x in getattr(field, 'column_names', None) or ()]
+                for cname in columns[name]:
+                    relationships.setdefault(cname, []).append(name)
+
+        registry.loaded_namespaces_relationships[namespace] = {
+            'fields': list(fields.keys()),
+            'linked': {
+                name: cls.get_linked_fields(
+                    fields, columns, relationships, name)
+                for name in fields},
+            'expire': {
+                name: cls.get_attributes_to_expire(
+                    registry, fields, columns, relationships, name)
+                for name in fields},
+        }
+
+    @classmethod
+    def load_fast_accessors(cls, registry):
+        """ Replace the accessors of the hybrid properties of the fields by
+        the fast accessors, once all the models are assembled and the
+        attributes to expire are known. The setter keeps the expiration of
+        the related attributes if one of the models which use the hybrid
+        property has related attributes to expire for the field
+
+        :param registry: the current registry
+        """
+        properties = {}
+        for namespace, Model in registry.loaded_namespaces.items():
+            expire_attributes = registry.expire_attributes.get(namespace, {})
+            for name in getattr(Model, 'hybrid_property_columns', ()):
+                for base in Model.__mro__:
+                    if name in base.__dict__:
+                        prop = base.__dict__[name]
+                        break
+                else:
+                    continue
+
+                entry = properties.setdefault(id(prop), [prop, name, False])
+                if expire_attributes.get(name):
+                    entry[2] = True
+
+        for prop, name, expire in properties.values():
+            field = getattr(prop, 'anyblok_field', None)
+            if not isinstance(prop, hybrid_property) or field is None:
+                continue
+
+            if not field.has_fast_accessors():
+                continue
+
+            prop.fget = field.wrap_fast_getter_column(name)
+            if not expire:
+                prop.fset = field.wrap_fast_setter_column(name)
+
     @classmethod
     def assemble_callback(cls, registry):
         """ Assemble callback is called to assemble all the Model
@@ -515,6 +693,17 @@ class Model:
         for namespace in registry.loaded_registries['Model_names']:
             cls.load_namespace_second_step(registry, namespace)
 
+        registry.loaded_namespaces_relationships = {}
+        for namespace in registry.loaded_registries['Model_names']:
+            cls.load_relationship_index(registry, namespace)
+
+        cls.load_fast_accessors(registry)
+
+        # the fields of the assembled models, known without any query
+        registry.loaded_namespaces_metadata = {}
+        if 'Model.System.Model' in registry.loaded_namespaces:
+            registry.System.Model.load_metadata()
+
     @classmethod
     def initialize_callback(cls, registry):
         """ initialize callback is called after assembling all entries
@@ -0,0 +1,395 @@
+# This file is a part of the AnyBlok project
+#
+#    Copyright (C) 2018 Jean-Sebastien SUZANNE <jssuzanne@anybox.fr>
+#
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file,You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+"""Instrumentation of the statements executed by the registry
+
+* the statistics of the session count the executed statements, grouped by
+  normalized SQL, and warn when the same statement is executed too many
+  times in one transaction, which is the sign of a N+1 queries pattern
+* the slow query log logs the statements slower than a threshold, with
+  their call site and optionally their plan
+"""
+import re
+import sys
+from time import perf_counter
+from traceback import format_stack
+from logging import getLogger
+from sqlalchemy import event
+from sqlalchemy.sql.expression import Executable, ClauseElement
+from sqlalchemy.ext.compiler import compiles
+
+logger = getLogger(__name__)
+
+PARAMETERS = re.compile(r"%\(\w+\)s|%s|\?")
+LIST_OF_PARAMETERS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+SIDE_EFFECTS = re.compile(
+    r"\bFOR\s+(?:NO\s+KEY\s+)?(?:UPDATE|SHARE|KEY\s+SHARE)\b|"
+    r"\b(?:nextval|setval|pg_advisory_\w*lock\w*)\s*\(",
+    re.IGNORECASE)
+
+
+def normalize_statement(statement):
+    """ Return the shape of the statement: the parameters are replaced by
+    ``?`` and the lists of parameters by ``(?)``, so the statements which
+    differ only by their parameters are grouped
+
+    :param statement: SQL statement
+    :rtype: str
+    """
+    statement = PARAMETERS.sub('?', statement)
+    statement = LIST_OF_PARAMETERS.sub('(?)', statement)
+    return ' '.join(statement.split())
+
+
+def get_call_site():
+    """ Return the model and the method of the nearest frame of the stack
+    which is a method of a model
+
+    :rtype: (registry name of the model, name of the method) or (None, None)
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_code.co_name.startswith('<'):
+            # comprehension or lambda in the method
+            frame = frame.f_back
+            continue
+
+        for name in ('self', 'cls'):
+            obj = frame.f_locals.get(name)
+            # read on the class, the __getattr__ of the instances (as
+            # InstrumentedList) must not be called
+            cls = obj if isinstance(obj, type) else type(obj)
+            registry_name = getattr(cls, '__registry_name__', None)
+            if isinstance(registry_name, str) and registry_name.startswith(
+                'Model.'
+            ):
+                return registry_name, frame.f_code.co_name
+
+        frame = frame.f_back
+
+    return None, None
+
+
+def set_start_time(conn, context, key):
+    """ Save the start time of the statement on its execution context, or on
+    the connection when the statement has no context. The start time of a
+    statement in error is dropped with its context, it is never read as the
+    start time of another statement
+
+    :param conn: connection which executes the statement
+    :param context: execution context of the statement, or None
+    :param key: name of the start time
+    """
+    if context is None:
+        conn.info[key] = perf_counter()
+    else:
+        setattr(context, key, perf_counter())
+
+
+def pop_start_time(conn, context, key):
+    """ Return and remove the start time saved by ``set_start_time``
+
+    :param conn: connection which executes the statement
+    :param context: execution context of the statement, or None
+    :param key: name of the start time
+    :rtype: float or None
+    """
+    if context is None:
+        return conn.info.pop(key, None)
+
+    return context.__dict__.pop(key, None)
+
+
+class SessionStatistics:
+    """ Statistics of the statements executed by one session """
+
+    def __init__(self):
+        self.statements = {}
+        self.transaction_counts = {}
+
+    def add(self, statement, duration):
+        """ Save one execution of the statement
+
+        :param statement: normalized statement
+        :param duration: duration of the execution in second
+        :rtype: int, number of executions in the current transaction
+        """
+        stats = self.statements.setdefault(
+            statement, {'count': 0, 'duration': 0.})
+        stats['count'] += 1
+        stats['duration'] += duration
+        count = self.transaction_counts.get(statement, 0) + 1
+        self.transaction_counts[statement] = count
+        return count
+
+    def end_transaction(self):
+        self.transaction_counts = {}
+
+    def to_dict(self):
+        """ Return the statistics
+
+        :rtype: dict {'count': number of statements,
+                      'duration': duration of the statements,
+                      'statements': {statement: {'count': ..,
+                                                 'duration': ..}}}
+        """
+        return {
+            'count': sum(x['count'] for x in self.statements.values()),
+            'duration': sum(x['duration'] for x in self.statements.values()),
+            'statements': {x: dict(y) for x, y in self.statements.items()},
+        }
+
+
+def get_session_statistics(session):
+    """ Return the statistics of the session, they are saved in the ``info``
+    of the session, so they are dropped with the session
+
+    :param session: the SQLAlchemy session
+    :rtype: SessionStatistics
+    """
+    stats = session.info.get('anyblok_session_stats')
+    if stats is None:
+        stats = session.info['anyblok_session_stats'] = SessionStatistics()
+
+    return stats
+
+
+def reset_session_statistics(session):
+    """ Drop the statistics of the session
+
+    :param session: the SQLAlchemy session
+    """
+    session.info.pop('anyblok_session_stats', None)
+
+
+class SessionStatisticsListener:
+    """ Events which fill the statistics of the sessions
+
+    The statements executed by the bind are counted in the statistics of
+    the current session of the ``scoped_session``, if it exists
+
+    :param threshold: number of executions of the same statement in one
+        transaction before the warning, 0 to disable the warning
+    """
+
+    def __init__(self, threshold=0):
+        self.threshold = threshold
+        self.scoped_session = None
+
+    def listen(self, bind, scoped_session):
+        """ Add the events on the bind and on the class of the sessions, the
+        events already added are not added twice
+
+        :param bind: engine or connection which executes the statements
+        :param scoped_session: ``scoped_session`` of the registry
+        """
+        self.scoped_session = scoped_session
+        for target, name, fn in self.get_events(bind, scoped_session):
+            if not event.contains(target, name, fn):
+                event.listen(target, name, fn)
+
+    def remove(self, bind, scoped_session):
+        for target, name, fn in self.get_events(bind, scoped_session):
+            if event.contains(target, name, fn):
+                event.remove(target, name, fn)
+
+    def get_events(self, bind, scoped_session):
+        return [
+            (bind, 'before_cursor_execute', self.before_cursor_execute),
+            (bind, 'after_cursor_execute', self.after_cursor_execute),
+            (scoped_session.session_factory.class_, 'after_transaction_end',
+             self.after_transaction_end),
+        ]
+
+    def get_current_session(self):
+        """ Return the current session, without creating it
+
+        :rtype: session or None
+        """
+        if self.scoped_session is None or not (
+            self.scoped_session.registry.has()
+        ):
+            return None
+
+        return self.scoped_session()
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters,
+                              context, executemany):
+        set_start_time(conn, context, 'anyblok_stats_start')
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters,
+                             context, executemany):
+        start = pop_start_time(conn, context, 'anyblok_stats_start')
+        if start is None:
+            return
+
+        duration = perf_counter() - start
+        session = self.get_current_session()
+        if session is None:
+            return
+
+        statement = normalize_statement(statement)
+        count = get_session_statistics(session).add(statement, duration)
+        if self.threshold and count == self.threshold + 1:
+            model, method = get_call_site()
+            logger.warning(
+                "N+1 queries: the statement %r is executed more than %d "
+                "times in the transaction, called by %s.%s\n%s",
+                statement, self.threshold, model, method,
+                ''.join(format_stack()))
+
+    def after_transaction_end(self, session, transaction):
+        if transaction.parent is None:
+            stats = session.info.get('anyblok_session_stats')
+            if stats is not None:
+                stats.end_transaction()
+
+
+def redact_parameters(parameters):
+    """ Return the parameters of a statement without their values
+
+    :param parameters: dict, list or tuple of the parameters
+    :rtype: the same structure, the values are replaced by ``'***'``
+    """
+    if isinstance(parameters, dict):
+        return {x: redact_parameters(y) if isinstance(y, (dict, list, tuple))
+                else '***'
+                for x, y in parameters.items()}
+
+    if isinstance(parameters, (list, tuple)):
+        return type(parameters)(
+            redact_parameters(x) if isinstance(x, (dict, list, tuple))
+            else '***'
+            for x in parameters)
+
+    return '***'
+
+
+class SlowQueryListener:
+    """ Events of the engine which log the slow statements
+
+    :param threshold: the statements which take more than this duration,
+        in second, are logged
+    :param explain_threshold: the plan (``EXPLAIN``) of the ``SELECT``
+        statements which take more than this duration, in second, is logged
+        too, only on postgresql
+    :param explain_analyze: if True, the plan is read with
+        ``EXPLAIN (ANALYZE, BUFFERS)``, the statement is executed again to
+        get the real costs. The statements with side effects, which lock
+        rows (``FOR UPDATE``) or call ``nextval``, are never executed again
+    :param redact_parameters: if True, the values of the parameters are not
+        logged
+    """
+
+    def __init__(self, threshold, explain_threshold=None,
+                 explain_analyze=False, redact_parameters=False):
+        self.threshold = threshold
+        self.explain_threshold = explain_threshold
+        self.explain_analyze = explain_analyze
+        self.redact_parameters = redact_parameters
+
+    def listen(self, engine):
+        event.listen(engine, 'before_cursor_execute',
+                     self.before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute',
+                     self.after_cursor_execute)
+
+    def remove(self, engine):
+        event.remove(engine, 'before_cursor_execute',
+                     self.before_cursor_execute)
+        event.remove(engine, 'after_cursor_execute',
+                     self.after_cursor_execute)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters,
+                              context, executemany):
+        set_start_time(conn, context, 'anyblok_slow_query_start')
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters,
+                             context, executemany):
+        start = pop_start_time(conn, context, 'anyblok_slow_query_start')
+        if start is None:
+            return
+
+        duration = perf_counter() - start
+        if duration < self.threshold:
+            return
+
+        model, method = get_call_site()
+        plan = ''
+        if (
+            self.explain_threshold and duration >= self.explain_threshold and
+            not executemany
+        ):
+            plan = self.explain(conn, statement, parameters)
+
+        logger.warning(
+            "Slow query (%.3fs) called by %s.%s: %s\nparameters: %r%s",
+            duration, model, method, ' '.join(statement.split()),
+            (redact_parameters(parameters) if self.redact_parameters
+             else parameters),
+            '\nplan:\n' + plan if plan else '')
+
+    def explain(self, conn, statement, parameters):
+        """ Return the plan of the statement, the plan is read in a savepoint
+        to not break the transaction if it fails
+
+        :rtype: str, empty if the plan can not be read
+        """
+        if conn.dialect.name != 'postgresql' or not (
+            statement.lstrip().upper().startswith('SELECT')
+        ):
+            return ''
+
+        explain = 'EXPLAIN '
+        if self.explain_analyze and not SIDE_EFFECTS.search(statement):
+            explain = 'EXPLAIN (ANALYZE, BUFFERS) '
+
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute('SAVEPOINT anyblok_explain')
+            try:
+                cursor.execute(explain + statement, parameters)
+                plan = '\n'.join(x[0] for x in cursor.fetchall())
+            finally:
+                cursor.execute('ROLLBACK TO SAVEPOINT anyblok_explain')
+        except Exception as e:
+            logger.debug('The plan of the slow query can not be read: %r', e)
+            plan = ''
+        finally:
+            cursor.close()
+
+        return plan
+
+
+class Explain(Executable, ClauseElement):
+    """ ``EXPLAIN`` statement of a select, see ``Query.explain``
+
+    :param statement: the select statement
+    :param analyze: if True, the statement is executed to get the real
+        costs
+    """
+
+    def __init__(self, statement, analyze=False):
+        self.statement = statement
+        self.analyze = analyze
+
+
+@compiles(Explain)
+def compile_explain(element, compiler, **kw):
+    explain = 'EXPLAIN ANALYZE ' if element.analyze else 'EXPLAIN '
+    return explain + compiler.process(element.statement, **kw)
+
+
+@compiles(Explain, 'postgresql')
+def compile_explain_postgresql(element, compiler, **kw):
+    explain = 'EXPLAIN (ANALYZE, BUFFERS) ' if element.analyze else 'EXPLAIN '
+    return explain + compiler.process(element.statement, **kw)
+
+
+@compiles(Explain, 'sqlite')
+def compile_explain_sqlite(element, compiler, **kw):
+    return 'EXPLAIN QUERY PLAN ' + compiler.process(element.statement, **kw)
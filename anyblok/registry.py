@@ -7,13 +7,15 @@
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
 from os.path import join
+from contextlib import contextmanager
 from os import walk
 from logging import getLogger
 import nose
 
-from sqlalchemy import create_engine, event, MetaData
+from sqlalchemy import create_engine, event, MetaData, text, bindparam
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.ext import baked
 from sqlalchemy.exc import (ProgrammingError, OperationalError,
                             InvalidRequestError)
 from sqlalchemy_utils.functions import database_exists
@@ -26,6 +28,9 @@ from anyblok.common import anyblok_column_prefix, naming_convention
 from pkg_resources import iter_entry_points
 from .version import parse_version
 from .logging import log
+from .shared_cache import listen_uncommitted_changes
+from .profiling import (SessionStatisticsListener, SlowQueryListener,
+                        get_session_statistics, reset_session_statistics)
 logger = getLogger(__name__)
 
 
@@ -41,6 +46,14 @@ class RegistryConflictingException(Exception):
     """ Simple Exception for Registry """
 
 
+BLOKS_BY_STATES = text("""
+    SELECT system_blok.name
+    FROM system_blok
+    WHERE system_blok.state IN :states
+    ORDER BY system_blok.order""").bindparams(
+    bindparam('states', expanding=True))
+
+
 def return_list(entry):
     if entry is not None and not isinstance(entry, (list, tuple)):
         entry = [entry]
@@ -429,6 +442,7 @@ class Registry:
         self.ini_var()
         self.Session = None
         self.nb_query_bases = self.nb_session_bases = 0
+        self.session_stats_listener = None
         self.blok_list_is_loaded = False
         self.pre_assemble_entries()
         self.load()
@@ -463,6 +477,26 @@ class Registry:
         kwargs = self.init_engine_options()
         url = Configuration.get('get_url', get_url)(db_name=db_name)
         self.rw_engine = create_engine(url, **kwargs)
+        self.init_slow_query_log(self.rw_engine)
+
+    def init_slow_query_log(self, engine):
+        """ Log the statements slower than the ``slow_query_threshold``
+        option, with their parameters and their call site, see
+        ``SlowQueryListener``
+
+        :param engine: the engine to listen
+        """
+        threshold = Configuration.get('slow_query_threshold')
+        if threshold:
+            SlowQueryListener(
+                threshold,
+                explain_threshold=Configuration.get(
+                    'slow_query_explain_threshold'),
+                explain_analyze=Configuration.get(
+                    'slow_query_explain_analyze'),
+                redact_parameters=Configuration.get(
+                    'slow_query_redact_parameters'),
+            ).listen(engine)
 
     @property
     def engine(self):
@@ -480,13 +514,18 @@ class Registry:
                              for core in RegistryManager.declared_cores}
         self.ordered_loaded_bloks = []
         self.loaded_namespaces = {}
+        self.loaded_namespaces_metadata = {}
+        self.loaded_namespaces_relationships = {}
         self.children_namespaces = {}
         self.properties = {}
         self.removed = []
         EnvironmentManager.set('_precommit_hook', [])
         EnvironmentManager.set('_postcommit_hook', [])
+        EnvironmentManager.set('_cache_invalidation', [])
         self._sqlalchemy_known_events = []
         self.expire_attributes = {}
+        # cache of the queries built and compiled once, see ``baked_query``
+        self.bakery = baked.bakery()
 
     @classmethod
     def db_exists(cls, db_name=None):
@@ -541,13 +580,9 @@ class Registry:
             return []
 
         res = []
-        query = """
-            SELECT system_blok.name
-            FROM system_blok
-            WHERE system_blok.state in ('%s')
-            ORDER BY system_blok.order""" % "', '".join(states)
         try:
-            res = self.execute(query).fetchall()
+            res = self.execute(BLOKS_BY_STATES,
+                               {'states': list(states)}).fetchall()
         except (ProgrammingError, OperationalError):
             pass
 
@@ -982,6 +1017,53 @@ class Registry:
             logger.info('Update session event %r' % funct)
             funct(self.session)
 
+        listen_uncommitted_changes(self.Session.session_factory.class_)
+        if Configuration.get('session_stats'):
+            self.listen_session_stats()
+
+    def listen_session_stats(self, threshold=None):
+        """ Count the statements executed by the sessions, see
+        ``session_stats``
+
+        When the same statement is executed more than ``threshold`` times in
+        one transaction, a warning is logged with the model, the method and
+        the stack of the call, it is the sign of a N+1 queries pattern
+
+        :param threshold: by default the ``session_stats_threshold`` option,
+            0 to disable the warning
+        """
+        if threshold is None:
+            threshold = Configuration.get('session_stats_threshold', 0)
+
+        if self.session_stats_listener is None:
+            self.session_stats_listener = SessionStatisticsListener()
+
+        self.session_stats_listener.threshold = threshold
+        self.session_stats_listener.listen(self.bind, self.Session)
+
+    def session_stats(self, reset=False):
+        """ Return the statistics of the statements executed by the current
+        session, since the last reset or the creation of the session, see
+        ``listen_session_stats``. The statistics are dropped when the session
+        is closed::
+
+            {'count': 12, 'duration': 0.03, 'statements': {
+                'SELECT ... WHERE test.id = ?': {'count': 10,
+                                                 'duration': 0.02},
+                ...}}
+
+        The statements are grouped by shape, the parameters are replaced by
+        ``?``
+
+        :param reset: if True, the statistics are cleared after the read
+        :rtype: dict
+        """
+        res = get_session_statistics(self.session).to_dict()
+        if reset:
+            reset_session_statistics(self.session)
+
+        return res
+
     def run_test(registry, blok2install):
         startpath = BlokManager.getPath(blok2install)
 
@@ -1140,6 +1222,7 @@ class Registry:
         self.session.rollback(*args, **kwargs)
         EnvironmentManager.set('_precommit_hook', [])
         EnvironmentManager.set('_postcommit_hook', [])
+        EnvironmentManager.set('_cache_invalidation', [])
 
     def close_session(self):
         """ Close only the session, not the registry
@@ -1297,6 +1380,47 @@ class Registry:
         if not self.session._flushing:
             self.session.flush()
 
+    @contextmanager
+    def batch(self, size=None):
+        """ Defer the flushes of ``insert``, ``multi_insert`` and ``delete``,
+        the session is flushed once when leaving the context or when the
+        number of pending objects reaches ``size``::
+
+            with registry.batch():
+                for vals in values:
+                    registry.MyModel.insert(**vals)
+
+        The order of the inserts is given by the unit of work of the session
+        when the session is flushed, so the foreign keys stay valid
+
+        :param size: number of pending objects which forces the flush, by
+            default the ``batch_flush_size`` option
+        """
+        previous = EnvironmentManager.get('_batch_flush_size')
+        if size is None:
+            size = previous or Configuration.get('batch_flush_size') or 1000
+
+        EnvironmentManager.set('_batch_flush_size', size)
+        try:
+            yield
+        finally:
+            EnvironmentManager.set('_batch_flush_size', previous)
+
+        if previous is None:
+            self.flush()
+
+    def flush_or_defer(self):
+        """ Flush the session, except inside ``batch`` while the number of
+        pending objects is lower than the size of the batch
+        """
+        size = EnvironmentManager.get('_batch_flush_size')
+        if size is not None:
+            session = self.session
+            if len(session.new) + len(session.deleted) < size:
+                return
+
+        self.flush()
+
     def session_commit(self, *args, **kwargs):
         if self.Session:
             session = self.Session()
@@ -1337,7 +1461,7 @@ class Registry:
         query = Blok.query()
         query = query.filter(Blok.name.in_(bloks_name))
         query = query.filter(Blok.state.in_(filter_states))
-        return query.all().name
+        return query.pluck('name')
 
     def check_conflict_with(self, blok):
         Blok = self.System.Blok
@@ -76,6 +76,12 @@ Configuration.add_application_properties(
                   "the interpretor will be an ipyton interpretor")
 )
 
+Configuration.add_application_properties(
+    'compactcache', ['logging'],
+    prog='AnyBlok compact cache, version %r' % version,
+    description="Remove the old cache invalidations of the database"
+)
+
 Configuration.add_application_properties(
     'autodoc', ['logging', 'doc', 'schema'],
     prog='AnyBlok auto documentation, version %r' % version,
@@ -175,6 +181,15 @@ def anyblok_nose():
     sys.exit(main(defaultTest=defaultTest))
 
 
+def anyblok_compact_cache():
+    """Compact the invalidation table of the cache"""
+    registry = anyblok.start('compactcache')
+    if registry:
+        registry.System.Cache.compact()
+        registry.commit()
+        registry.close()
+
+
 def anyblok_interpreter():
     """Execute a script or open an interpreter
     """
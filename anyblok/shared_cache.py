@@ -0,0 +1,202 @@
+# This file is a part of the AnyBlok project
+#
+#    Copyright (C) 2018 Jean-Sebastien SUZANNE <jssuzanne@anybox.fr>
+#
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file,You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+"""Host local cache, shared by all the processes of the same host
+
+The results of the methods decorated by
+``classmethod_cache(backend='shared')`` are pickled and saved in a sqlite
+file, so they are computed only once per host and not once per process.
+
+The values are saved by generation, the ``id`` of the last invalidation of
+the method in ``System.Cache``: after an invalidation, the processes read
+and write only the values of the new generation, the values of the old
+generations are never read again.
+"""
+import os
+import sqlite3
+import threading
+from pickle import dumps, loads, PicklingError, HIGHEST_PROTOCOL
+from tempfile import gettempdir
+from logging import getLogger
+from sqlalchemy import event
+from .config import Configuration
+from .environment import EnvironmentManager
+
+logger = getLogger(__name__)
+
+
+class SharedCacheStore:
+    """ Sqlite storage of the shared cache
+
+    One connection is opened by thread, because sqlite connections can not
+    be shared between threads
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    @property
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS shared_cache (
+                    registry TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    method TEXT NOT NULL,
+                    generation INTEGER NOT NULL,
+                    key BLOB NOT NULL,
+                    value BLOB NOT NULL,
+                    PRIMARY KEY (registry, model, method, generation, key))
+                """)
+            self.local.connection = connection
+
+        return connection
+
+    def get(self, registry, model, method, generation, key):
+        """ Return the pickled value or None if it is not in the cache """
+        res = self.connection.execute(
+            "SELECT value FROM shared_cache WHERE registry = ? "
+            "AND model = ? AND method = ? AND generation = ? AND key = ?",
+            (registry, model, method, generation, key)).fetchone()
+        if res:
+            return res[0]
+
+        return None
+
+    def set(self, registry, model, method, generation, key, value):
+        """ Save the pickled value """
+        self.connection.execute(
+            "INSERT OR REPLACE INTO shared_cache "
+            "(registry, model, method, generation, key, value) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (registry, model, method, generation, key, value))
+
+    def purge(self, registry, model, method, generation):
+        """ Remove the values of the generations older than ``generation``,
+        the values of the current generation are kept """
+        self.connection.execute(
+            "DELETE FROM shared_cache WHERE registry = ? AND model = ? "
+            "AND method = ? AND generation < ?",
+            (registry, model, method, generation))
+
+
+stores = {}
+
+
+def get_shared_cache_store():
+    """ Return the store defined by the ``cache_shared_path`` option """
+    path = Configuration.get('cache_shared_path') or os.path.join(
+        gettempdir(), 'anyblok_shared_cache.sqlite')
+    if path not in stores:
+        stores[path] = SharedCacheStore(path)
+
+    return stores[path]
+
+
+def after_flush(session, flush_context):
+    session.info['anyblok_uncommitted_changes'] = True
+
+
+def after_transaction_end(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('anyblok_uncommitted_changes', None)
+
+
+def listen_uncommitted_changes(session_cls):
+    """ Mark the sessions which flushed changes not committed yet, see
+    ``SharedCache.has_uncommitted_changes``
+
+    :param session_cls: class of the sessions
+    """
+    for name, fn in (('after_flush', after_flush),
+                     ('after_transaction_end', after_transaction_end)):
+        if not event.contains(session_cls, name, fn):
+            event.listen(session_cls, name, fn)
+
+
+class SharedCache:
+    """ Replace the ``lru_cache`` for the ``shared`` backend
+
+    The key of one value is the registry, the model, the method, the
+    generation and the arguments. As ``lru_cache``, the ``cache_clear``
+    method is called by ``System.Cache`` to invalidate the method, the
+    generation is read again at the next call.
+
+    The method is not cached while its invalidation is waiting for the
+    commit of the current transaction, and the results computed in a
+    transaction with uncommitted changes are not saved, because they could
+    depend on data not seen by the other processes.
+    """
+
+    def __init__(self, method, registry, namespace, attr):
+        self.method = method
+        self.registry = registry
+        self.indentify = (namespace, attr)
+        self.generation = None
+
+    def is_waiting_invalidation(self):
+        return self.indentify in EnvironmentManager.get(
+            '_cache_invalidation', [])
+
+    def has_uncommitted_changes(self):
+        """ Return True if the session has changes not committed yet """
+        session = self.registry.session
+        return bool(session.new or session.dirty or session.deleted or
+                    session.info.get('anyblok_uncommitted_changes'))
+
+    def get_generation(self, store):
+        """ Return the generation of the values, the ``id`` of the last
+        invalidation of the method, the values of the older generations are
+        removed from the store when a new generation is read """
+        if self.generation is None:
+            namespace, attr = self.indentify
+            generation = self.registry.System.Cache.get_last_invalidation_id(
+                namespace, attr)
+            store.purge(self.registry.db_name, namespace, attr, generation)
+            self.generation = generation
+
+        return self.generation
+
+    def __call__(self, cls, *args, **kwargs):
+        if self.is_waiting_invalidation():
+            return self.method(cls, *args, **kwargs)
+
+        try:
+            key = dumps((args, sorted(kwargs.items())), HIGHEST_PROTOCOL)
+        except (PicklingError, TypeError, AttributeError):
+            return self.method(cls, *args, **kwargs)
+
+        store = get_shared_cache_store()
+        namespace, attr = self.indentify
+        generation = self.get_generation(store)
+        value = store.get(self.registry.db_name, namespace, attr, generation,
+                          key)
+        if value is not None:
+            return loads(value)
+
+        res = self.method(cls, *args, **kwargs)
+        if self.has_uncommitted_changes():
+            return res
+
+        try:
+            store.set(self.registry.db_name, namespace, attr, generation,
+                      key, dumps(res, HIGHEST_PROTOCOL))
+        except (PicklingError, TypeError, AttributeError):
+            logger.warning('The result of %r can not be saved in the '
+                           'shared cache', self.indentify)
+
+        return res
+
+    def cache_clear(self):
+        """ Forget the generation, the values saved in the store are kept
+        for the other processes """
+        self.generation = None
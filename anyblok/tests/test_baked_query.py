@@ -0,0 +1,88 @@
+# This file is a part of the AnyBlok project
+#
+#    Copyright (C) 2018 Jean-Sebastien SUZANNE <jssuzanne@anybox.fr>
+#
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file,You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+from anyblok.tests.testcase import DBTestCase
+from anyblok.declarations import Declarations, baked_query
+from anyblok.column import Integer, String
+from sqlalchemy import bindparam
+
+
+register = Declarations.register
+Model = Declarations.Model
+Mixin = Declarations.Mixin
+
+
+def add_baked_query():
+
+    @register(Mixin)
+    class MixinName:
+        name = String()
+
+        @baked_query
+        def query_by_name(cls, query):
+            return query.filter(cls.name == bindparam('name'))
+
+    @register(Model)
+    class Test(Mixin.MixinName):
+        id = Integer(primary_key=True)
+
+    @register(Model)
+    class Test2(Mixin.MixinName):
+        id = Integer(primary_key=True)
+
+
+class TestBakedQuery(DBTestCase):
+
+    def test_baked_query(self):
+        registry = self.init_registry(add_baked_query)
+        t1 = registry.Test.insert(name='t1')
+        registry.Test.insert(name='t2')
+        self.assertEqual(registry.Test.query_by_name(name='t1').all(), [t1])
+        self.assertEqual(registry.Test.query_by_name(name='t3').all(), [])
+        self.assertEqual(registry.Test.query_by_name(name='t2').count(), 1)
+
+    def test_baked_query_all_instrumented_list(self):
+        registry = self.init_registry(add_baked_query)
+        registry.Test.insert(name='t1')
+        registry.Test.insert(name='t1')
+        res = registry.Test.query_by_name(name='t1').all()
+        self.assertIsInstance(res, registry.InstrumentedList)
+        self.assertEqual(res.name, ['t1', 't1'])
+
+    def test_baked_query_built_once(self):
+        registry = self.init_registry(add_baked_query)
+        registry.Test.insert(name='t1')
+        registry.Test.query_by_name(name='t1').all()
+        nb_baked_queries = len(registry.bakery.cache)
+        registry.Test.query_by_name(name='t2').all()
+        self.assertEqual(len(registry.bakery.cache), nb_baked_queries)
+
+    def test_baked_query_by_model(self):
+        registry = self.init_registry(add_baked_query)
+        t1 = registry.Test.insert(name='t')
+        t2 = registry.Test2.insert(name='t')
+        self.assertEqual(registry.Test.query_by_name(name='t').all(), [t1])
+        self.assertEqual(registry.Test2.query_by_name(name='t').all(), [t2])
+
+    def test_from_primary_keys(self):
+        registry = self.init_registry(add_baked_query)
+        t1 = registry.Test.insert(name='t1')
+        registry.session.expunge_all()
+        t1 = registry.Test.from_primary_keys(id=t1.id)
+        self.assertEqual(t1.name, 't1')
+        with self.count_queries(registry) as statements:
+            self.assertIs(registry.Test.from_primary_keys(id=t1.id), t1)
+
+        self.assertEqual(len(statements), 0)
+        self.assertIsNone(registry.Test.from_primary_keys(id=t1.id + 1))
+
+    def test_get_bloks_by_states(self):
+        registry = self.init_registry(None)
+        self.assertIn('anyblok-core',
+                      registry.get_bloks_by_states('installed', 'toupdate'))
+        self.assertEqual(registry.get_bloks_by_states(), [])
+        self.assertEqual(registry.get_bloks_by_states('unknown'), [])
@@ -7,8 +7,14 @@
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
 from random import random
+from os.path import join
+from pickle import dumps, HIGHEST_PROTOCOL
+from shutil import rmtree
+from tempfile import mkdtemp
 from anyblok.tests.testcase import DBTestCase
-from anyblok.declarations import Declarations, cache, classmethod_cache
+from anyblok.declarations import (Declarations, DeclarationsException, cache,
+                                  classmethod_cache)
+from anyblok.shared_cache import get_shared_cache_store
 from anyblok.bloks.anyblok_core.exceptions import CacheException
 from anyblok.column import Integer
 register = Declarations.register
@@ -49,11 +55,160 @@ class TestCache(DBTestCase):
                 self.x += 1
                 return self.x
 
+    def add_model_with_two_methods_cached(self):
+
+        @register(Model)
+        class Test:
+
+            x = 0
+
+            @cache()
+            def method_cached(self):
+                self.x += 1
+                return self.x
+
+            @cache()
+            def other_method_cached(self):
+                self.x += 1
+                return self.x
+
     def test_cache_invalidation(self):
         registry = self.init_registry(self.add_model_with_method_cached)
         Cache = registry.System.Cache
+        registry.commit()
+        nb_invalidation = Cache.query().count()
+        Cache.invalidate('Model.Test', 'method_cached')
+        self.assertEqual(Cache.query().count(), nb_invalidation)
+        registry.commit()
+        self.assertEqual(Cache.query().count(), nb_invalidation + 1)
+
+    def test_cache_invalidation_coalesced(self):
+        registry = self.init_registry(self.add_model_with_method_cached)
+        Cache = registry.System.Cache
+        registry.commit()
         nb_invalidation = Cache.query().count()
         Cache.invalidate('Model.Test', 'method_cached')
+        Cache.invalidate('Model.Test', 'method_cached')
+        self.assertEqual(Cache.get_pending_invalidations(),
+                         [('Model.Test', 'method_cached')])
+        registry.commit()
+        self.assertEqual(Cache.query().count(), nb_invalidation + 1)
+        self.assertEqual(Cache.get_pending_invalidations(), [])
+
+    def test_cache_invalidation_rollback(self):
+        registry = self.init_registry(self.add_model_with_method_cached)
+        Cache = registry.System.Cache
+        Cache.invalidate('Model.Test', 'method_cached')
+        self.assertIn(('Model.Test', 'method_cached'),
+                      Cache.get_pending_invalidations())
+        registry.rollback()
+        self.assertEqual(Cache.get_pending_invalidations(), [])
+
+    def test_cache_invalidation_apply_the_other_invalidations(self):
+        registry = self.init_registry(self.add_model_with_two_methods_cached)
+        Cache = registry.System.Cache
+        t = registry.Test()
+        self.assertEqual(t.method_cached(), 1)
+        # invalidation published by another process
+        Cache.insert(registry_name='Model.Test', method='method_cached')
+        Cache.invalidate('Model.Test', 'other_method_cached')
+        self.assertEqual(t.method_cached(), 2)
+
+    def test_cache_invalidation_published_not_applied_again(self):
+        registry = self.init_registry(self.add_model_with_method_cached)
+        Cache = registry.System.Cache
+        registry.commit()
+        t = registry.Test()
+        self.assertEqual(t.method_cached(), 1)
+        Cache.invalidate('Model.Test', 'method_cached')
+        self.assertEqual(t.method_cached(), 2)
+        registry.commit()
+        self.assertEqual(Cache.last_cache_id, Cache.get_last_id())
+        Cache.clear_invalidate_cache()
+        self.assertEqual(t.method_cached(), 2)
+
+    def test_compact(self):
+        registry = self.init_registry(self.add_model_with_method_cached)
+        Cache = registry.System.Cache
+        Cache.query().delete()
+        Cache.multi_insert(
+            *([dict(registry_name="Model.Test", method="method_cached")] * 3 +
+              [dict(registry_name="Model.System.Blok", method="is_installed")]
+              * 2))
+        last_id = Cache.get_last_id()
+        self.assertEqual(Cache.compact(), 3)
+        self.assertEqual(Cache.query().count(), 2)
+        self.assertEqual(Cache.get_last_id(), last_id)
+
+    def test_compact_keep_invalidation_for_older_last_cache_id(self):
+        registry = self.init_registry(self.add_model_with_method_cached)
+        Cache = registry.System.Cache
+        Cache.insert(registry_name="Model.Test", method="method_cached")
+        Cache.insert(registry_name="Model.Test", method="method_cached")
+        Cache.compact()
+        caches = Cache.get_invalidation()
+        self.assertEqual(len(caches), 1)
+        self.assertEqual(caches[0].indentify, ('Model.Test', 'method_cached'))
+
+    def test_compact_after_commit(self):
+        registry = self.init_registry(self.add_model_with_method_cached)
+        Cache = registry.System.Cache
+        Cache.multi_insert(
+            *[dict(registry_name="Model.Test", method="method_cached")] * 5)
+        Cache.invalidate('Model.Test', 'method_cached')
+        with DBTestCase.Configuration(cache_compaction_threshold=1):
+            registry.commit()
+
+        self.assertEqual(
+            Cache.query().filter_by(registry_name="Model.Test").count(), 1)
+
+    def test_compact_after_commit_only_above_threshold(self):
+        registry = self.init_registry(self.add_model_with_method_cached)
+        Cache = registry.System.Cache
+        query = Cache.query().filter_by(registry_name="Model.Test")
+        Cache.multi_insert(
+            *[dict(registry_name="Model.Test", method="method_cached")] * 3)
+        Cache.invalidate('Model.Test', 'method_cached')
+        with DBTestCase.Configuration(cache_compaction_threshold=1):
+            registry.commit()
+
+        self.assertEqual(query.count(), 1)
+        threshold = Cache.query().count() + 3
+        Cache.multi_insert(
+            *[dict(registry_name="Model.Test", method="method_cached")] * 2)
+        Cache.invalidate('Model.Test', 'method_cached')
+        with DBTestCase.Configuration(cache_compaction_threshold=threshold):
+            registry.commit()
+
+        # the table has less rows than the threshold
+        self.assertEqual(query.count(), 4)
+
+    def test_no_compaction_on_first_publication_under_threshold(self):
+        registry = self.init_registry(self.add_model_with_method_cached)
+        Cache = registry.System.Cache
+        query = Cache.query().filter_by(registry_name="Model.Test")
+        Cache.multi_insert(
+            *[dict(registry_name="Model.Test", method="method_cached")] * 3)
+        Cache.invalidate('Model.Test', 'method_cached')
+        threshold = (Cache.query().count() +
+                     len(Cache.get_pending_invalidations()))
+        with DBTestCase.Configuration(cache_compaction_threshold=threshold):
+            registry.commit()
+
+        self.assertEqual(query.count(), 4)
+
+    def test_publish_invalidations_in_batch(self):
+        registry = self.init_registry(self.add_model_with_method_cached)
+        Cache = registry.System.Cache
+        registry.commit()
+        nb_invalidation = Cache.query().count()
+        with registry.batch():
+            Cache.invalidate('Model.Test', 'method_cached')
+            with DBTestCase.Configuration(cache_compaction_threshold=100000):
+                registry.commit()
+
+        # the invalidation is committed, not only flushed
+        registry.rollback()
         self.assertEqual(Cache.query().count(), nb_invalidation + 1)
 
     def test_invalid_cache_invalidation(self):
@@ -963,3 +1118,97 @@ class TestSQLModelCache(DBTestCase):
         Cache = registry.System.Cache
         Cache.invalidate('Model.Test', 'get_id2')
         self.assertEqual(t.get_id2(), 2)
+
+
+class TestSharedCache(DBTestCase):
+
+    def setUp(self):
+        super(TestSharedCache, self).setUp()
+        self.shared_cache_dir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.shared_cache_dir)
+        super(TestSharedCache, self).tearDown()
+
+    def shared_cache_configuration(self):
+        return DBTestCase.Configuration(cache_shared_path=join(
+            self.shared_cache_dir, 'shared_cache.sqlite'))
+
+    def add_in_registry(self):
+
+        @register(Model)
+        class Test:
+
+            x = 0
+
+            @classmethod_cache(backend='shared')
+            def method_cached(cls, value=1):
+                cls.x += value
+                return cls.x
+
+    def init_shared_cache_registry(self):
+        registry = self.init_registry(self.add_in_registry)
+        # the values are not saved while the installation is not committed
+        registry.commit()
+        return registry
+
+    def test_unknown_backend(self):
+        with self.assertRaises(DeclarationsException):
+            classmethod_cache(backend='unknown')
+
+    def test_shared_cache(self):
+        registry = self.init_shared_cache_registry()
+        with self.shared_cache_configuration():
+            self.assertEqual(registry.Test.method_cached(), 1)
+            self.assertEqual(registry.Test.method_cached(), 1)
+            self.assertEqual(registry.Test.method_cached(value=2), 3)
+            self.assertEqual(registry.Test.method_cached(value=2), 3)
+
+    def test_shared_cache_used_by_another_process(self):
+        registry = self.init_shared_cache_registry()
+        with self.shared_cache_configuration():
+            self.assertEqual(registry.Test.method_cached(), 1)
+            store = get_shared_cache_store()
+            key = dumps(((), []), HIGHEST_PROTOCOL)
+            generation = registry.System.Cache.get_last_invalidation_id(
+                'Model.Test', 'method_cached')
+            store.set(registry.db_name, 'Model.Test', 'method_cached',
+                      generation, key, dumps(10, HIGHEST_PROTOCOL))
+            self.assertEqual(registry.Test.method_cached(), 10)
+
+    def test_shared_cache_invalidation(self):
+        registry = self.init_shared_cache_registry()
+        with self.shared_cache_configuration():
+            self.assertEqual(registry.Test.method_cached(), 1)
+            registry.System.Cache.invalidate('Model.Test', 'method_cached')
+            # not cached while the invalidation is not commited
+            self.assertEqual(registry.Test.method_cached(), 2)
+            self.assertEqual(registry.Test.method_cached(), 3)
+            registry.commit()
+            self.assertEqual(registry.Test.method_cached(), 4)
+            self.assertEqual(registry.Test.method_cached(), 4)
+
+    def test_shared_cache_clear_keeps_the_new_generation(self):
+        registry = self.init_shared_cache_registry()
+        with self.shared_cache_configuration():
+            self.assertEqual(registry.Test.method_cached(), 1)
+            registry.System.Cache.invalidate('Model.Test', 'method_cached')
+            registry.commit()
+            self.assertEqual(registry.Test.method_cached(), 2)
+            # another process clears its cache when it sees the
+            # invalidation, the value of the new generation is kept
+            for shared in registry.caches['Model.Test']['method_cached']:
+                shared.cache_clear()
+
+            self.assertEqual(registry.Test.method_cached(), 2)
+
+    def test_shared_cache_not_saved_with_uncommitted_changes(self):
+        registry = self.init_shared_cache_registry()
+        with self.shared_cache_configuration():
+            registry.System.Blok.query().first().update(
+                version='0.0.0-test')
+            self.assertEqual(registry.Test.method_cached(), 1)
+            self.assertEqual(registry.Test.method_cached(), 2)
+            registry.commit()
+            self.assertEqual(registry.Test.method_cached(), 3)
+            self.assertEqual(registry.Test.method_cached(), 3)
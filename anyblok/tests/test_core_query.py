@@ -25,3 +25,376 @@ class TestCoreQuery(DBTestCase):
 
         registry = self.init_registry(inherit)
         self.assertEqual(registry.System.Blok.query().foo(), True)
+
+    def test_explain(self):
+        registry = self.init_registry(None)
+        Blok = registry.System.Blok
+        plan = Blok.query().filter(Blok.name == 'anyblok-core').explain()
+        self.assertIsInstance(plan, str)
+        self.assertTrue(plan)
+
+    def test_explain_analyze(self):
+        registry = self.init_registry(None)
+        if registry.engine.dialect.name != 'postgresql':
+            self.skipTest('ANALYZE is tested only on postgresql')
+
+        plan = registry.System.Blok.query().explain(analyze=True)
+        self.assertIn('actual time', plan)
+
+
+class TestDictallWithoutHydration(DBTestCase):
+
+    def add_in_registry(self):
+        from anyblok import Declarations
+        from anyblok.column import Integer, String, Selection
+        from anyblok.field import Function
+        from anyblok.relationship import Many2One
+        Model = Declarations.Model
+
+        @Declarations.register(Model)
+        class Test:
+            id = Integer(primary_key=True)
+            name = String()
+            state = Selection(selections=[('draft', 'Draft'),
+                                          ('done', 'Done')])
+            label = Function(fget='get_label')
+
+            def get_label(self):
+                return self.name
+
+        @Declarations.register(Model)
+        class Test2:
+            id = Integer(primary_key=True)
+            name = String()
+            test = Many2One(model=Model.Test, one2many='tests2')
+
+    def init_data(self, registry):
+        t1 = registry.Test.insert(name='t1', state='draft')
+        t2 = registry.Test.insert(name='t2', state='done')
+        registry.Test2.insert(name='t21', test=t1)
+        registry.Test2.insert(name='t22', test=t1)
+        registry.Test2.insert(name='t23')
+        return t1, t2
+
+    def test_same_as_dictall(self):
+        registry = self.init_registry(self.add_in_registry)
+        self.init_data(registry)
+        fields = ('name', ('test', ('name', 'state')))
+        query = registry.Test2.query().order_by(registry.Test2.id)
+        self.assertEqual(query.dictall(*fields, hydrate=False),
+                         query.dictall(*fields))
+        self.assertEqual(query.dictall('id', 'test', hydrate=False),
+                         query.dictall('id', 'test'))
+
+    def test_without_instance(self):
+        registry = self.init_registry(self.add_in_registry)
+        self.init_data(registry)
+        registry.session.expunge_all()
+        query = registry.Test2.query().order_by(registry.Test2.id)
+        with self.count_queries(registry) as statements:
+            vals = query.dictall('name', ('test', ('name',)), hydrate=False)
+
+        self.assertEqual(vals, [{'name': 't21', 'test': {'name': 't1'}},
+                                {'name': 't22', 'test': {'name': 't1'}},
+                                {'name': 't23', 'test': None}])
+        self.assertEqual(len(statements), 2)
+        self.assertEqual(len(registry.session.identity_map), 0)
+
+    def test_one2many(self):
+        registry = self.init_registry(self.add_in_registry)
+        t1, t2 = self.init_data(registry)
+        query = registry.Test.query().order_by(registry.Test.id)
+        vals = query.dictall('name', ('tests2', ('name',)), hydrate=False)
+        self.assertEqual(vals[0]['name'], 't1')
+        self.assertEqual(
+            sorted(x['name'] for x in vals[0]['tests2']), ['t21', 't22'])
+        self.assertEqual(vals[1], {'name': 't2', 'tests2': []})
+
+    def test_getter_format_value(self):
+        registry = self.init_registry(self.add_in_registry)
+        t1, t2 = self.init_data(registry)
+        query = registry.Test.query().filter(registry.Test.id == t1.id)
+        val = query.dictall('state', hydrate=False)[0]['state']
+        self.assertEqual(val, 'draft')
+        self.assertIs(type(val), type(t1.state))
+
+    def test_function_field(self):
+        from anyblok.bloks.anyblok_core.exceptions import SqlBaseException
+        registry = self.init_registry(self.add_in_registry)
+        with self.assertRaises(SqlBaseException):
+            registry.Test.query().dictall('label', hydrate=False)
+
+    def test_query_on_columns(self):
+        registry = self.init_registry(self.add_in_registry)
+        self.init_data(registry)
+        query = registry.Test.query('name').order_by(registry.Test.id)
+        self.assertEqual(query.dictall(hydrate=False),
+                         [{'name': 't1'}, {'name': 't2'}])
+
+
+class TestDictallEagerLoad(DBTestCase):
+
+    def add_in_registry(self):
+        from anyblok import Declarations
+        from anyblok.column import Integer, String
+        from anyblok.relationship import Many2One
+        Model = Declarations.Model
+
+        @Declarations.register(Model)
+        class Product:
+            id = Integer(primary_key=True)
+            name = String()
+
+        @Declarations.register(Model)
+        class Order:
+            id = Integer(primary_key=True)
+            name = String()
+
+        @Declarations.register(Model)
+        class Line:
+            id = Integer(primary_key=True)
+            order = Many2One(model=Model.Order, one2many='lines')
+            product = Many2One(model=Model.Product)
+
+    def init_data(self, registry):
+        p1 = registry.Product.insert(name='p1')
+        p2 = registry.Product.insert(name='p2')
+        for i in range(3):
+            order = registry.Order.insert(name='o%d' % i)
+            registry.Line.insert(order=order, product=p1)
+            registry.Line.insert(order=order, product=p2)
+
+        registry.session.expunge_all()
+
+    def test_eager_load_options(self):
+        registry = self.init_registry(self.add_in_registry)
+        Order = registry.Order
+        self.assertEqual(Order.get_eager_load_options('name'), ())
+        self.assertEqual(
+            len(Order.get_eager_load_options(
+                'name', ('lines', (('product', ('name',)),)))), 1)
+
+    def test_dictall_nested(self):
+        registry = self.init_registry(self.add_in_registry)
+        self.init_data(registry)
+        query = registry.Order.query().order_by(registry.Order.id)
+        fields = ('name', ('lines', (('product', ('name',)),)))
+        with self.count_queries(registry) as statements:
+            vals = query.dictall(*fields)
+
+        # the orders, then the lines with their products
+        self.assertEqual(len(statements), 2)
+        self.assertEqual(len(vals), 3)
+        self.assertEqual(vals[0]['name'], 'o0')
+        self.assertEqual(
+            sorted(x['product']['name'] for x in vals[0]['lines']),
+            ['p1', 'p2'])
+
+    def test_dictall_many2one(self):
+        registry = self.init_registry(self.add_in_registry)
+        self.init_data(registry)
+        query = registry.Line.query().order_by(registry.Line.id)
+        with self.count_queries(registry) as statements:
+            vals = query.dictall('id', ('product', ('name',)))
+
+        self.assertEqual(len(statements), 1)
+        self.assertEqual([x['product']['name'] for x in vals],
+                         ['p1', 'p2'] * 3)
+
+    def test_dictall_same_as_to_dict(self):
+        registry = self.init_registry(self.add_in_registry)
+        self.init_data(registry)
+        query = registry.Order.query().order_by(registry.Order.id)
+        self.assertEqual(query.dictall(), [x.to_dict() for x in query.all()])
+        fields = ('name', ('lines',))
+        self.assertEqual(query.dictall(*fields),
+                         [x.to_dict(*fields) for x in query.all()])
+
+
+class TestPluck(DBTestCase):
+
+    add_in_registry = TestDictallWithoutHydration.add_in_registry
+    init_data = TestDictallWithoutHydration.init_data
+
+    def test_pluck_one_field(self):
+        registry = self.init_registry(self.add_in_registry)
+        self.init_data(registry)
+        registry.session.expunge_all()
+        query = registry.Test.query().order_by(registry.Test.id)
+        with self.count_queries(registry) as statements:
+            self.assertEqual(query.pluck('name'), ['t1', 't2'])
+
+        self.assertEqual(len(statements), 1)
+        self.assertNotIn('state', statements[0])
+        self.assertEqual(len(registry.session.identity_map), 0)
+
+    def test_pluck_many_fields(self):
+        registry = self.init_registry(self.add_in_registry)
+        self.init_data(registry)
+        query = registry.Test.query().order_by(registry.Test.id)
+        self.assertEqual(query.pluck('name', 'state'),
+                         [('t1', 'draft'), ('t2', 'done')])
+
+    def test_pluck_getter_format_value(self):
+        registry = self.init_registry(self.add_in_registry)
+        t1, t2 = self.init_data(registry)
+        val = registry.Test.query().filter(
+            registry.Test.id == t1.id).pluck('state')[0]
+        self.assertIs(type(val), type(t1.state))
+
+    def test_pluck_relationship(self):
+        from anyblok.bloks.anyblok_core.exceptions import QueryException
+        registry = self.init_registry(self.add_in_registry)
+        with self.assertRaises(QueryException):
+            registry.Test2.query().pluck('test')
+
+    def test_pluck_without_field(self):
+        from anyblok.bloks.anyblok_core.exceptions import QueryException
+        registry = self.init_registry(self.add_in_registry)
+        with self.assertRaises(QueryException):
+            registry.Test.query().pluck()
+
+    def test_lazy_all_column(self):
+        registry = self.init_registry(self.add_in_registry)
+        self.init_data(registry)
+        registry.session.expunge_all()
+        tests = registry.Test.query().order_by(registry.Test.id).lazy_all()
+        with self.count_queries(registry) as statements:
+            self.assertEqual(tests.name, ['t1', 't2'])
+            self.assertEqual(tests.name, ['t1', 't2'])
+
+        self.assertEqual(len(statements), 1)
+        self.assertNotIn('state', statements[0])
+        self.assertEqual(len(registry.session.identity_map), 0)
+
+    def test_lazy_all_is_an_instrumented_list(self):
+        registry = self.init_registry(self.add_in_registry)
+        t1, t2 = self.init_data(registry)
+        tests = registry.Test.query().order_by(registry.Test.id).lazy_all()
+        self.assertIsInstance(tests, list)
+        self.assertIsInstance(tests, registry.InstrumentedList)
+        with self.count_queries(registry) as statements:
+            self.assertEqual(tests.index(t2), 1)
+            self.assertEqual(list(reversed(tests)), [t2, t1])
+            self.assertEqual(tests + [t1], [t1, t2, t1])
+            tests.append(t1)
+            self.assertEqual(tests.count(t1), 2)
+
+        self.assertEqual(len(statements), 1)
+
+    def test_lazy_all_instances(self):
+        registry = self.init_registry(self.add_in_registry)
+        t1, t2 = self.init_data(registry)
+        tests = registry.Test.query().order_by(registry.Test.id).lazy_all()
+        self.assertEqual(len(tests), 2)
+        self.assertEqual(tests, [t1, t2])
+        self.assertIs(tests[0], t1)
+        self.assertIn(t2, tests)
+        self.assertEqual(tests.label, ['t1', 't2'])
+        self.assertEqual(tests.get_label(), ['t1', 't2'])
+        with self.count_queries(registry) as statements:
+            self.assertEqual(tests.name, ['t1', 't2'])
+
+        self.assertEqual(len(statements), 0)
+
+    def test_lazy_all_relationship(self):
+        registry = self.init_registry(self.add_in_registry)
+        t1, t2 = self.init_data(registry)
+        tests2 = registry.Test2.query().order_by(registry.Test2.id).lazy_all()
+        self.assertEqual(tests2.test, [t1, t1, None])
+
+
+class TestIterChunks(DBTestCase):
+
+    def add_in_registry(self):
+        from anyblok import Declarations
+        from anyblok.column import Integer, String
+        Model = Declarations.Model
+
+        @Declarations.register(Model)
+        class Test:
+            id = Integer(primary_key=True)
+            name = String()
+
+        @Declarations.register(Model)
+        class Test2:
+            id = Integer(primary_key=True)
+            code = String(primary_key=True)
+
+    def init_registry_with_data(self, nb=10):
+        registry = self.init_registry(self.add_in_registry)
+        registry.Test.multi_insert(*[{'name': str(x)} for x in range(nb)])
+        registry.session.expunge_all()
+        return registry
+
+    def test_iter_chunks(self):
+        registry = self.init_registry_with_data()
+        query = registry.Test.query().order_by(registry.Test.id)
+        chunks = list(query.iter_chunks(4))
+        self.assertEqual([len(x) for x in chunks], [4, 4, 2])
+        self.assertIsInstance(chunks[0], registry.InstrumentedList)
+        self.assertEqual(sum((x.name for x in chunks), []),
+                         [str(x) for x in range(10)])
+
+    def test_iter_chunks_expunge(self):
+        registry = self.init_registry_with_data()
+        chunks = []
+        for chunk in registry.Test.query().iter_chunks(4):
+            chunks.append(chunk)
+            for test in chunk:
+                self.assertIn(test, registry.session)
+
+        for chunk in chunks:
+            for test in chunk:
+                self.assertNotIn(test, registry.session)
+
+    def test_iter_chunks_without_expunge(self):
+        registry = self.init_registry_with_data()
+        chunks = list(registry.Test.query().iter_chunks(4, expunge=False))
+        for chunk in chunks:
+            for test in chunk:
+                self.assertIn(test, registry.session)
+
+    def test_iter_chunks_flush_before_expunge(self):
+        registry = self.init_registry_with_data()
+        for chunk in registry.Test.query().iter_chunks(4):
+            for test in chunk:
+                test.name = 'updated'
+
+        query = registry.Test.query().filter(registry.Test.name == 'updated')
+        self.assertEqual(query.count(), 10)
+
+    def test_iter_chunks_by_keyset(self):
+        registry = self.init_registry_with_data()
+        query = registry.Test.query()
+        with self.count_queries(registry) as statements:
+            chunks = list(query.iter_chunks(4, keyset=True))
+
+        self.assertEqual(len(statements), 3)
+        self.assertEqual([len(x) for x in chunks], [4, 4, 2])
+        self.assertEqual(sum((x.name for x in chunks), []),
+                         [str(x) for x in range(10)])
+
+    def test_iter_chunks_by_keyset_with_order_by_limit_or_offset(self):
+        from anyblok.bloks.anyblok_core.exceptions import QueryException
+        registry = self.init_registry_with_data()
+        query = registry.Test.query()
+        for wrong_query in (query.order_by(registry.Test.name.desc()),
+                            query.limit(5), query.offset(5)):
+            with self.assertRaises(QueryException):
+                wrong_query.iter_chunks(4, keyset=True)
+
+    def test_iter_chunks_by_keyset_multi_primary_keys(self):
+        registry = self.init_registry(self.add_in_registry)
+        registry.Test2.multi_insert(*[{'id': x // 3, 'code': str(x % 3)}
+                                      for x in range(8)])
+        chunks = list(registry.Test2.query().iter_chunks(3, keyset=True))
+        self.assertEqual([len(x) for x in chunks], [3, 3, 2])
+        self.assertEqual(
+            [(x.id, x.code) for chunk in chunks for x in chunk],
+            [(x // 3, str(x % 3)) for x in range(8)])
+
+    def test_iter_chunks_by_keyset_without_result(self):
+        registry = self.init_registry_with_data(0)
+        self.assertEqual(
+            list(registry.Test.query().iter_chunks(4, keyset=True)), [])
@@ -6,6 +6,7 @@
 # This Source Code Form is subject to the terms of the Mozilla Public License,
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
+from unittest.mock import patch
 from anyblok.tests.testcase import DBTestCase
 from anyblok.column import Integer, String, Selection
 from anyblok.relationship import Many2One, One2One, Many2Many, One2Many
@@ -68,6 +69,27 @@ class TestCoreSQLBase(DBTestCase):
         t.delete()
         self.assertIsNone(registry.Test.query().get(t.id))
 
+    def test_get_modified_fields(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        t1 = registry.Test.insert(name='t1')
+        t2 = registry.Test.insert(name='t2')
+        test2 = registry.Test2.insert(name='test2', test=t1)
+        self.assertEqual(test2.get_modified_fields(), {})
+        test2.name = 'other'
+        self.assertEqual(test2.get_modified_fields(), {'name': 'test2'})
+        test2.test = t2
+        modified_fields = test2.get_modified_fields()
+        self.assertEqual(modified_fields['name'], 'test2')
+        self.assertIs(modified_fields['test'], t1)
+        registry.flush()
+        self.assertEqual(test2.get_modified_fields(), {})
+
+    def test_get_modified_fields_same_value(self):
+        registry = self.init_registry(self.declare_model)
+        t = registry.Test.insert(id2=1)
+        t.id2 = 1
+        self.assertEqual(t.get_modified_fields(), {})
+
     def test_expire(self):
         registry = self.init_registry(self.declare_model)
         t = registry.Test.insert(id2=2)
@@ -107,6 +129,7 @@ class TestCoreSQLBase(DBTestCase):
 
     def test_get_primary_keys(self):
         registry = self.init_registry(self.declare_model)
+        self.assertTrue(registry.Test.has_default_query())
         self.assertEqual(registry.Test.get_primary_keys(), ['id'])
 
     def test_to_and_from_primary_keys(self):
@@ -117,6 +140,153 @@ class TestCoreSQLBase(DBTestCase):
         self.assertEqual(t.to_primary_keys(), {'id': t.id})
         self.assertEqual(registry.Test.from_primary_keys(id=t.id), t)
 
+    def test_from_primary_keys_use_identity_map(self):
+        registry = self.init_registry(self.declare_model)
+        t = registry.Test.insert(id2=1)
+        with self.count_queries(registry) as queries:
+            self.assertIs(registry.Test.from_primary_keys(id=t.id), t)
+
+        self.assertEqual(queries, [])
+
+    def test_from_primary_keys_with_one_query(self):
+        registry = self.init_registry(self.declare_model)
+        t = registry.Test.insert(id2=1)
+        registry.expunge(t)
+        with self.count_queries(registry) as queries:
+            t2 = registry.Test.from_primary_keys(id=t.id)
+
+        self.assertEqual(t2.id2, 1)
+        self.assertEqual(len(queries), 1)
+        self.assertIsNone(registry.Test.from_primary_keys(id=t.id + 1))
+
+    def test_from_primary_keys_without_pk(self):
+        registry = self.init_registry(self.declare_model)
+        with self.assertRaises(SqlBaseException):
+            registry.Test.from_primary_keys(id2=1)
+
+    def declare_model_with_query(self):
+        from anyblok import Declarations
+        Model = Declarations.Model
+
+        @Declarations.register(Model)
+        class Test:
+            id = Integer(primary_key=True)
+            id2 = Integer()
+
+            @classmethod
+            def query(cls, *args, **kwargs):
+                query = super(Test, cls).query(*args, **kwargs)
+                return query.filter(cls.id2 > 0)
+
+    def test_from_primary_keys_with_overwritten_query(self):
+        registry = self.init_registry(self.declare_model_with_query)
+        self.assertFalse(registry.Test.has_default_query())
+        t1 = registry.Test.insert(id2=1)
+        t2 = registry.Test.insert(id2=0)
+        self.assertIs(registry.Test.from_primary_keys(id=t1.id), t1)
+        self.assertIsNone(registry.Test.from_primary_keys(id=t2.id))
+        self.assertEqual(registry.Test.get_many(t2.id, t1.id), [None, t1])
+        self.assertEqual(registry.Test.from_multi_primary_keys(
+            {'id': t1.id}, {'id': t2.id}), [t1])
+
+    def test_get_many(self):
+        registry = self.init_registry(self.declare_model)
+        t1 = registry.Test.insert(id2=1)
+        t2 = registry.Test.insert(id2=2)
+        t3 = registry.Test.insert(id2=3)
+        registry.expunge(t2)
+        with self.count_queries(registry) as queries:
+            res = registry.Test.get_many(
+                {'id': t3.id}, {'id': t2.id}, {'id': 0}, {'id': t1.id})
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(res[0], t3)
+        self.assertEqual(res[1].id2, 2)
+        self.assertIsNone(res[2])
+        self.assertEqual(res[3], t1)
+
+    def test_get_many_with_values(self):
+        registry = self.init_registry(self.declare_model)
+        t1 = registry.Test.insert(id2=1)
+        t2 = registry.Test.insert(id2=2)
+        with self.count_queries(registry) as queries:
+            self.assertEqual(registry.Test.get_many(t2.id, t1.id), [t2, t1])
+
+        self.assertEqual(queries, [])
+
+    def declare_model_with_multi_primary_keys(self):
+        from anyblok import Declarations
+        Model = Declarations.Model
+
+        @Declarations.register(Model)
+        class Test:
+            id = Integer(primary_key=True)
+            code = String(primary_key=True)
+            id2 = Integer()
+
+    def test_from_multi_primary_keys(self):
+        registry = self.init_registry(self.declare_model)
+        t1 = registry.Test.insert(id2=1)
+        t2 = registry.Test.insert(id2=2)
+        t3 = registry.Test.insert(id2=3)
+        registry.expunge(t1)
+        registry.expunge(t3)
+        with self.count_queries(registry) as queries:
+            res = registry.Test.from_multi_primary_keys(
+                {'id': t3.id}, {'id': t2.id}, {'id': 0}, {'id': t1.id})
+
+        self.assertEqual(len(queries), 1)
+        if registry.engine.dialect.name == 'postgresql':
+            self.assertIn('ANY', queries[0])
+
+        self.assertEqual(res.id2, [3, 2, 1])
+
+    def test_from_multi_primary_keys_with_str_values(self):
+        registry = self.init_registry(self.declare_model)
+        t1 = registry.Test.insert(id2=1)
+        t2 = registry.Test.insert(id2=2)
+        registry.expunge(t2)
+        with self.count_queries(registry) as queries:
+            res = registry.Test.from_multi_primary_keys(
+                {'id': str(t2.id)}, {'id': str(t1.id)})
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(res.id2, [2, 1])
+        self.assertIs(res[1], t1)
+        self.assertEqual(registry.Test.get_many(str(t1.id)), [t1])
+
+    def test_from_multi_primary_keys_by_chunk(self):
+        registry = self.init_registry(self.declare_model)
+        registry.Test.multi_insert(*[{'id2': x} for x in range(5)])
+        ids = registry.Test.query('id').all()
+        registry.expunge_all()
+        with self.count_queries(registry) as queries:
+            res = registry.Test.from_multi_primary_keys(
+                *[{'id': x.id} for x in ids], chunk_size=2)
+
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(res.id2, list(range(5)))
+
+    def test_from_multi_primary_keys_without_value(self):
+        registry = self.init_registry(self.declare_model)
+        self.assertEqual(registry.Test.from_multi_primary_keys(), [])
+
+    def test_from_multi_primary_keys_with_multi_primary_keys(self):
+        registry = self.init_registry(
+            self.declare_model_with_multi_primary_keys)
+        t1 = registry.Test.insert(id=1, code='a', id2=1)
+        t2 = registry.Test.insert(id=1, code='b', id2=2)
+        registry.Test.insert(id=2, code='a', id2=3)
+        registry.expunge(t2)
+        with self.count_queries(registry) as queries:
+            res = registry.Test.from_multi_primary_keys(
+                {'id': 1, 'code': 'b'}, {'id': 1, 'code': 'a'},
+                {'id': 2, 'code': 'b'})
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(res.id2, [2, 1])
+        self.assertIs(res[1], t1)
+
     def add_in_registry_m2o(self):
 
         @register(Model)
@@ -262,6 +432,78 @@ class TestCoreSQLBase(DBTestCase):
                                                  'id': t1.id,
                                                  'test2': [{'id': t2.id}]}})
 
+    def test_to_dict_with_list_of_related_fields(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        t1 = registry.Test.insert(name='t1')
+        t2 = registry.Test2.insert(name='t2', test=t1)
+        self.assertEqual(t2.to_dict('name', ['test', ['name', ['test2']]]),
+                         {'name': 't2', 'test': {'name': 't1',
+                                                 'test2': [{'id': t2.id,
+                                                            'name': 't2',
+                                                            'test_id': t1.id,
+                                                            'test': {
+                                                                'id': t1.id}}]
+                                                 }})
+
+    def test_to_dict_serializer_compiled_once(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        Test2 = registry.Test2
+        serializer = Test2.get_to_dict_serializer('name', ('test', ('name',)))
+        self.assertIs(
+            Test2.get_to_dict_serializer('name', ('test', ('name',))),
+            serializer)
+        self.assertIsNot(Test2.get_to_dict_serializer('name'), serializer)
+
+    def test_to_dict_serializer_nested_without_to_dict(self):
+        from anyblok.bloks.anyblok_core.core.sqlbase import SqlMixin
+        registry = self.init_registry(self.add_in_registry_m2o)
+        t1 = registry.Test.insert(name='t1')
+        t2 = registry.Test2.insert(name='t2', test=t1)
+        serializer = registry.Test.get_to_dict_serializer(
+            'name', ('test2', ('name', ('test', ('name',)))))
+        with patch.object(SqlMixin, 'to_dict') as to_dict:
+            self.assertEqual(
+                serializer(t1),
+                {'name': 't1', 'test2': [{'name': 't2',
+                                          'test': {'name': 't1'}}]})
+
+        to_dict.assert_not_called()
+        self.assertEqual(t2.to_dict('name', ('test', ('name',))),
+                         {'name': 't2', 'test': {'name': 't1'}})
+
+    def test_to_dict_serializer_nested_with_overwritten_to_dict(self):
+
+        def add_in_registry():
+            self.add_in_registry_m2o()
+
+            @register(Model)
+            class Test:
+
+                def to_dict(self, *fields):
+                    return {'overwritten': True}
+
+        registry = self.init_registry(add_in_registry)
+        t1 = registry.Test.insert(name='t1')
+        t2 = registry.Test2.insert(name='t2', test=t1)
+        self.assertEqual(t2.to_dict('name', ('test', ('name',))),
+                         {'name': 't2', 'test': {'overwritten': True}})
+
+    def test_dictall_with_serializer(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        t1 = registry.Test.insert(name='t1')
+        t2 = registry.Test2.insert(name='t2', test=t1)
+        t3 = registry.Test2.insert(name='t3')
+        self.assertEqual(registry.Test2.query().order_by('id').dictall(),
+                         [t2.to_dict(), t3.to_dict()])
+        self.assertEqual(t3.to_dict(), {'id': t3.id, 'name': 't3',
+                                        'test_id': None, 'test': None})
+
+    def test_to_dict_unknown_field(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        t1 = registry.Test.insert(name='t1')
+        with self.assertRaises(AttributeError):
+            t1.to_dict('unknown')
+
     def test_to_dict_o2o_with_all_columns(self):
         registry = self.init_registry(self.add_in_registry_o2o)
         t1 = registry.Test.insert(name='t1')
@@ -385,6 +627,71 @@ class TestCoreSQLBase(DBTestCase):
         self.assertEqual(t2.test_id, t3.id)
         self.assertEqual(t3.test2, [t2])
 
+    def test_refresh_update_m2o_without_query(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        t1 = registry.Test.insert(name='t1')
+        t3_id = registry.Test.insert(name='t3').id
+        registry.Test2.multi_insert({'name': 't21', 'test': t1},
+                                    {'name': 't22', 'test': t1})
+        registry.session.expunge_all()
+        tests2 = registry.Test2.query().all()
+        with self.count_queries(registry) as statements:
+            for test2 in tests2:
+                test2.test_id = t3_id
+
+        self.assertEqual(len(statements), 0)
+        self.assertEqual([x.test.id for x in tests2], [t3_id, t3_id])
+        self.assertEqual(tests2[0].test.test2, tests2)
+
+    def test_refresh_update_m2o_with_expired_foreign_key(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        t1 = registry.Test.insert(name='t1')
+        t3 = registry.Test.insert(name='t3')
+        t2 = registry.Test2.insert(name='t2', test=t1)
+        self.assertEqual(t1.test2, [t2])
+        registry.expire(t2)
+        t2.test_id = t3.id
+        self.assertEqual(t1.test2, [])
+        self.assertEqual(t3.test2, [t2])
+
+    def test_refresh_update_m2o_many_times_without_scan(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        t1 = registry.Test.insert(name='t1')
+        t3 = registry.Test.insert(name='t3')
+        registry.Test2.multi_insert(
+            *[{'name': 't2%d' % x, 'test': t1} for x in range(100)])
+        tests2 = registry.Test2.query().all()
+        self.assertEqual(t1.test2, tests2)
+        for test2 in tests2[:50]:
+            registry.expire(test2)
+
+        identity_map = registry.session.identity_map
+        with patch.object(identity_map, 'values',
+                          wraps=identity_map.values) as values, \
+                patch.object(identity_map, 'all_states',
+                             wraps=identity_map.all_states) as all_states:
+            for test2 in tests2:
+                test2.test_id = t3.id
+
+        self.assertLessEqual(values.call_count + all_states.call_count, 1)
+        self.assertEqual(t1.test2, [])
+        self.assertEqual(t3.test2, tests2)
+
+    def test_refresh_update_m2o_with_expired_foreign_key_2(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        t1 = registry.Test.insert(name='t1')
+        t3 = registry.Test.insert(name='t3')
+        t21 = registry.Test2.insert(name='t21', test=t1)
+        t22 = registry.Test2.insert(name='t22', test=t1)
+        registry.expire(t21)
+        t21.test_id = t3.id
+        self.assertEqual(t1.test2, [t22])
+        self.assertEqual(t3.test2, [t21])
+        registry.expire(t22)
+        t22.test_id = t3.id
+        self.assertEqual(t1.test2, [])
+        self.assertEqual(t3.test2, [t21, t22])
+
     def test_refresh_update_m2o_3(self):
         registry = self.init_registry(self.add_in_registry_m2o)
         t1 = registry.Test.insert(name='t1')
@@ -552,6 +859,35 @@ class TestCoreSQLBase(DBTestCase):
         self.assertIn('test', fields)
         self.assertIn('test_id', fields)
 
+    def test_find_relationship_unknown_field(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        self.assertEqual(registry.Test2.find_relationship('unknown'), [])
+
+    def test_find_remote_attribute_to_expire_by_column(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        self.assertEqual(
+            registry.Test2.find_remote_attribute_to_expire('test_id'),
+            {'test': ['test2']})
+        self.assertEqual(
+            registry.Test2.find_remote_attribute_to_expire('name'), {})
+
+    def test_find_remote_attribute_to_expire_by_relationship(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        self.assertEqual(
+            registry.Test2.find_remote_attribute_to_expire('test'),
+            {'test': ['test2']})
+        self.assertEqual(
+            registry.Test.find_remote_attribute_to_expire('test2'),
+            {'test2': ['test']})
+
+    def test_relationship_index_does_not_modify_first_step(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        first_step = registry.loaded_namespaces_first_step['Model.Test2']
+        keys = set(first_step.keys())
+        registry.Test2.find_remote_attribute_to_expire(*keys)
+        registry.Test2.find_relationship('test')
+        self.assertEqual(set(first_step.keys()), keys)
+
     def declare_model_with_column_selection(self):
         from anyblok import Declarations
         Model = Declarations.Model
@@ -563,6 +899,367 @@ class TestCoreSQLBase(DBTestCase):
                 selections=[('key', 'value'), ('key2', 'value2')],
                 default='key')
 
+    def test_delete_many_by_query(self):
+        registry = self.init_registry(self.declare_model)
+        tests = registry.Test.multi_insert(
+            *[{'id2': x} for x in range(10)])
+        query = registry.Test.query().filter(registry.Test.id2 < 7)
+        with self.count_queries(registry) as statements:
+            self.assertEqual(registry.Test.delete_many(query, chunk_size=3),
+                             7)
+
+        self.assertEqual(
+            len([x for x in statements if x.startswith('DELETE')]), 3)
+        self.assertEqual(registry.Test.query().pluck('id2'), [7, 8, 9])
+        self.assertNotIn(tests[0], registry.session)
+        self.assertIn(tests[8], registry.session)
+
+    def test_delete_many_by_instances(self):
+        registry = self.init_registry(self.declare_model)
+        tests = registry.Test.multi_insert(
+            *[{'id2': x} for x in range(3)])
+        self.assertEqual(registry.Test.delete_many(tests[:2]), 2)
+        self.assertEqual(registry.Test.query().all(), tests[2:])
+
+    def test_delete_many_bad_instance(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        t2 = registry.Test2.insert(name='t2')
+        with self.assertRaises(SqlBaseException):
+            registry.Test.delete_many([t2])
+
+    def test_delete_many_expire_o2m(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        t1 = registry.Test.insert(name='t1')
+        t21 = registry.Test2.insert(name='t21', test=t1)
+        t22 = registry.Test2.insert(name='t22', test=t1)
+        self.assertEqual(t1.test2, [t21, t22])
+        registry.Test2.delete_many(registry.Test2.query().filter_by(
+            name='t21'))
+        self.assertEqual(t1.test2, [t22])
+
+    def test_update_many_by_query(self):
+        registry = self.init_registry(self.declare_model)
+        tests = registry.Test.multi_insert(
+            *[{'id2': x} for x in range(10)])
+        query = registry.Test.query().filter(registry.Test.id2 < 7)
+        with self.count_queries(registry) as statements:
+            self.assertEqual(
+                registry.Test.update_many(query, {'id2': 100},
+                                          chunk_size=3),
+                7)
+
+        self.assertEqual(
+            len([x for x in statements if x.startswith('UPDATE')]), 3)
+        self.assertEqual(tests[0].id2, 100)
+        self.assertEqual(tests[8].id2, 8)
+
+    def test_update_many_by_instances(self):
+        registry = self.init_registry(self.declare_model)
+        tests = registry.Test.multi_insert(
+            *[{'id2': x} for x in range(3)])
+        self.assertEqual(registry.Test.update_many(tests[1:], {'id2': 5}),
+                         2)
+        self.assertEqual(tests.id2, [0, 5, 5])
+
+    def test_update_many_setter_format_value(self):
+        from anyblok.field import FieldException
+
+        def add_in_registry():
+
+            @register(Model)
+            class Test:
+                id = Integer(primary_key=True)
+                state = Selection(selections=[('draft', 'Draft'),
+                                              ('done', 'Done')])
+
+        registry = self.init_registry(add_in_registry)
+        test = registry.Test.insert(state='draft')
+        with self.assertRaises(FieldException):
+            registry.Test.update_many([test], {'state': 'unknown'})
+
+        registry.Test.update_many([test], {'state': 'done'})
+        self.assertEqual(test.state, 'done')
+
+    def test_update_many_not_a_column(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        registry.Test.insert(name='t1')
+        with self.assertRaises(SqlBaseException):
+            registry.Test.update_many(registry.Test.query(),
+                                      {'unknown': 't'})
+
+        with self.assertRaises(SqlBaseException):
+            registry.Test2.update_many(registry.Test2.query(),
+                                       {'test': None})
+
+    def test_update_many_expire_m2o_and_o2m(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        t1 = registry.Test.insert(name='t1')
+        t2 = registry.Test.insert(name='t2')
+        t21 = registry.Test2.insert(name='t21', test=t1)
+        self.assertEqual(t1.test2, [t21])
+        self.assertEqual(t2.test2, [])
+        registry.Test2.update_many([t21], {'test_id': t2.id})
+        self.assertIs(t21.test, t2)
+        self.assertEqual(t1.test2, [])
+        self.assertEqual(t2.test2, [t21])
+
+    def add_in_registry_bulk_insert(self):
+        from anyblok.column import Sequence, Email, DateTime, LargeBinary
+
+        @register(Model)
+        class Test:
+            id = Integer(primary_key=True)
+            name = String(default='default')
+            code = Sequence(formater='T{seq}')
+            state = Selection(selections=[('draft', 'Draft'),
+                                          ('done', 'Done')])
+            email = Email()
+            date = DateTime(default_timezone='UTC')
+            data = LargeBinary()
+
+    def check_bulk_insert(self, registry, method):
+        rows = [{'name': 'tab\tnew\nline\\', 'state': 'draft'},
+                {'state': 'done', 'email': 'Foo@Bar.com',
+                 'date': '2018-01-01 10:00:00', 'data': b'\x00\\\t'},
+                {'name': None}]
+        self.assertEqual(registry.Test.bulk_insert(rows, method=method), 3)
+        tests = registry.Test.query().order_by(registry.Test.id).all()
+        self.assertEqual(
+            sorted(tests.name, key=str),
+            [None, 'default', 'tab\tnew\nline\\'])
+        self.assertEqual(sorted(tests.state, key=str), [None, 'done', 'draft'])
+        self.assertEqual(len(set(tests.code)), 3)
+        test = registry.Test.query().filter_by(state='done').one()
+        self.assertEqual(test.email, 'foo@bar.com')
+        self.assertEqual(test.date.isoformat(), '2018-01-01T10:00:00+00:00')
+        self.assertEqual(test.data, b'\x00\\\t')
+
+    def test_bulk_insert_auto(self):
+        registry = self.init_registry(self.add_in_registry_bulk_insert)
+        self.check_bulk_insert(registry, 'auto')
+
+    def test_bulk_insert_executemany(self):
+        registry = self.init_registry(self.add_in_registry_bulk_insert)
+        self.check_bulk_insert(registry, 'executemany')
+
+    def test_bulk_insert_values(self):
+        registry = self.init_registry(self.add_in_registry_bulk_insert)
+        self.check_bulk_insert(registry, 'values')
+
+    def test_bulk_insert_copy(self):
+        registry = self.init_registry(self.add_in_registry_bulk_insert)
+        if registry.engine.dialect.name != 'postgresql':
+            with self.assertRaises(SqlBaseException):
+                registry.Test.bulk_insert([{'name': 't'}], method='copy')
+        else:
+            self.check_bulk_insert(registry, 'copy')
+
+    def test_bulk_insert_return_pks(self):
+        registry = self.init_registry(self.add_in_registry_bulk_insert)
+        rows = [{'name': 'a'}, {'state': 'done'}, {'name': 'b'}]
+        for method in ('executemany', 'values'):
+            pks = registry.Test.bulk_insert(rows, return_pks=True,
+                                            method=method, chunk_size=1)
+            self.assertEqual(
+                [x.name for x in registry.Test.get_many(*pks)],
+                ['a', 'default', 'b'])
+
+    def test_bulk_insert_setter_format_value(self):
+        from anyblok.field import FieldException
+        registry = self.init_registry(self.add_in_registry_bulk_insert)
+        with self.assertRaises(FieldException):
+            registry.Test.bulk_insert([{'state': 'unknown'}])
+
+    def test_bulk_insert_bad_rows(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        with self.assertRaises(SqlBaseException):
+            registry.Test.bulk_insert(['test'])
+
+        with self.assertRaises(SqlBaseException):
+            registry.Test2.bulk_insert([{'test': None}])
+
+        with self.assertRaises(SqlBaseException):
+            registry.Test.bulk_insert([{'name': 't'}], method='unknown')
+
+        with self.assertRaises(SqlBaseException):
+            registry.Test.bulk_insert([{'name': 't'}], method='copy',
+                                      return_pks=True)
+
+    def add_in_registry_upsert(self):
+
+        @register(Model)
+        class Test:
+            id = Integer(primary_key=True)
+            code = String(unique=True, nullable=False)
+            name = String()
+
+    def test_upsert_many_by_primary_keys(self):
+        registry = self.init_registry(self.add_in_registry_upsert)
+        t1 = registry.Test.insert(id=1, code='a', name='t1')
+        self.assertEqual(registry.Test.upsert_many([
+            {'id': 1, 'code': 'a', 'name': 'new'},
+            {'id': 2, 'code': 'b', 'name': 't2'}]), 2)
+        self.assertEqual(t1.name, 'new')
+        self.assertEqual(
+            registry.Test.query().order_by(registry.Test.id).pluck('name'),
+            ['new', 't2'])
+
+    def test_upsert_many_by_conflict_fields(self):
+        registry = self.init_registry(self.add_in_registry_upsert)
+        t1 = registry.Test.insert(code='a', name='t1')
+        pks = registry.Test.upsert_many(
+            [{'code': 'a', 'name': 'new'}, {'code': 'b', 'name': 't2'},
+             {'code': 'b', 'name': 'last'}],
+            conflict_fields=['code'], return_pks=True, chunk_size=1)
+        self.assertEqual(len(pks), 2)
+        self.assertEqual(pks[0], {'id': t1.id})
+        self.assertEqual([x.name for x in registry.Test.get_many(*pks)],
+                         ['new', 'last'])
+
+    def test_upsert_many_without_update(self):
+        registry = self.init_registry(self.add_in_registry_upsert)
+        t1 = registry.Test.insert(code='a', name='t1')
+        self.assertEqual(registry.Test.upsert_many(
+            [{'code': 'a', 'name': 'new'}, {'code': 'b', 'name': 't2'}],
+            conflict_fields=['code'], update_fields=[]), 1)
+        self.assertEqual(t1.name, 't1')
+        self.assertEqual(registry.Test.query().count(), 2)
+
+    def test_upsert_many_bad_fields(self):
+        registry = self.init_registry(self.add_in_registry_upsert)
+        with self.assertRaises(SqlBaseException):
+            registry.Test.upsert_many([{'name': 't1'}],
+                                      conflict_fields=['code'])
+
+        with self.assertRaises(SqlBaseException):
+            registry.Test.upsert_many([{'code': 't1'}],
+                                      conflict_fields=['unknown'])
+
+        with self.assertRaises(SqlBaseException):
+            registry.Test.upsert_many([{'code': 't1'}],
+                                      conflict_fields=['code'],
+                                      update_fields=['name'])
+
+    def test_upsert_many_by_queries(self):
+        registry = self.init_registry(self.add_in_registry_upsert)
+        t1 = registry.Test.insert(code='a', name='t1')
+        columns = registry.Test.get_bulk_columns()
+        code, name = columns['code'][0], columns['name'][0]
+        identities = registry.Test.upsert_many_by_queries(
+            [{code: 'a', name: 'new'}, {code: 'b', name: 't2'}],
+            [code], [name])
+        self.assertEqual(len(identities), 2)
+        t1.expire()
+        self.assertEqual(
+            registry.Test.query().order_by(registry.Test.id).pluck('name'),
+            ['new', 't2'])
+
+    def check_upsert_many_method(self, registry, method_name):
+        t1 = registry.Test.insert(code='a', name='t1')
+        t2 = registry.Test.insert(code='b', name='t2')
+        columns = registry.Test.get_bulk_columns()
+        id_, code, name = [columns[x][0] for x in ('id', 'code', 'name')]
+        method = getattr(registry.Test, method_name)
+        identities = method(
+            [{code: 'a', name: 'new'}, {code: 'c', name: 't3'}], [code], [])
+        t3 = registry.Test.query().filter_by(code='c').one()
+        # only the inserted entry is returned without column to update
+        self.assertEqual(identities, [{id_: t3.id}])
+        identities = method(
+            [{code: 'a', name: 'new'}, {code: 'b', name: 'new'},
+             {code: 'd', name: 't4'}], [code], [name])
+        t4 = registry.Test.query().filter_by(code='d').one()
+        self.assertEqual(
+            sorted(x[id_] for x in identities), [t1.id, t2.id, t4.id])
+        registry.expire_all()
+        self.assertEqual(
+            registry.Test.query().order_by(registry.Test.id).pluck('name'),
+            ['new', 'new', 't3', 't4'])
+
+    def test_upsert_many_by_on_conflict_returns_the_affected_entries(self):
+        registry = self.init_registry(self.add_in_registry_upsert)
+        if registry.engine.dialect.name != 'postgresql':
+            self.skipTest('ON CONFLICT is used only on postgresql')
+
+        self.check_upsert_many_method(registry, 'upsert_many_by_on_conflict')
+
+    def test_upsert_many_by_duplicate_key_returns_the_affected_entries(self):
+        registry = self.init_registry(self.add_in_registry_upsert)
+        if registry.engine.dialect.name != 'mysql':
+            self.skipTest('ON DUPLICATE KEY is used only on mysql')
+
+        self.check_upsert_many_method(registry,
+                                      'upsert_many_by_on_duplicate_key')
+
+    def test_upsert_many_by_queries_returns_the_affected_entries(self):
+        registry = self.init_registry(self.add_in_registry_upsert)
+        self.check_upsert_many_method(registry, 'upsert_many_by_queries')
+
+    def test_upsert_many_by_queries_one_update_by_values(self):
+        registry = self.init_registry(self.add_in_registry_upsert)
+        registry.Test.multi_insert(
+            *[{'code': str(x), 'name': 'old'} for x in range(4)])
+        columns = registry.Test.get_bulk_columns()
+        code, name = columns['code'][0], columns['name'][0]
+        with self.count_queries(registry) as statements:
+            registry.Test.upsert_many_by_queries(
+                [{code: '0', name: 'a'}, {code: '1', name: 'b'},
+                 {code: '2', name: 'a'}, {code: '3', name: 'b'}],
+                [code], [name])
+
+        self.assertEqual(
+            len([x for x in statements if x.startswith('UPDATE')]), 2)
+        registry.expire_all()
+        self.assertEqual(
+            registry.Test.query().order_by(registry.Test.id).pluck('name'),
+            ['a', 'b', 'a', 'b'])
+
+    def test_batch_defers_the_flush(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        with self.count_queries(registry) as statements:
+            with registry.batch():
+                t1 = registry.Test.insert(name='t1')
+                registry.Test2.multi_insert({'name': 't21', 'test': t1},
+                                            {'name': 't22', 'test': t1})
+                self.assertEqual(len(statements), 0)
+
+        self.assertTrue(statements)
+        self.assertEqual(
+            registry.Test2.query().filter_by(test_id=t1.id).count(), 2)
+
+    def test_batch_flush_by_size(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        with registry.batch(size=2):
+            t1 = registry.Test.insert(name='t1')
+            self.assertIn(t1, registry.session.new)
+            t2 = registry.Test.insert(name='t2')
+            self.assertNotIn(t1, registry.session.new)
+            self.assertNotIn(t2, registry.session.new)
+            t3 = registry.Test.insert(name='t3')
+            self.assertIn(t3, registry.session.new)
+
+        self.assertNotIn(t3, registry.session.new)
+
+    def test_batch_delete(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        t1 = registry.Test.insert(name='t1')
+        with registry.batch():
+            t1.delete()
+            self.assertIn(t1, registry.session.deleted)
+
+        self.assertEqual(registry.Test.query().count(), 0)
+
+    def test_batch_with_exception(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        with self.assertRaises(ZeroDivisionError):
+            with registry.batch():
+                t1 = registry.Test.insert(name='t1')
+                1 / 0
+
+        self.assertIn(t1, registry.session.new)
+        t2 = registry.Test.insert(name='t2')
+        self.assertNotIn(t2, registry.session.new)
+
     def test_expire_with_column_selection(self):
         registry = self.init_registry(self.declare_model_with_column_selection)
         t = registry.Test.insert()
@@ -579,6 +1276,32 @@ class TestCoreSQLBase(DBTestCase):
         self.assertEqual(registry.Test2.getFieldType('test'), 'Many2One')
         self.assertEqual(registry.Test.getFieldType('test2'), 'One2Many')
 
+    def test_getFieldType_unknown_field(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        with self.assertRaises(SqlBaseException):
+            registry.Test.getFieldType('unknown')
+
+    def test_metadata_without_query(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        registry.System.Cache.invalidate_all()
+        with self.count_queries(registry) as statements:
+            self.assertEqual(registry.Test2.get_primary_keys(), ['id'])
+            self.assertEqual(registry.Test2.getFieldType('test'), 'Many2One')
+            self.assertEqual(
+                registry.Test.fields_description('test2')['test2']['type'],
+                'One2Many')
+
+        self.assertEqual(statements, [])
+
+    def test_metadata_same_as_the_tables_of_the_fields(self):
+        registry = self.init_registry(self.add_in_registry_m2o)
+        Field = registry.System.Field
+        for model in ('Model.Test', 'Model.Test2'):
+            Model = registry.get(model)
+            query = Field.query().filter(Field.model == model)
+            self.assertEqual(Model.fields_description(),
+                             {x.name: x._description() for x in query.all()})
+
     def test_repr_m2o(self):
         registry = self.init_registry(self.add_in_registry_m2o)
         t1 = registry.Test.insert(name='t1')
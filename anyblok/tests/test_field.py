@@ -50,6 +50,12 @@ class TestField2(DBTestCase):
     def test_field_without_name(self):
         self.init_registry(field_without_name)
 
+    def test_field_without_mapping_not_in_metadata(self):
+        registry = self.init_registry(field_without_name)
+        metadata = registry.loaded_namespaces_metadata['Model.Test']
+        self.assertIn('id', metadata)
+        self.assertNotIn('field', metadata)
+
     def define_field_function(self):
 
         @register(Model)
@@ -355,3 +361,60 @@ class TestField2(DBTestCase):
         self.assertEqual(t.properties, {'name': '1'})
         t.properties['name'] = '2'
         self.assertEqual(t.name, 2)
+
+
+class TestFastAccessors(DBTestCase):
+
+    def add_in_registry(self):
+        from anyblok.column import Selection
+        from anyblok.relationship import Many2One
+
+        @register(Model)
+        class Test:
+            id = Integer(primary_key=True)
+            name = String()
+            state = Selection(selections=[('draft', 'Draft'),
+                                          ('done', 'Done')])
+
+        @register(Model)
+        class Test2:
+            id = Integer(primary_key=True)
+            test = Many2One(model=Model.Test, one2many='tests2')
+
+    def get_property(self, model, name):
+        return model.__mapper__.all_orm_descriptors[name]
+
+    def test_fast_accessors_without_format(self):
+        registry = self.init_registry(self.add_in_registry)
+        prop = self.get_property(registry.Test, 'name')
+        self.assertIn('wrap_fast_setter_column', prop.fset.__qualname__)
+        t = registry.Test.insert(name='t1')
+        self.assertEqual(t.name, 't1')
+        t.name = 't2'
+        self.assertEqual(t.name, 't2')
+        self.assertEqual(registry.Test.query().filter(
+            registry.Test.name == 't2').one(), t)
+
+    def test_fast_accessors_with_format(self):
+        registry = self.init_registry(self.add_in_registry)
+        prop = self.get_property(registry.Test, 'state')
+        self.assertIn('wrap_fast_getter_column', prop.fget.__qualname__)
+        self.assertIn('wrap_fast_setter_column', prop.fset.__qualname__)
+        t = registry.Test.insert(state='draft')
+        self.assertEqual(t.state.label, 'Draft')
+        with self.assertRaises(FieldException):
+            t.state = 'unknown'
+
+    def test_setter_with_expire_attributes(self):
+        registry = self.init_registry(self.add_in_registry)
+        prop = self.get_property(registry.Test2, 'test_id')
+        self.assertNotIn('wrap_fast_setter_column', prop.fset.__qualname__)
+        t1 = registry.Test.insert()
+        t2 = registry.Test.insert()
+        t = registry.Test2.insert(test=t1)
+        self.assertEqual(t1.tests2, [t])
+        t.test_id = t2.id
+        registry.flush()
+        self.assertIs(t.test, t2)
+        self.assertEqual(t1.tests2, [])
+        self.assertEqual(t2.tests2, [t])
@@ -6,7 +6,7 @@
 # v. 2.0. If a copy of the MPL was not distributed with this file,You can
 # obtain one at http://mozilla.org/MPL/2.0/.
 from anyblok.tests.testcase import DBTestCase
-from anyblok.column import Integer
+from anyblok.column import Integer, String
 from anyblok.relationship import Many2Many, One2Many, Many2One
 
 
@@ -159,3 +159,180 @@ class TestInstrumentedList(DBTestCase):
 
         registry = self.init_registry(inherit)
         self.assertTrue(registry.System.Blok.query().all().foo())
+
+
+def add_prefetch_models():
+    from anyblok import Declarations
+    from anyblok.relationship import One2One
+    Model = Declarations.Model
+
+    @Declarations.register(Model)
+    class Partner:
+        id = Integer(primary_key=True)
+        name = String()
+
+    @Declarations.register(Model)
+    class Product:
+        id = Integer(primary_key=True)
+        name = String()
+
+    @Declarations.register(Model)
+    class Tag:
+        id = Integer(primary_key=True)
+        name = String()
+
+    @Declarations.register(Model)
+    class Order:
+        id = Integer(primary_key=True)
+        name = String()
+        partner = Many2One(model=Model.Partner)
+        tags = Many2Many(model=Model.Tag, many2many='orders')
+
+    @Declarations.register(Model)
+    class Line:
+        id = Integer(primary_key=True)
+        order = Many2One(model=Model.Order, one2many='lines')
+        product = Many2One(model=Model.Product)
+
+    @Declarations.register(Model)
+    class Invoice:
+        id = Integer(primary_key=True)
+        order = One2One(model=Model.Order, backref='invoice')
+
+
+class TestInstrumentedListPrefetch(DBTestCase):
+
+    def init_data(self, registry):
+        partner = registry.Partner.insert(name='partner')
+        p1 = registry.Product.insert(name='p1')
+        p2 = registry.Product.insert(name='p2')
+        tag = registry.Tag.insert(name='tag')
+        for i in range(3):
+            order = registry.Order.insert(name='o%d' % i, partner=partner)
+            order.tags.append(tag)
+            registry.Line.insert(order=order, product=p1)
+            registry.Line.insert(order=order, product=p2)
+            if i:
+                registry.Invoice.insert(order=order)
+
+        registry.Order.insert(name='o3')
+        registry.flush()
+        registry.session.expunge_all()
+
+    def check_prefetch(self, registry, records, *fields):
+        with self.count_queries(registry) as statements:
+            self.assertIs(records.prefetch(*fields), records)
+
+        return len(statements)
+
+    def test_prefetch_many2one(self):
+        registry = self.init_registry(add_prefetch_models)
+        self.init_data(registry)
+        orders = registry.Order.query().order_by(registry.Order.id).all()
+        self.assertEqual(self.check_prefetch(registry, orders, 'partner'), 1)
+        with self.count_queries(registry) as statements:
+            self.assertEqual([x.partner and x.partner.name for x in orders],
+                             ['partner', 'partner', 'partner', None])
+
+        self.assertEqual(len(statements), 0)
+
+    def test_prefetch_one2many(self):
+        registry = self.init_registry(add_prefetch_models)
+        self.init_data(registry)
+        orders = registry.Order.query().order_by(registry.Order.id).all()
+        self.assertEqual(self.check_prefetch(registry, orders, 'lines'), 1)
+        with self.count_queries(registry) as statements:
+            self.assertEqual([len(x.lines) for x in orders], [2, 2, 2, 0])
+
+        self.assertEqual(len(statements), 0)
+
+    def test_prefetch_many2many(self):
+        registry = self.init_registry(add_prefetch_models)
+        self.init_data(registry)
+        orders = registry.Order.query().order_by(registry.Order.id).all()
+        self.assertEqual(self.check_prefetch(registry, orders, 'tags'), 1)
+        with self.count_queries(registry) as statements:
+            self.assertEqual([x.tags.name for x in orders],
+                             [['tag'], ['tag'], ['tag'], []])
+
+        self.assertEqual(len(statements), 0)
+        tags = registry.Tag.query().all()
+        self.assertEqual(self.check_prefetch(registry, tags, 'orders'), 1)
+        self.assertEqual(len(tags[0].orders), 3)
+
+    def test_prefetch_one2one(self):
+        registry = self.init_registry(add_prefetch_models)
+        self.init_data(registry)
+        orders = registry.Order.query().order_by(registry.Order.id).all()
+        self.assertEqual(self.check_prefetch(registry, orders, 'invoice'), 1)
+        with self.count_queries(registry) as statements:
+            self.assertEqual([x.invoice is not None for x in orders],
+                             [False, True, True, False])
+
+        self.assertEqual(len(statements), 0)
+        invoices = registry.Invoice.query().all()
+        self.assertEqual(
+            self.check_prefetch(registry, invoices, 'order'), 1)
+        with self.count_queries(registry) as statements:
+            self.assertEqual(sorted(x.order.name for x in invoices),
+                             ['o1', 'o2'])
+
+        self.assertEqual(len(statements), 0)
+
+    def test_prefetch_dotted_path(self):
+        registry = self.init_registry(add_prefetch_models)
+        self.init_data(registry)
+        orders = registry.Order.query().all()
+        self.assertEqual(
+            self.check_prefetch(
+                registry, orders, 'partner', 'lines.product', 'lines.order'),
+            3)
+        with self.count_queries(registry) as statements:
+            for order in orders:
+                order.partner
+                for line in order.lines:
+                    self.assertIs(line.order, order)
+                    line.product.name
+
+        self.assertEqual(len(statements), 0)
+
+    def test_prefetch_already_loaded(self):
+        registry = self.init_registry(add_prefetch_models)
+        self.init_data(registry)
+        orders = registry.Order.query().all()
+        orders.prefetch('lines')
+        self.assertEqual(self.check_prefetch(registry, orders, 'lines'), 0)
+
+    def test_prefetch_to_dict_fields(self):
+        registry = self.init_registry(add_prefetch_models)
+        self.init_data(registry)
+        orders = registry.Order.query().all()
+        fields = ('name', ('lines', (('product', ('name',)),)))
+        self.assertEqual(self.check_prefetch(registry, orders, *fields), 2)
+        with self.count_queries(registry) as statements:
+            for order in orders:
+                order.to_dict(*fields)
+
+        self.assertEqual(len(statements), 0)
+
+    def test_prefetch_without_relationship(self):
+        registry = self.init_registry(add_prefetch_models)
+        self.init_data(registry)
+        orders = registry.Order.query().all()
+        self.assertEqual(self.check_prefetch(registry, orders, 'name'), 0)
+
+    def test_prefetch_not_a_relationship(self):
+        from anyblok.bloks.anyblok_core.exceptions import SqlBaseException
+        registry = self.init_registry(add_prefetch_models)
+        self.init_data(registry)
+        orders = registry.Order.query().all()
+        with self.assertRaises(SqlBaseException):
+            orders.prefetch('lines.id')
+
+        with self.assertRaises(SqlBaseException):
+            orders.prefetch('lines.unknown')
+
+    def test_prefetch_empty(self):
+        registry = self.init_registry(add_prefetch_models)
+        orders = registry.Order.query().all()
+        self.assertEqual(orders.prefetch('lines.product'), [])
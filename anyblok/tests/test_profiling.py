@@ -0,0 +1,294 @@
+# This file is a part of the AnyBlok project
+#
+#    Copyright (C) 2018 Jean-Sebastien SUZANNE <jssuzanne@anybox.fr>
+#
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file,You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+from logging import WARNING
+from sqlalchemy.exc import DBAPIError
+from anyblok.config import Configuration
+from anyblok.tests.testcase import TestCase, DBTestCase, LogCapture
+from anyblok.profiling import (normalize_statement, redact_parameters,
+                               SlowQueryListener, SIDE_EFFECTS)
+
+
+def add_model_for_stats():
+    from anyblok import Declarations
+    from anyblok.column import Integer, String
+    from anyblok.relationship import Many2One
+    Model = Declarations.Model
+
+    @Declarations.register(Model)
+    class Test:
+        id = Integer(primary_key=True)
+        name = String()
+
+        @classmethod
+        def read_names(cls, ids):
+            return [cls.query().get(x).name for x in ids]
+
+    @Declarations.register(Model)
+    class Test2:
+        id = Integer(primary_key=True)
+        test = Many2One(model=Model.Test)
+
+
+def execute_statement_in_error(testcase, registry):
+    with testcase.assertRaises(DBAPIError):
+        with registry.begin_nested():
+            registry.execute('SELECT * FROM unknown_table')
+
+
+class TestNormalizeStatement(TestCase):
+
+    def test_parameters(self):
+        self.assertEqual(
+            normalize_statement(
+                "SELECT a FROM t\n WHERE a = %(a_1)s AND b = %s"),
+            "SELECT a FROM t WHERE a = ? AND b = ?")
+
+    def test_list_of_parameters(self):
+        self.assertEqual(
+            normalize_statement("SELECT a FROM t WHERE a IN (?, ?, ?)"),
+            normalize_statement("SELECT a FROM t WHERE a IN (?)"))
+
+
+class TestRedactParameters(TestCase):
+
+    def test_redact_parameters(self):
+        self.assertEqual(redact_parameters({'a': 1, 'b': [1, 2]}),
+                         {'a': '***', 'b': ['***', '***']})
+        self.assertEqual(redact_parameters(('a', {'b': 'c'})),
+                         ('***', {'b': '***'}))
+
+
+class TestSideEffects(TestCase):
+
+    def test_side_effects(self):
+        for statement in (
+            "SELECT a FROM t WHERE a = 1 FOR UPDATE",
+            "SELECT a FROM t FOR NO KEY UPDATE OF t",
+            "SELECT a FROM t for share",
+            "SELECT nextval(%(nextval_1)s) FROM generate_series(1, 3)",
+        ):
+            self.assertTrue(SIDE_EFFECTS.search(statement), statement)
+
+    def test_without_side_effects(self):
+        self.assertFalse(SIDE_EFFECTS.search(
+            "SELECT for_update, nextval_date FROM t WHERE a = 1"))
+
+
+class TestSessionStats(DBTestCase):
+
+    def init_registry_with_stats(self, threshold=0):
+        registry = self.init_registry(add_model_for_stats)
+        registry.listen_session_stats(threshold=threshold)
+        registry.session_stats(reset=True)
+        return registry
+
+    def test_session_stats_without_listener(self):
+        registry = self.init_registry(None)
+        registry.session_stats(reset=True)
+        registry.System.Blok.query().all()
+        self.assertEqual(registry.session_stats(),
+                         {'count': 0, 'duration': 0, 'statements': {}})
+
+    def test_session_stats(self):
+        registry = self.init_registry_with_stats()
+        ids = [registry.Test.insert(name='t%d' % i).id for i in range(3)]
+        registry.session.expunge_all()
+        registry.session_stats(reset=True)
+        registry.Test.read_names(ids)
+        stats = registry.session_stats()
+        self.assertEqual(stats['count'], 3)
+        self.assertEqual(len(stats['statements']), 1)
+        statement, values = list(stats['statements'].items())[0]
+        self.assertIn('FROM test', statement)
+        self.assertEqual(values['count'], 3)
+        self.assertGreater(values['duration'], 0)
+
+    def test_session_stats_by_configuration(self):
+        Configuration.set('session_stats', True)
+        try:
+            registry = self.init_registry(add_model_for_stats)
+        finally:
+            Configuration.set('session_stats', False)
+
+        registry.session_stats(reset=True)
+        registry.Test.query().all()
+        self.assertEqual(registry.session_stats()['count'], 1)
+
+    def test_session_stats_reset(self):
+        registry = self.init_registry_with_stats()
+        registry.Test.query().all()
+        self.assertEqual(registry.session_stats(reset=True)['count'], 1)
+        self.assertEqual(registry.session_stats()['count'], 0)
+
+    def test_session_stats_reset_on_close(self):
+        registry = self.init_registry_with_stats()
+        registry.Test.query().all()
+        self.assertEqual(registry.session_stats()['count'], 1)
+        registry.session.close()
+        self.assertEqual(registry.session_stats()['count'], 0)
+
+    def test_session_stats_by_session(self):
+        registry = self.init_registry_with_stats()
+        registry.Test.query().all()
+        session = registry.session
+        other_session = registry.Session.session_factory()
+        try:
+            registry.Session.registry.set(other_session)
+            self.assertEqual(registry.session_stats()['count'], 0)
+            registry.Test.query().all()
+            registry.Test.query().all()
+            self.assertEqual(registry.session_stats()['count'], 2)
+        finally:
+            registry.Session.registry.set(session)
+            other_session.close()
+
+        self.assertEqual(registry.session_stats()['count'], 1)
+
+    def test_session_stats_after_statement_error(self):
+        registry = self.init_registry_with_stats()
+        execute_statement_in_error(self, registry)
+        self.assertFalse(
+            registry.connection().info.get('anyblok_stats_start'))
+        registry.session_stats(reset=True)
+        registry.Test.query().all()
+        self.assertEqual(registry.session_stats()['count'], 1)
+
+    def test_listen_twice(self):
+        registry = self.init_registry_with_stats()
+        registry.listen_session_stats()
+        registry.Test.query().all()
+        self.assertEqual(registry.session_stats()['count'], 1)
+
+    def test_warning_n_plus_one(self):
+        registry = self.init_registry_with_stats(threshold=2)
+        ids = [registry.Test.insert(name='t%d' % i).id for i in range(4)]
+        registry.session.expunge_all()
+        with LogCapture('anyblok.profiling', level=WARNING) as logs:
+            registry.Test.read_names(ids)
+
+        messages = [x.getMessage() for x in logs.records]
+        self.assertEqual(len(messages), 1)
+        self.assertIn('N+1 queries', messages[0])
+        self.assertIn('Model.Test.read_names', messages[0])
+
+    def test_no_warning_under_threshold(self):
+        registry = self.init_registry_with_stats(threshold=5)
+        ids = [registry.Test.insert(name='t%d' % i).id for i in range(4)]
+        registry.session.expunge_all()
+        with LogCapture('anyblok.profiling', level=WARNING) as logs:
+            registry.Test.read_names(ids)
+
+        self.assertEqual(logs.records, [])
+
+
+class TestSlowQuery(DBTestCase):
+
+    def check_slow_query(self, registry, listener):
+        ids = [registry.Test.insert(name='secret').id for i in range(2)]
+        registry.session.expunge_all()
+        listener.listen(registry.bind)
+        try:
+            with LogCapture('anyblok.profiling', level=WARNING) as logs:
+                registry.Test.read_names(ids)
+        finally:
+            listener.remove(registry.bind)
+
+        return [x.getMessage() for x in logs.records]
+
+    def test_slow_query(self):
+        registry = self.init_registry(add_model_for_stats)
+        messages = self.check_slow_query(registry, SlowQueryListener(1e-9))
+        self.assertEqual(len(messages), 2)
+        self.assertIn('Slow query', messages[0])
+        self.assertIn('Model.Test.read_names', messages[0])
+        self.assertIn('FROM test', messages[0])
+        self.assertIn("'param_1': %d" % registry.Test.query().first().id,
+                      messages[0])
+        self.assertNotIn('plan:', messages[0])
+
+    def test_slow_query_under_threshold(self):
+        registry = self.init_registry(add_model_for_stats)
+        messages = self.check_slow_query(registry, SlowQueryListener(1000))
+        self.assertEqual(messages, [])
+
+    def test_slow_query_redact_parameters(self):
+        registry = self.init_registry(add_model_for_stats)
+        messages = self.check_slow_query(
+            registry, SlowQueryListener(1e-9, redact_parameters=True))
+        self.assertIn("'param_1': '***'", messages[0])
+
+    def test_slow_query_explain(self):
+        registry = self.init_registry(add_model_for_stats)
+        if registry.engine.dialect.name != 'postgresql':
+            self.skipTest('The plan is read only on postgresql')
+
+        messages = self.check_slow_query(
+            registry, SlowQueryListener(1e-9, explain_threshold=1e-9))
+        self.assertIn('plan:', messages[0])
+        self.assertNotIn('actual time', messages[0])
+        # the transaction is not broken by the plan
+        self.assertEqual(registry.Test.query().count(), 2)
+
+    def test_slow_query_explain_analyze(self):
+        registry = self.init_registry(add_model_for_stats)
+        if registry.engine.dialect.name != 'postgresql':
+            self.skipTest('The plan is read only on postgresql')
+
+        messages = self.check_slow_query(
+            registry, SlowQueryListener(1e-9, explain_threshold=1e-9,
+                                        explain_analyze=True))
+        self.assertIn('plan:', messages[0])
+        self.assertIn('Buffers', messages[0])
+        self.assertEqual(registry.Test.query().count(), 2)
+
+    def test_slow_query_explain_analyze_side_effects(self):
+        registry = self.init_registry(None)
+        if registry.engine.dialect.name != 'postgresql':
+            self.skipTest('The plan is read only on postgresql')
+
+        seq = registry.System.Sequence.insert(code='test.sequence')
+        number = seq.number
+        listener = SlowQueryListener(1e-9, explain_threshold=1e-9,
+                                     explain_analyze=True)
+        listener.listen(registry.bind)
+        try:
+            with LogCapture('anyblok.profiling', level=WARNING) as logs:
+                seq.nextval_many(3)
+        finally:
+            listener.remove(registry.bind)
+
+        messages = [x.getMessage() for x in logs.records
+                    if 'nextval' in x.getMessage()]
+        self.assertIn('plan:', messages[0])
+        self.assertNotIn('actual time', messages[0])
+        # the values of the sequence are not fetched twice
+        self.assertEqual(seq.nextval(), str(number + 4))
+
+    def test_slow_query_after_statement_error(self):
+        registry = self.init_registry(add_model_for_stats)
+        listener = SlowQueryListener(1000)
+        listener.listen(registry.bind)
+        try:
+            execute_statement_in_error(self, registry)
+        finally:
+            listener.remove(registry.bind)
+
+        self.assertFalse(
+            registry.connection().info.get('anyblok_slow_query_start'))
+
+    def test_slow_query_by_configuration(self):
+        Configuration.set('slow_query_threshold', 1e-9)
+        try:
+            registry = self.init_registry(add_model_for_stats)
+        finally:
+            Configuration.set('slow_query_threshold', 0)
+
+        with LogCapture('anyblok.profiling', level=WARNING) as logs:
+            registry.Test.query().all()
+
+        self.assertEqual(len(logs.records), 1)
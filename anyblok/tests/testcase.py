@@ -50,6 +50,27 @@ def drop_database(url):
         cnx.close()
 
 
+@contextmanager
+def count_queries(registry):
+    """Save the SQL statements executed by the registry in the
+    contextmanager, see ``TestCase.count_queries``
+
+    :param registry: registry which executes the queries
+    """
+    queries = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        queries.append(statement)
+
+    event.listen(registry.bind, 'before_cursor_execute',
+                 before_cursor_execute)
+    try:
+        yield queries
+    finally:
+        event.remove(registry.bind, 'before_cursor_execute',
+                     before_cursor_execute)
+
+
 class TestCase(unittest.TestCase):
     """Common helpers, not meant to be used directly."""
 
@@ -163,6 +184,19 @@ class TestCase(unittest.TestCase):
         finally:
             Configuration.configuration = old_configuration
 
+    def count_queries(self, registry):
+        """Save the SQL statements executed in the contextmanager
+        ::
+
+            with self.count_queries(registry) as queries:
+                registry.Test.query().all()
+
+            self.assertEqual(len(queries), 1)
+
+        :param registry: registry which executes the queries
+        """
+        return count_queries(registry)
+
 
 class DBTestCase(TestCase):
     """Base class for tests that need to work on an empty database.
@@ -406,6 +440,20 @@ class BlokTestCase(unittest.TestCase):
 
         self._transaction_case_teared_down = True
 
+    def count_queries(self, registry=None):
+        """Save the SQL statements executed in the contextmanager
+        ::
+
+            with self.count_queries() as queries:
+                self.registry.System.Blok.query().all()
+
+            self.assertEqual(len(queries), 1)
+
+        :param registry: registry which executes the queries, by default
+            the registry of the test
+        """
+        return count_queries(registry or self.registry)
+
 
 class SharedDataTestCase(BlokTestCase):
 
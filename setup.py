@@ -89,6 +89,7 @@ setup(
             'anyblok_nose=anyblok.scripts:anyblok_nose',
             'anyblok_interpreter=anyblok.scripts:anyblok_interpreter',
             'anyblok_doc=anyblok.scripts:anyblok2doc',
+            'anyblok_compact_cache=anyblok.scripts:anyblok_compact_cache',
         ],
         'bloks': [
             'anyblok-core=anyblok.bloks.anyblok_core:AnyBlokCore',